@@ -0,0 +1,6 @@
+"""
+Camada de cálculo do dashboard, importável sem o Streamlit.
+
+Os módulos deste pacote preparam e agregam os dados consumidos pelo ``app.py``
+e podem ser usados diretamente por scripts de linha de comando.
+"""
@@ -0,0 +1,84 @@
+"""
+Índice de adjacência (estilo CSR) das transações por empresa.
+
+As empresas são codificadas como inteiros e, para cada uma, o índice guarda
+offsets em duas permutações de ``base_transacoes``: ordenada por pagador e por
+recebedor. Dentro de cada empresa as transações ficam em ordem decrescente de
+``VL`` (empates pela posição original), de modo que a consulta de uma empresa
+custa O(grau) com fatias sem cópia e o top-k por valor sai direto do índice.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+
+def _csr(codigos, valores, n_empresas):
+    linhas = np.arange(len(codigos))
+    ordem = np.lexsort((linhas, -valores, codigos))
+    offsets = np.zeros(n_empresas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos, minlength=n_empresas), out=offsets[1:])
+    ordem.setflags(write=False)
+    return ordem, offsets
+
+
+class TransactionIndex:
+    """Índice das transações de ``base_transacoes`` por pagador e por recebedor."""
+
+    def __init__(self, base_transacoes):
+        n = len(base_transacoes)
+        ids = np.concatenate([base_transacoes['ID_PGTO'].to_numpy(), base_transacoes['ID_RCBE'].to_numpy()])
+        codigos, self.empresas = pd.factorize(ids)
+        self.empresas = pd.Index(self.empresas)
+
+        self.pagador = codigos[:n].astype(np.int32)
+        self.recebedor = codigos[n:].astype(np.int32)
+        self.valor = base_transacoes['VL'].to_numpy(dtype=np.float64)
+        self.mes = periods.month_codes(base_transacoes['DT_REFE'])
+
+        self.ordem_pagador, self.offsets_pagador = _csr(self.pagador, self.valor, len(self.empresas))
+        self.ordem_recebedor, self.offsets_recebedor = _csr(self.recebedor, self.valor, len(self.empresas))
+
+    def code(self, empresa):
+        """Código inteiro da empresa ou -1 se ela não tiver transações."""
+        try:
+            return self.empresas.get_loc(empresa)
+        except KeyError:
+            return -1
+
+    def paid_rows(self, empresa):
+        """Posições (em ``base_transacoes``) dos pagamentos da empresa, por valor decrescente."""
+        c = self.code(empresa)
+        if c < 0:
+            return self.ordem_pagador[:0]
+        return self.ordem_pagador[self.offsets_pagador[c]:self.offsets_pagador[c + 1]]
+
+    def received_rows(self, empresa):
+        """Posições (em ``base_transacoes``) dos recebimentos da empresa, por valor decrescente."""
+        c = self.code(empresa)
+        if c < 0:
+            return self.ordem_recebedor[:0]
+        return self.ordem_recebedor[self.offsets_recebedor[c]:self.offsets_recebedor[c + 1]]
+
+    def degree(self, empresa):
+        """Número de transações em que a empresa é pagadora ou recebedora."""
+        return len(self.rows(empresa))
+
+    def rows(self, empresa):
+        """Posições das transações da empresa (pagadora ou recebedora), na ordem original."""
+        return np.union1d(self.paid_rows(empresa), self.received_rows(empresa))
+
+    def top_edges(self, empresa, k=200, meses=None):
+        """
+        Posições das ``k`` maiores transações da empresa por ``VL``, opcionalmente
+        restritas aos meses informados (códigos de ``analytics.periods``). Segue a
+        ordem de ``DataFrame.nlargest``: valor decrescente e empates pela posição.
+        """
+        candidatas = []
+        for fatia in (self.paid_rows(empresa), self.received_rows(empresa)):
+            if meses is not None:
+                fatia = fatia[np.isin(self.mes[fatia], meses)]
+            candidatas.append(fatia[:k])
+        candidatas = np.unique(np.concatenate(candidatas))
+        ordem = np.lexsort((candidatas, -self.valor[candidatas]))
+        return candidatas[ordem[:k]]
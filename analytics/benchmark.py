@@ -0,0 +1,295 @@
+"""
+Benchmark do pipeline do dashboard com comparação contra baselines salvos.
+
+Mede tempo e pico de memória (``tracemalloc``) de duas formas:
+
+- etapas do pipeline chamadas diretamente (carga do snapshot, filtros
+  globais, KPIs da sidebar, cubo mensal, sequências negativas, índices e rede);
+- cenários do ``app.py`` executados sem navegador com o ``AppTest`` do
+  Streamlit (primeira execução, cada aba, filtro de mês e Detalhamento).
+
+Cada medição roda duas vezes: uma só para o tempo e outra com o
+``tracemalloc`` ligado (que deixa o código mais lento) para o pico de memória.
+O resultado é um JSON que pode ser salvo como baseline; nas execuções
+seguintes, etapas mais lentas ou mais pesadas que o baseline além da
+tolerância são listadas e o comando sai com código 1.
+
+Uso:
+    python -m analytics.synthetic bench_data/100k --empresas 100000 --transacoes 2000000
+    python -m analytics.benchmark --data-dir bench_data/100k --baseline benchmarks/100k.json --salvar-baseline
+    python -m analytics.benchmark --data-dir bench_data/100k --baseline benchmarks/100k.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from analytics import adjacency, community, cube, filters, network, periods, snapshot, streaks
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+TABS = ["Visão Geral", "Início", "Maturidade", "Expansão", "Declínio", "Detalhamento"]
+TOLERANCE = 0.25
+MIN_SECONDS = 0.05
+MIN_MB = 5.0
+
+
+# --- Medição ---
+def measure(funcao, memoria=False):
+    """Executa ``funcao`` e retorna ``(resultado, segundos, pico_mb)`` (pico só com ``memoria``)."""
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao()
+    finally:
+        segundos = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memoria else None
+        if memoria:
+            tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def _run_stages(etapas, memoria):
+    medidas = {}
+    for nome, funcao in etapas:
+        _, segundos, pico = measure(funcao, memoria)
+        medidas[nome] = pico if memoria else segundos
+    return medidas
+
+
+# --- Etapas do Pipeline ---
+def busiest_company(tabelas):
+    """Empresa de ``df_main`` com mais contrapartes (usada na rede e no Detalhamento)."""
+    arestas = tabelas['arestas']
+    grau = pd.concat([arestas['id_pagador'], arestas['id_recebedor']]).value_counts()
+    grau = grau[grau.index.isin(tabelas['df_main']['id_empresa'])]
+    return grau.index[0] if len(grau) else tabelas['df_main']['id_empresa'].iloc[0]
+
+
+def pipeline_stages(data_dir, empresa):
+    """Etapas do dashboard chamadas diretamente, na ordem de uma execução do script."""
+    estado = {}
+
+    def carregar():
+        estado['tabelas'] = snapshot.load_snapshot(data_dir)
+
+    def filtros_globais():
+        tabelas = estado['tabelas']
+        df_main = tabelas['df_main']
+        motor = filters.FilterEngine(df_main, tabelas['base_transacoes'])
+        setor = df_main['setor_cnae'].iloc[0]
+        momento = df_main['momento_empresa'].iloc[0]
+        mes = np.unique(periods.month_codes(df_main['DT_REFE'].dropna()))[:1]
+        for combinacao in [(None, None, None), (setor, None, None), (None, momento, None), (setor, momento, mes)]:
+            motor.companies(*combinacao)
+        motor.transaction_rows(mes)
+        estado['df_filtrado'] = motor.companies(None, None, None)
+
+    def kpis_sidebar():
+        df = estado['df_filtrado']
+        df['total_recebido'].sum(), df['total_pago'].sum()
+        df['num_transacoes_pagas'].sum(), df['num_transacoes_recebidas'].sum()
+        df['id_empresa'].nunique(), df['setor_cnae'].nunique()
+        df['momento_empresa'].value_counts()
+
+    def serie_mensal():
+        cubo = estado['tabelas']['cubo_mensal']
+        cube.monthly_series(cubo)
+        for momento in cubo['momento_empresa'].unique():
+            cube.monthly_series(cubo, momento=momento)
+
+    def sequencias_negativas():
+        tabela = estado['tabelas']['sequencias_negativas']
+        streaks.rank_streaks(tabela, estado['df_filtrado']['id_empresa'].unique(), 10)
+
+    def indice_transacoes():
+        estado['indice'] = adjacency.TransactionIndex(estado['tabelas']['base_transacoes'])
+
+    def rede_empresa():
+        indice = estado['indice']
+        linhas = indice.top_edges(empresa, 200)
+        grafo = network.build_graph(indice.empresas[indice.pagador[linhas]], indice.empresas[indice.recebedor[linhas]],
+                                    indice.valor[linhas], centro=empresa)
+        network.render_html(grafo)
+
+    def vizinhanca():
+        tabelas = estado['tabelas']
+        indice = community.NeighborhoodIndex(tabelas['arestas'], tabelas['comunidades'])
+        indice.ego_subgraph(empresa, saltos=2)
+        indice.community_subgraph(indice.community_of(empresa), centro=empresa)
+
+    return [
+        ("load_data", carregar),
+        ("filtros_globais", filtros_globais),
+        ("kpis_sidebar", kpis_sidebar),
+        ("cubo_mensal", serie_mensal),
+        ("sequencias_negativas", sequencias_negativas),
+        ("indice_transacoes", indice_transacoes),
+        ("rede_empresa", rede_empresa),
+        ("rede_vizinhanca", vizinhanca),
+    ]
+
+
+# --- Cenários do App (AppTest) ---
+@contextlib.contextmanager
+def app_workspace(data_dir):
+    """Diretório de trabalho temporário com ``data`` apontando para ``data_dir`` (e os assets do app)."""
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        os.symlink(os.path.abspath(data_dir), os.path.join(pasta, "data"))
+        for nome in ("lib", "img"):
+            os.symlink(os.path.join(REPO_DIR, nome), os.path.join(pasta, nome))
+        if REPO_DIR not in sys.path:
+            sys.path.insert(0, REPO_DIR)
+        os.chdir(pasta)
+        try:
+            yield pasta
+        finally:
+            os.chdir(anterior)
+
+
+def app_scenarios(empresa):
+    """Cenários do ``app.py``: cada um recebe o ``AppTest`` e faz uma interação."""
+    def aba(nome):
+        def executar(at):
+            at.session_state['active_tab'] = nome
+            at.run()
+        return executar
+
+    def filtro_mes(at):
+        seletor = next(w for w in at.multiselect if w.label.startswith("Mês/Ano"))
+        seletor.set_value([seletor.options[-1]])
+        at.run()
+
+    def detalhamento_empresa(at):
+        next(w for w in at.text_input if w.label == "Buscar empresa").set_value(empresa)
+        at.run()
+        seletor = next(w for w in at.selectbox if w.label.startswith("Selecione uma Empresa"))
+        seletor.set_value(empresa)
+        at.run()
+
+    cenarios = [("app_primeira_execucao", lambda at: at.run())]
+    cenarios += [(f"app_aba_{nome}", aba(nome)) for nome in TABS]
+    cenarios += [("app_detalhamento_empresa", detalhamento_empresa), ("app_filtro_mes", filtro_mes)]
+    return cenarios
+
+
+def _run_app(data_dir, empresa, memoria, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    medidas = {}
+    with app_workspace(data_dir):
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for nome, acao in app_scenarios(empresa):
+            _, segundos, pico = measure(lambda: acao(at), memoria)
+            if at.exception:
+                raise RuntimeError(f"{nome}: {at.exception[0].value}")
+            medidas[nome] = pico if memoria else segundos
+    return medidas
+
+
+# --- Execução e Comparação ---
+def run_benchmark(data_dir, empresa=None, app=True, memoria=True, timeout=600):
+    """Roda as etapas e os cenários e retorna o dicionário de resultados (``empresa`` padrão: ``busiest_company``)."""
+    # A construção do snapshot (carga fria) é medida à parte, uma única vez
+    _, construcao, _ = measure(lambda: snapshot.build_snapshot(data_dir))
+    manifest = snapshot.read_manifest(data_dir)
+    empresa = empresa or busiest_company(snapshot.load_snapshot(data_dir))
+
+    tempos = _run_stages(pipeline_stages(data_dir, empresa), memoria=False)
+    picos = _run_stages(pipeline_stages(data_dir, empresa), memoria=True) if memoria else {}
+    if app:
+        tempos.update(_run_app(data_dir, empresa, False, timeout))
+        if memoria:
+            picos.update(_run_app(data_dir, empresa, True, timeout))
+
+    etapas = {"build_snapshot": {"seconds": round(construcao, 4)}}
+    for nome, segundos in tempos.items():
+        etapas[nome] = {"seconds": round(segundos, 4)}
+        if nome in picos:
+            etapas[nome]["peak_mb"] = round(picos[nome], 2)
+    return {
+        "company": str(empresa),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"data_dir": os.path.abspath(data_dir), "version": manifest["version"], "rows": manifest["rows"]},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "stages": etapas,
+    }
+
+
+def compare(resultado, baseline, tolerancia=TOLERANCE, folga_s=MIN_SECONDS, folga_mb=MIN_MB):
+    """
+    Regressões de ``resultado`` em relação ao ``baseline``: etapas cujo tempo
+    ou pico de memória passou de ``(1 + tolerancia)`` vezes o baseline e
+    também da folga absoluta (que evita alarmes em etapas de milissegundos).
+    """
+    regressoes = []
+    for nome, atual in resultado["stages"].items():
+        anterior = baseline["stages"].get(nome)
+        if anterior is None:
+            continue
+        for chave, folga, unidade in (("seconds", folga_s, "s"), ("peak_mb", folga_mb, " MB")):
+            if chave in atual and chave in anterior:
+                limite = anterior[chave] * (1 + tolerancia)
+                if atual[chave] > limite and atual[chave] - anterior[chave] > folga:
+                    regressoes.append(f"{nome}: {chave} {anterior[chave]:.3f}{unidade} -> {atual[chave]:.3f}{unidade}")
+    return regressoes
+
+
+def format_report(resultado, baseline=None):
+    linhas = [f"{'etapa':<32}{'tempo (s)':>12}{'pico (MB)':>12}{'baseline (s)':>14}"]
+    for nome, medida in resultado["stages"].items():
+        anterior = (baseline or {}).get("stages", {}).get(nome, {})
+        linhas.append(f"{nome:<32}{medida['seconds']:>12.3f}{medida.get('peak_mb', float('nan')):>12.1f}"
+                      f"{anterior.get('seconds', float('nan')):>14.3f}")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede tempo e memória do pipeline do dashboard.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    parser.add_argument("--baseline", default=None, help="JSON de baseline para comparar (ou salvar)")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava o resultado como baseline")
+    parser.add_argument("--saida", default=None, help="Grava o resultado em JSON")
+    parser.add_argument("--empresa", default=None, help="Empresa usada na rede e no Detalhamento (padrão: a de maior grau)")
+    parser.add_argument("--sem-app", action="store_true", help="Não executa os cenários do app.py")
+    parser.add_argument("--sem-memoria", action="store_true", help="Não mede o pico de memória")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCE, help="Piora relativa aceita (padrão: 0.25)")
+    args = parser.parse_args(argv)
+
+    resultado = run_benchmark(args.data_dir, args.empresa, app=not args.sem_app, memoria=not args.sem_memoria)
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_report(resultado, baseline))
+
+    for path in filter(None, [args.saida, args.baseline if args.salvar_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Resultado gravado em {path}")
+
+    if baseline is not None:
+        regressoes = compare(resultado, baseline, args.tolerancia)
+        if regressoes:
+            print("\nRegressões em relação ao baseline:")
+            print("\n".join(f"  - {r}" for r in regressoes))
+            sys.exit(1)
+        print("\nSem regressões em relação ao baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Centralidades da rede de transações sobre uma matriz de adjacência esparsa.
+
+Substitui a passada em networkx do notebook (``degree_centrality``,
+``in/out_degree_centrality`` e ``betweenness_centrality(k=1000, seed=42)``)
+com os mesmos valores: os ids são codificados em inteiros na ordem de
+inserção do ``nx.from_pandas_edgelist``, os graus saem das contagens da CSR e
+a intermediação usa o algoritmo de Brandes com BFS vetorizada por nível. As
+fontes amostradas são as mesmas do networkx (``random.Random(seed).sample``)
+e são divididas em fatias processadas em paralelo; as parciais são somadas
+sempre na mesma ordem (o número de workers só muda o arredondamento, ~1e-17).
+
+Uso:
+    python -m analytics.centrality [--data-dir data] [--k 1000] [--seed 42] [--workers 4]
+"""
+import argparse
+import concurrent.futures
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+COLUMNS = {
+    'degree': 'Centralidade_de_Conexoes',
+    'in_degree': 'Centralidade_de_Recebimentos',
+    'out_degree': 'Centralidade_de_Pagamentos',
+    'betweenness': 'Centralidade_de_Ponte',
+}
+BETWEENNESS_K = 1000
+BETWEENNESS_SEED = 42
+
+
+# --- Grafo Esparso ---
+def encode_edges(pagadores, recebedores):
+    """
+    Códigos inteiros dos nós na ordem em que o ``from_pandas_edgelist`` os
+    insere (pagador e recebedor de cada aresta, alternados).
+    Retorna ``(ids, origem, destino)``.
+    """
+    intercalados = np.column_stack([np.asarray(pagadores, dtype=object), np.asarray(recebedores, dtype=object)]).ravel()
+    codigos, ids = pd.factorize(intercalados)
+    return np.asarray(ids, dtype=object), codigos[0::2], codigos[1::2]
+
+
+def adjacency_matrix(origem, destino, n_nos):
+    """Matriz CSR (n × n) do grafo dirigido; pares repetidos contam uma vez."""
+    adj = sparse.csr_matrix((np.ones(len(origem), dtype=np.int8), (origem, destino)), shape=(n_nos, n_nos))
+    adj.sum_duplicates()
+    adj.data[:] = 1
+    return adj
+
+
+def degree_centralities(adj):
+    """Grau total, de entrada e de saída divididos por ``n - 1`` (como no networkx)."""
+    n = adj.shape[0]
+    saida = np.diff(adj.indptr).astype(np.float64)
+    entrada = np.bincount(adj.indices, minlength=n).astype(np.float64)
+    if n <= 1:
+        um = np.ones(n)
+        return um, um, um
+    escala = 1.0 / (n - 1)
+    return (entrada + saida) * escala, entrada * escala, saida * escala
+
+
+# --- Intermediação (Brandes) ---
+def sample_sources(n_nos, k=None, seed=None):
+    """Fontes da intermediação amostrada, as mesmas escolhidas pelo networkx."""
+    if k is None or k >= n_nos:
+        return np.arange(n_nos)
+    return np.asarray(random.Random(seed).sample(range(n_nos), k))
+
+
+def _brandes(indptr, indices, fontes):
+    """Soma das dependências (sem extremos) de cada fonte de ``fontes``."""
+    n = len(indptr) - 1
+    intermediacao = np.zeros(n)
+    for s in fontes:
+        distancia = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        distancia[s], sigma[s] = 0, 1.0
+
+        niveis = []
+        fronteira, d = np.array([s]), 0
+        while len(fronteira):
+            inicio, fim = indptr[fronteira], indptr[fronteira + 1]
+            contagem = fim - inicio
+            deslocamento = np.arange(contagem.sum()) - np.repeat(np.cumsum(contagem) - contagem, contagem)
+            origem = np.repeat(fronteira, contagem)
+            destino = indices[np.repeat(inicio, contagem) + deslocamento]
+
+            novos = np.unique(destino[distancia[destino] == -1])
+            distancia[novos] = d + 1
+            caminho = distancia[destino] == d + 1
+            origem, destino = origem[caminho], destino[caminho]
+            sigma += np.bincount(destino, weights=sigma[origem], minlength=n)
+            niveis.append((origem, destino))
+            fronteira, d = novos, d + 1
+
+        delta = np.zeros(n)
+        for origem, destino in reversed(niveis):
+            delta += np.bincount(origem, weights=sigma[origem] / sigma[destino] * (1.0 + delta[destino]), minlength=n)
+        delta[s] = 0.0
+        intermediacao += delta
+    return intermediacao
+
+
+def betweenness_centrality(adj, k=BETWEENNESS_K, seed=BETWEENNESS_SEED, workers=None):
+    """
+    Intermediação normalizada de um grafo dirigido, amostrando ``k`` fontes
+    como o ``nx.betweenness_centrality(G, k, seed=seed)`` da versão usada no
+    notebook (networkx 3.1: escala ``n / (k (n-1)(n-2))``).
+    """
+    n = adj.shape[0]
+    fontes = sample_sources(n, k, seed)
+    workers = min(workers or os.cpu_count() or 1, max(len(fontes), 1))
+    fatias = np.array_split(fontes, workers)
+
+    if workers == 1:
+        intermediacao = _brandes(adj.indptr, adj.indices, fontes)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            parciais = list(pool.map(_brandes, [adj.indptr] * workers, [adj.indices] * workers, fatias))
+        intermediacao = np.sum(parciais, axis=0)
+
+    if n > 2:
+        intermediacao *= 1.0 / ((n - 1) * (n - 2))
+        if len(fontes) < n:
+            intermediacao *= n / len(fontes)
+    return intermediacao
+
+
+# --- Tabela de Métricas ---
+def network_metrics(arestas, k=BETWEENNESS_K, seed=BETWEENNESS_SEED, workers=None):
+    """
+    Colunas de centralidade do ``dados_rede_para_powerbi.csv`` por empresa
+    (índice ``id_empresa``, na ordem dos nós do networkx) a partir da tabela de
+    arestas (``id_pagador``, ``id_recebedor``).
+    """
+    ids, origem, destino = encode_edges(arestas['id_pagador'], arestas['id_recebedor'])
+    adj = adjacency_matrix(origem, destino, len(ids))
+    grau, entrada, saida = degree_centralities(adj)
+    return pd.DataFrame({
+        COLUMNS['degree']: grau,
+        COLUMNS['in_degree']: entrada,
+        COLUMNS['out_degree']: saida,
+        COLUMNS['betweenness']: betweenness_centrality(adj, k, seed, workers),
+    }, index=pd.Index(ids, name='id_empresa'))
+
+
+def main(argv=None):
+    from analytics import features, snapshot
+
+    parser = argparse.ArgumentParser(description="Calcula as centralidades da rede de transações.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório de dados (padrão: data)")
+    parser.add_argument("--k", type=int, default=BETWEENNESS_K, help="Fontes amostradas na intermediação (0 = todas)")
+    parser.add_argument("--seed", type=int, default=BETWEENNESS_SEED, help="Semente da amostragem")
+    parser.add_argument("--workers", type=int, default=None, help="Processos no pool (padrão: núcleos da máquina)")
+    parser.add_argument("--saida", default=None, help="Grava as métricas em CSV (padrão: só imprime o resumo)")
+    args = parser.parse_args(argv)
+
+    tabelas = snapshot.load_snapshot(args.data_dir)
+    arestas = tabelas.get('arestas')
+    if arestas is None:
+        arestas = features.edge_aggregates(tabelas['base_transacoes'])
+
+    inicio = time.perf_counter()
+    metricas = network_metrics(arestas, args.k or None, args.seed, args.workers)
+    print(f"Centralidades de {len(metricas):,} empresas em {time.perf_counter() - inicio:.2f}s")
+    if args.saida:
+        metricas.reset_index().to_csv(args.saida, sep=';', decimal=',', index=False)
+    else:
+        print(metricas.describe().T)
+
+
+if __name__ == "__main__":
+    main()
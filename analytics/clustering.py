@@ -0,0 +1,220 @@
+"""
+Modelo de momento das empresas (padronização + k-means) persistido em disco.
+
+Reproduz o notebook: todas as colunas numéricas de ``df_empresas`` (as
+features de ``analytics.features`` e o ``faturamento``), faltantes preenchidos
+pela mediana, ``StandardScaler`` e ``KMeans(n_clusters=4, n_init=10,
+random_state=42)``, com o ``mapa_momento`` fixo do notebook. O artefato é um
+JSON com as colunas, medianas, média/escala, centróides e o mapa
+cluster → momento, de modo que empresas novas recebem um momento sem refazer
+o ajuste. Para bases maiores que a memória o ajuste pode ser feito em blocos
+com ``MiniBatchKMeans.partial_fit``; nesse caso os clusters são casados com
+os momentos de uma classificação de referência.
+
+Uso:
+    python -m analytics.clustering fit [--entrada data/dados_para_powerbi.csv] [--minibatch]
+    python -m analytics.clustering score features.parquet --saida momentos.csv [--workers 4]
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import features
+
+MODEL_NAME = "modelo_momento.json"
+MODEL_PATH = os.path.join("data", MODEL_NAME)
+MODEL_COLS = features.FEATURE_COLS + ['faturamento']
+N_CLUSTERS = 4
+SEED = 42
+MAPA_MOMENTO = {0: 'Declínio', 1: 'Maturidade', 2: 'Expansão', 3: 'Início'}
+SCORE_CHUNK_ROWS = 500_000
+
+
+# --- Artefato ---
+def save_model(modelo, path=MODEL_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(modelo, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def model_path(data_dir="data"):
+    return os.path.join(data_dir, MODEL_NAME)
+
+
+def load_model(path=MODEL_PATH):
+    """Modelo salvo por ``save_model`` ou ``None`` se o arquivo não existir."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _artifact(colunas, medianas, media, escala, centroides, mapa, n_amostras, metodo):
+    return {
+        "columns": list(colunas),
+        "medians": [float(v) for v in medianas],
+        "mean": [float(v) for v in media],
+        "scale": [float(v) for v in escala],
+        "centroids": np.asarray(centroides, dtype=np.float64).tolist(),
+        "momento": {str(k): v for k, v in mapa.items()},
+        "n_samples": int(n_amostras),
+        "method": metodo,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# --- Ajuste ---
+def fit_model(df_empresas, n_clusters=N_CLUSTERS, seed=SEED, mapa=MAPA_MOMENTO):
+    """Ajuste em memória, idêntico ao notebook (``KMeans`` com ``n_init=10``)."""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    dados = df_empresas[MODEL_COLS].astype(np.float64)
+    medianas = dados.median()
+    scaler = StandardScaler().fit(dados.fillna(medianas))
+    kmeans = KMeans(n_clusters=n_clusters, init='k-means++', n_init=10, random_state=seed)
+    kmeans.fit(scaler.transform(dados.fillna(medianas)))
+    return _artifact(MODEL_COLS, medianas, scaler.mean_, scaler.scale_, kmeans.cluster_centers_,
+                     mapa, len(dados), "kmeans")
+
+
+def fit_model_chunks(blocos, n_clusters=N_CLUSTERS, seed=SEED, referencia=None):
+    """
+    Ajuste em blocos. ``blocos`` é uma função que devolve um iterador novo de
+    DataFrames a cada chamada (são feitas duas passadas): a primeira acumula
+    média/variância (``StandardScaler.partial_fit``) e as medianas de cada
+    bloco (a mediana final é a mediana delas, uma aproximação); a segunda
+    treina o ``MiniBatchKMeans``. ``referencia`` (DataFrame com ``MODEL_COLS``
+    e ``momento_empresa``) define o mapa cluster → momento.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.preprocessing import StandardScaler
+
+    scaler, medianas, n_amostras = StandardScaler(), [], 0
+    for bloco in blocos():
+        dados = bloco[MODEL_COLS].astype(np.float64)
+        scaler.partial_fit(dados)
+        medianas.append(dados.median().to_numpy())
+        n_amostras += len(dados)
+    medianas = pd.Series(np.nanmedian(np.vstack(medianas), axis=0), index=MODEL_COLS)
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3)
+    for bloco in blocos():
+        x = scaler.transform(bloco[MODEL_COLS].astype(np.float64).fillna(medianas))
+        if len(x) >= n_clusters:
+            kmeans.partial_fit(x)
+
+    modelo = _artifact(MODEL_COLS, medianas, scaler.mean_, scaler.scale_, kmeans.cluster_centers_,
+                       {}, n_amostras, "minibatch")
+    if referencia is not None:
+        modelo["momento"] = {str(k): v for k, v in match_clusters(
+            predict(modelo, referencia), referencia['momento_empresa'].to_numpy()).items()}
+    return modelo
+
+
+def match_clusters(rotulos, momentos):
+    """Casa cada cluster com um momento maximizando a concordância (atribuição húngara)."""
+    from scipy.optimize import linear_sum_assignment
+
+    tabela = pd.crosstab(pd.Series(rotulos, name='cluster'), pd.Series(momentos, name='momento'))
+    linhas, colunas = linear_sum_assignment(-tabela.to_numpy())
+    return {int(tabela.index[i]): tabela.columns[j] for i, j in zip(linhas, colunas)}
+
+
+# --- Classificação ---
+def predict(modelo, df):
+    """Cluster de cada linha de ``df`` (distância euclidiana aos centróides padronizados)."""
+    colunas = modelo["columns"]
+    dados = df[colunas].to_numpy(dtype=np.float64)
+    medianas = np.asarray(modelo["medians"])
+    dados = np.where(np.isnan(dados), medianas, dados)
+    x = (dados - np.asarray(modelo["mean"])) / np.asarray(modelo["scale"])
+    centroides = np.asarray(modelo["centroids"])
+    # |x - c|² = |x|² - 2 x·c + |c|² (o termo |x|² não muda o argmin)
+    distancias = (centroides ** 2).sum(axis=1) - 2.0 * x @ centroides.T
+    return distancias.argmin(axis=1)
+
+
+def _score_block(modelo, bloco):
+    clusters = predict(modelo, bloco)
+    mapa = {int(k): v for k, v in modelo["momento"].items()}
+    return pd.DataFrame({
+        'cluster': clusters,
+        'momento_empresa': pd.Series(clusters).map(mapa).fillna('N/A').to_numpy(),
+    }, index=bloco.index)
+
+
+def score(modelo, df, chunksize=SCORE_CHUNK_ROWS, workers=1):
+    """
+    Colunas ``cluster`` e ``momento_empresa`` para as linhas de ``df``, em
+    blocos de ``chunksize`` linhas (em paralelo quando ``workers > 1``).
+    """
+    blocos = [df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize)] or [df]
+    if workers == 1 or len(blocos) == 1:
+        partes = [_score_block(modelo, b) for b in blocos]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            partes = list(pool.map(_score_block, [modelo] * len(blocos), blocos))
+    return pd.concat(partes)
+
+
+def _read_frame(path, sep=';', decimal=','):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, sep=sep, decimal=decimal)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajusta e aplica o modelo de momento das empresas.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    ajuste = sub.add_parser("fit", help="Ajusta o modelo e grava o artefato JSON")
+    ajuste.add_argument("--entrada", default=os.path.join("data", "dados_para_powerbi.csv"),
+                        help="Features por empresa (CSV ';'/',' ou Parquet)")
+    ajuste.add_argument("--modelo", default=MODEL_PATH, help="Caminho do artefato (padrão: data/modelo_momento.json)")
+    ajuste.add_argument("--minibatch", action="store_true", help="Ajuste em blocos com MiniBatchKMeans")
+    ajuste.add_argument("--chunksize", type=int, default=SCORE_CHUNK_ROWS, help="Linhas por bloco no modo --minibatch")
+
+    aplicacao = sub.add_parser("score", help="Classifica empresas com um modelo salvo")
+    aplicacao.add_argument("entrada", help="Features por empresa (CSV ';'/',' ou Parquet)")
+    aplicacao.add_argument("--saida", required=True, help="Arquivo de saída (.parquet ou .csv)")
+    aplicacao.add_argument("--modelo", default=MODEL_PATH, help="Caminho do artefato (padrão: data/modelo_momento.json)")
+    aplicacao.add_argument("--chunksize", type=int, default=SCORE_CHUNK_ROWS, help="Linhas por bloco")
+    aplicacao.add_argument("--workers", type=int, default=1, help="Processos no pool")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.comando == "fit":
+        df = _read_frame(args.entrada)
+        if args.minibatch:
+            blocos = lambda: (df.iloc[i:i + args.chunksize] for i in range(0, len(df), args.chunksize))
+            referencia = df if 'momento_empresa' in df.columns else None
+            modelo = fit_model_chunks(blocos, referencia=referencia)
+        else:
+            modelo = fit_model(df)
+        save_model(modelo, args.modelo)
+        print(f"Modelo ({modelo['method']}, {modelo['n_samples']:,} empresas) salvo em {args.modelo} "
+              f"em {time.perf_counter() - inicio:.2f}s")
+    else:
+        modelo = load_model(args.modelo)
+        if modelo is None:
+            parser.error(f"Modelo não encontrado: {args.modelo}")
+        df = _read_frame(args.entrada)
+        resultado = score(modelo, df, args.chunksize, args.workers)
+        if 'id_empresa' in df.columns:
+            resultado.insert(0, 'id_empresa', df['id_empresa'].to_numpy())
+        if args.saida.endswith('.parquet'):
+            resultado.to_parquet(args.saida, index=False)
+        else:
+            resultado.to_csv(args.saida, sep=';', index=False)
+        print(f"{len(resultado):,} empresas classificadas em {time.perf_counter() - inicio:.2f}s -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Comunidades (Louvain) e subgrafos de vizinhança da rede de transações.
+
+O Louvain roda sobre uma matriz esparsa simétrica com pesos ``valor_total``
+(as duas direções de um par são somadas; laços contam em dobro na diagonal,
+como o grau ponderado do networkx). Cada nível move os nós para a comunidade
+vizinha de maior ganho de modularidade e depois colapsa as comunidades com
+``P.T @ A @ P``. A partição pode ser refinada quando chegam novas arestas:
+o primeiro nível parte da partição anterior e só revisita os nós afetados.
+
+``NeighborhoodIndex`` guarda, em CSR, os vizinhos de cada empresa por peso
+decrescente, as arestas de saída e os membros de cada comunidade, servindo
+subgrafos de 1 ou 2 saltos (podados pelos vizinhos mais pesados) e subgrafos
+de uma comunidade sem varrer as transações.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+LOUVAIN_SEED = 42
+MIN_GAIN = 1e-7
+
+
+# --- Grafo Não Dirigido ---
+def undirected_matrix(pagadores, recebedores, pesos, n_nos):
+    """Matriz simétrica de pesos; a diagonal guarda o dobro do peso dos laços."""
+    w = sparse.coo_matrix((np.asarray(pesos, dtype=np.float64), (pagadores, recebedores)), shape=(n_nos, n_nos))
+    return (w + w.T).tocsr()
+
+
+def _edge_matrix(arestas, peso):
+    codigos, ids = pd.factorize(np.concatenate([arestas['id_pagador'].to_numpy(), arestas['id_recebedor'].to_numpy()]))
+    m = len(arestas)
+    pesos = np.ones(m) if peso is None else arestas[peso].to_numpy()
+    return np.asarray(ids), undirected_matrix(codigos[:m], codigos[m:], pesos, len(ids))
+
+
+def _renumber(rotulos):
+    _, novos = np.unique(rotulos, return_inverse=True)
+    return novos.astype(np.int64)
+
+
+def _collapse(matriz, comunidades, n_comunidades):
+    p = sparse.csr_matrix((np.ones(len(comunidades)), (np.arange(len(comunidades)), comunidades)),
+                          shape=(len(comunidades), n_comunidades))
+    return (p.T @ matriz @ p).tocsr()
+
+
+def modularity(matriz, comunidades, resolucao=1.0):
+    """Modularidade da partição ``comunidades`` (códigos 0..c-1) em ``matriz``."""
+    dois_m = matriz.sum()
+    if dois_m == 0:
+        return 0.0
+    colapsada = _collapse(matriz, comunidades, comunidades.max() + 1)
+    internos = colapsada.diagonal()
+    totais = np.asarray(colapsada.sum(axis=1)).ravel()
+    return float((internos / dois_m - resolucao * (totais / dois_m) ** 2).sum())
+
+
+# --- Louvain ---
+def _move_nodes(matriz, comunidades, resolucao, rng, ativos=None):
+    """
+    Fase local do Louvain: passa pelos nós (em ordem aleatória) movendo cada um
+    para a comunidade vizinha de maior ganho, até não haver melhora. O laço por
+    nó usa listas Python, mais baratas que arrays NumPy para graus pequenos.
+    """
+    graus = np.asarray(matriz.sum(axis=1)).ravel()
+    dois_m = graus.sum()
+    fator = resolucao / dois_m
+    totais = np.bincount(comunidades, weights=graus, minlength=len(graus)).tolist()
+    indptr, indices, pesos = matriz.indptr.tolist(), matriz.indices.tolist(), matriz.data.tolist()
+    rotulos, k_nos = comunidades.tolist(), graus.tolist()
+    nos = np.arange(len(graus)) if ativos is None else np.asarray(ativos)
+
+    moveu = False
+    qualidade = modularity(matriz, _renumber(comunidades), resolucao)
+    while True:
+        movidos = 0
+        for i in rng.permutation(nos).tolist():
+            atual, k = rotulos[i], k_nos[i]
+            ligacoes = {}
+            for p in range(indptr[i], indptr[i + 1]):
+                j = indices[p]
+                if j != i:
+                    c = rotulos[j]
+                    ligacoes[c] = ligacoes.get(c, 0.0) + pesos[p]
+
+            totais[atual] -= k
+            melhor, melhor_ganho = atual, ligacoes.get(atual, 0.0) - totais[atual] * k * fator
+            for c, w in ligacoes.items():
+                ganho = w - totais[c] * k * fator
+                if ganho > melhor_ganho:
+                    melhor, melhor_ganho = c, ganho
+            totais[melhor] += k
+            if melhor != atual:
+                rotulos[i] = melhor
+                movidos += 1
+
+        comunidades = np.asarray(rotulos, dtype=np.int64)
+        nova = modularity(matriz, _renumber(comunidades), resolucao)
+        if movidos == 0 or nova - qualidade < MIN_GAIN:
+            return comunidades, moveu or movidos > 0
+        qualidade, moveu = nova, True
+
+
+def louvain(matriz, resolucao=1.0, seed=LOUVAIN_SEED, inicial=None, ativos=None):
+    """
+    Partição Louvain dos nós de ``matriz``. Com ``inicial`` o primeiro nível
+    parte dessa partição e, com ``ativos``, só esses nós são revisitados nele.
+    """
+    rng = np.random.default_rng(seed)
+    n = matriz.shape[0]
+    particao = np.arange(n)
+    comunidades = np.arange(n) if inicial is None else _renumber(inicial)
+    if matriz.sum() == 0:
+        return comunidades
+
+    while True:
+        comunidades, _ = _move_nodes(matriz, comunidades.copy(), resolucao, rng, ativos)
+        comunidades = _renumber(comunidades)
+        particao = comunidades[particao]
+        n_comunidades = comunidades.max() + 1
+        if n_comunidades == matriz.shape[0]:
+            return particao
+        matriz = _collapse(matriz, comunidades, n_comunidades)
+        comunidades, ativos = np.arange(n_comunidades), None
+
+
+def _label_by_size(rotulos):
+    """Renumera as comunidades por tamanho decrescente (0 = maior)."""
+    tamanhos = np.bincount(rotulos)
+    ordem = np.lexsort((np.arange(len(tamanhos)), -tamanhos))
+    novos = np.empty_like(ordem)
+    novos[ordem] = np.arange(len(ordem))
+    return novos[rotulos]
+
+
+def build_communities(arestas, peso='valor_total', seed=LOUVAIN_SEED):
+    """Tabela ``id_empresa`` → ``comunidade`` a partir da tabela de arestas."""
+    ids, matriz = _edge_matrix(arestas, peso)
+    return pd.DataFrame({'id_empresa': ids, 'comunidade': _label_by_size(louvain(matriz, seed=seed))})
+
+
+def refine_communities(comunidades, arestas, afetadas, peso='valor_total', seed=LOUVAIN_SEED):
+    """
+    Atualiza a partição depois que ``arestas`` recebeu pares novos envolvendo
+    as empresas ``afetadas``: empresas novas começam isoladas e só elas e seus
+    vizinhos são revisitados no primeiro nível.
+    """
+    ids, matriz = _edge_matrix(arestas, peso)
+
+    anteriores = pd.Series(comunidades['comunidade'].to_numpy(), index=comunidades['id_empresa']).reindex(ids).to_numpy(dtype=np.float64, copy=True)
+    novas = np.isnan(anteriores)
+    anteriores[novas] = np.nanmax(anteriores, initial=-1) + 1 + np.arange(novas.sum())
+
+    tocadas = pd.Index(ids).get_indexer(pd.Index(afetadas))
+    tocadas = tocadas[tocadas >= 0]
+    ativos = np.unique(np.concatenate([tocadas, matriz[tocadas].indices]))
+    rotulos = louvain(matriz, seed=seed, inicial=anteriores.astype(np.int64), ativos=ativos)
+    return pd.DataFrame({'id_empresa': ids, 'comunidade': _label_by_size(rotulos)})
+
+
+# --- Subgrafos de Vizinhança ---
+def _csr_by_weight(linhas, pesos, n_linhas):
+    ordem = np.lexsort((np.arange(len(linhas)), -pesos, linhas))
+    offsets = np.zeros(n_linhas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(linhas, minlength=n_linhas), out=offsets[1:])
+    return ordem, offsets
+
+
+class NeighborhoodIndex:
+    """Índice da tabela de arestas para subgrafos de ego (k saltos) e de comunidade."""
+
+    def __init__(self, arestas, comunidades=None):
+        m = len(arestas)
+        codigos, empresas = pd.factorize(np.concatenate([arestas['id_pagador'].to_numpy(), arestas['id_recebedor'].to_numpy()]))
+        self.empresas = pd.Index(empresas)
+        n = len(self.empresas)
+        self.pagador, self.recebedor = codigos[:m], codigos[m:]
+        self.valor = arestas['valor_total'].to_numpy(dtype=np.float64)
+
+        # Arestas de saída por pagador (para montar o subgrafo induzido)
+        self.ordem_saida, self.offsets_saida = _csr_by_weight(self.pagador, self.valor, n)
+
+        # Vizinhos não dirigidos por peso decrescente (pares nos dois sentidos somados)
+        vizinhanca = undirected_matrix(self.pagador, self.recebedor, self.valor, n).tocoo()
+        fora_diagonal = vizinhanca.row != vizinhanca.col
+        linhas, self.vizinho = vizinhanca.row[fora_diagonal], vizinhanca.col[fora_diagonal]
+        self.ordem_vizinhos, self.offsets_vizinhos = _csr_by_weight(linhas, vizinhanca.data[fora_diagonal], n)
+        self.vizinho = self.vizinho[self.ordem_vizinhos]
+
+        self.comunidade = None
+        if comunidades is not None:
+            rotulos = pd.Series(comunidades['comunidade'].to_numpy(), index=comunidades['id_empresa'])
+            self.comunidade = rotulos.reindex(self.empresas).fillna(-1).to_numpy(dtype=np.int64)
+            validos = np.flatnonzero(self.comunidade >= 0)
+            self.membros = validos[np.argsort(self.comunidade[validos], kind='stable')]
+            n_comunidades = self.comunidade.max() + 1 if len(validos) else 0
+            self.offsets_membros = np.zeros(n_comunidades + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.comunidade[validos], minlength=n_comunidades), out=self.offsets_membros[1:])
+
+    def code(self, empresa):
+        """Código inteiro da empresa ou -1 se ela não estiver na rede."""
+        try:
+            return self.empresas.get_loc(empresa)
+        except KeyError:
+            return -1
+
+    def neighbors(self, codigo, limite=None):
+        """Códigos dos vizinhos de ``codigo`` por peso decrescente (no máximo ``limite``)."""
+        inicio, fim = self.offsets_vizinhos[codigo], self.offsets_vizinhos[codigo + 1]
+        if limite is not None:
+            fim = min(fim, inicio + limite)
+        return self.vizinho[inicio:fim]
+
+    def ego_nodes(self, empresa, saltos=1, limite_vizinhos=50):
+        """Empresas a até ``saltos`` da empresa, mantendo os vizinhos mais pesados de cada nó."""
+        c = self.code(empresa)
+        if c < 0:
+            return np.empty(0, dtype=np.int64)
+        nos, fronteira = {c}, [c]
+        for _ in range(saltos):
+            alcancados = np.unique(np.concatenate([self.neighbors(v, limite_vizinhos) for v in fronteira] + [np.empty(0, dtype=np.int64)]))
+            fronteira = [v for v in alcancados.tolist() if v not in nos]
+            nos.update(fronteira)
+        return np.fromiter(nos, dtype=np.int64, count=len(nos))
+
+    def edges_among(self, nos, limite=200, centro=-1):
+        """
+        Arestas dirigidas com as duas pontas em ``nos``, por valor decrescente e
+        com as arestas do ``centro`` na frente. Retorna o DataFrame de arestas.
+        """
+        dentro = np.zeros(len(self.empresas), dtype=bool)
+        dentro[nos] = True
+        inicio, fim = self.offsets_saida[nos], self.offsets_saida[nos + 1]
+        contagem = fim - inicio
+        deslocamento = np.arange(contagem.sum()) - np.repeat(np.cumsum(contagem) - contagem, contagem)
+        linhas = self.ordem_saida[np.repeat(inicio, contagem) + deslocamento]
+        linhas = linhas[dentro[self.recebedor[linhas]]]
+
+        periferia = (self.pagador[linhas] != centro) & (self.recebedor[linhas] != centro)
+        linhas = linhas[np.lexsort((linhas, -self.valor[linhas], periferia))][:limite]
+        return pd.DataFrame({
+            'id_pagador': self.empresas[self.pagador[linhas]],
+            'id_recebedor': self.empresas[self.recebedor[linhas]],
+            'valor_total': self.valor[linhas],
+        })
+
+    def ego_subgraph(self, empresa, saltos=1, limite_vizinhos=50, limite_arestas=200):
+        """Subgrafo de ``saltos`` (1 ou 2) em volta da empresa, podado pelos maiores pesos."""
+        nos = self.ego_nodes(empresa, saltos, limite_vizinhos)
+        return self.edges_among(nos, limite_arestas, self.code(empresa))
+
+    def community_of(self, empresa):
+        """Comunidade da empresa (-1 se desconhecida)."""
+        c = self.code(empresa)
+        return -1 if c < 0 or self.comunidade is None else int(self.comunidade[c])
+
+    def community_members(self, comunidade):
+        if self.comunidade is None or not 0 <= comunidade < len(self.offsets_membros) - 1:
+            return np.empty(0, dtype=np.int64)
+        return self.membros[self.offsets_membros[comunidade]:self.offsets_membros[comunidade + 1]]
+
+    def community_subgraph(self, comunidade, limite_arestas=200, centro=None):
+        """Arestas internas de uma comunidade, por valor decrescente."""
+        nos = self.community_members(comunidade)
+        return self.edges_among(nos, limite_arestas, -1 if centro is None else self.code(centro))
@@ -0,0 +1,151 @@
+"""
+Representação compacta das tabelas do dashboard em memória.
+
+Os ids de empresa (``id_empresa``, ``ID_PGTO``, ``ID_RCBE``, ``id_pagador``,
+``id_recebedor``) viram categóricos com um único dicionário de empresas
+compartilhado por todas as tabelas (códigos inteiros de 16/32 bits), as
+dimensões de texto (``setor_cnae``, ``momento_empresa``, ``DS_TRAN``,
+``DS_CNAE``) viram categóricos, datas com poucos valores distintos (como o
+mês de referência) também, e as medidas numéricas são reduzidas só quando
+a conversão é exata: floats inteiros sem faltantes e inteiros viram ``int32``
+(com folga para somas e diferenças de dois valores) e floats que sobrevivem
+à ida e volta por ``float32`` viram ``float32``. O resto continua ``float64``.
+
+Os categóricos exibem os rótulos originais; ``restore`` devolve os dtypes
+de origem (usado no CSV baixado, que assim sai idêntico). ``compact_tables``
+retorna também o relatório de memória por coluna.
+
+Uso:
+    python -m analytics.compact [--data-dir data]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analytics import snapshot
+
+COMPANY_COLUMNS = ['id_empresa', 'ID_PGTO', 'ID_RCBE', 'id_pagador', 'id_recebedor']
+CATEGORY_COLUMNS = ['setor_cnae', 'momento_empresa', 'DS_TRAN', 'DS_CNAE']
+TABLES = ['df_main', 'base_id', 'base_transacoes', 'arestas', 'comunidades', 'sequencias_negativas',
+          'crescimento_empresas', 'mix_empresas', 'exposicao_mensal',
+          'exposicao_periodo']
+INT32_SAFE = 2 ** 30
+# Datas viram categóricas quando o dicionário (8 bytes por valor distinto) se paga
+DATE_CATEGORY_RATIO = 8
+
+
+def company_dictionary(tabelas, nomes=TABLES):
+    """Rótulos (ordenados) de todas as empresas que aparecem nas colunas de id das tabelas."""
+    partes = [tabelas[n][c].dropna().unique() for n in nomes if n in tabelas
+              for c in COMPANY_COLUMNS if c in tabelas[n].columns]
+    if not partes:
+        return pd.Index([], dtype=object)
+    return pd.Index(pd.unique(np.concatenate([np.asarray(p, dtype=object) for p in partes]))).sort_values()
+
+
+def compact_numeric(serie):
+    """Menor dtype em que a série numérica é representada sem perda (ou a própria série)."""
+    valores = serie.to_numpy()
+    if valores.dtype.kind == 'i':
+        if len(valores) and np.abs(valores).max() < INT32_SAFE and valores.dtype.itemsize > 4:
+            return serie.astype(np.int32)
+        return serie
+    if valores.dtype != np.float64 or serie.isna().any():
+        return serie
+    if len(valores) and np.array_equal(valores, np.round(valores)) and np.abs(valores).max() < INT32_SAFE:
+        return serie.astype(np.int32)
+    if np.array_equal(valores.astype(np.float32).astype(np.float64), valores):
+        return serie.astype(np.float32)
+    return serie
+
+
+def compact_frame(df, empresas=None):
+    """Cópia compacta de ``df`` (ids de empresa categorizados pelo dicionário ``empresas``)."""
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna in COMPANY_COLUMNS and empresas is not None:
+            serie = pd.Series(pd.Categorical(serie, categories=empresas), index=df.index, name=coluna)
+        elif coluna in CATEGORY_COLUMNS:
+            serie = serie.astype('category')
+        elif serie.dtype.kind in 'if':
+            serie = compact_numeric(serie)
+        elif serie.dtype.kind == 'M' and serie.nunique() * DATE_CATEGORY_RATIO <= len(serie):
+            serie = serie.astype('category')
+        colunas[coluna] = serie
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def _column_bytes(serie, empresas):
+    if empresas is not None and isinstance(serie.dtype, pd.CategoricalDtype) and serie.cat.categories is empresas:
+        return int(serie.cat.codes.nbytes)  # o dicionário compartilhado entra numa linha própria
+    return int(serie.memory_usage(deep=True, index=False))
+
+
+def memory_report(antes, depois, empresas=None):
+    """
+    Bytes por coluna antes e depois da compactação (``antes``/``depois``: dicts
+    de DataFrames). O dicionário de empresas ``empresas`` é contado uma vez.
+    """
+    linhas = []
+    for nome, df in depois.items():
+        original = antes[nome]
+        for coluna in df.columns:
+            linhas.append({
+                'tabela': nome,
+                'coluna': coluna,
+                'dtype_original': str(original[coluna].dtype),
+                'dtype': str(df[coluna].dtype),
+                'bytes_original': int(original[coluna].memory_usage(deep=True, index=False)),
+                'bytes': _column_bytes(df[coluna], empresas),
+            })
+    if empresas is not None:
+        linhas.append({'tabela': 'dicionario', 'coluna': 'empresas', 'dtype_original': '', 'dtype': str(empresas.dtype),
+                       'bytes_original': 0, 'bytes': int(empresas.memory_usage(deep=True))})
+    relatorio = pd.DataFrame(linhas)
+    if not relatorio.empty:
+        relatorio['reducao'] = relatorio['bytes_original'] / relatorio['bytes'].clip(lower=1)
+    return relatorio
+
+
+def compact_tables(tabelas, nomes=TABLES):
+    """
+    Versões compactas das tabelas ``nomes`` de ``tabelas`` (as demais são
+    repassadas sem mudança) e o relatório de memória por coluna.
+    """
+    empresas = company_dictionary(tabelas, nomes)
+    compactas = {n: compact_frame(tabelas[n], empresas) for n in nomes if n in tabelas}
+    relatorio = memory_report({n: tabelas[n] for n in compactas}, compactas, empresas)
+    return {**tabelas, **compactas}, relatorio
+
+
+def summarize(relatorio):
+    """Totais por tabela (MB antes/depois e fator de redução)."""
+    total = relatorio.groupby('tabela', sort=False)[['bytes_original', 'bytes']].sum()
+    total.loc['total'] = total.sum()
+    total['reducao'] = total['bytes_original'] / total['bytes'].clip(lower=1)
+    return total.assign(mb_original=total['bytes_original'] / 2 ** 20, mb=total['bytes'] / 2 ** 20)[
+        ['mb_original', 'mb', 'reducao']]
+
+
+def restore(df, relatorio, tabela):
+    """``df`` com os dtypes originais da ``tabela`` no relatório (colunas fora dele ficam como estão)."""
+    originais = relatorio[relatorio['tabela'] == tabela].set_index('coluna')['dtype_original']
+    return df.astype({c: originais[c] for c in df.columns if c in originais.index and str(df[c].dtype) != originais[c]})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de memória da representação compacta das tabelas.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    args = parser.parse_args(argv)
+
+    _, relatorio = compact_tables(snapshot.load_snapshot(args.data_dir))
+    with pd.option_context("display.width", 160, "display.max_rows", 200):
+        print(relatorio.round(2).to_string(index=False))
+        print()
+        print(summarize(relatorio).round(2))
+
+
+if __name__ == "__main__":
+    main()
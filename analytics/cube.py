@@ -0,0 +1,89 @@
+"""
+Cubo mensal pré-agregado que alimenta os gráficos de série temporal.
+
+O cubo tem uma linha por (mês, setor_cnae, momento_empresa) com medidas
+aditivas: somas de recebido, pago, fluxo e contagens de transações, além de
+soma e quantidade dos tickets para recompor médias. Filtrar e reagregar o cubo
+substitui o ``.copy()`` + ``strftime`` + ``groupby`` sobre o ``df_main``.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+KEYS = ['mes', 'setor_cnae', 'momento_empresa']
+MEASURES = [
+    'total_recebido', 'total_pago', 'fluxo_caixa_liquido',
+    'num_transacoes_recebidas', 'num_transacoes_pagas'
+]
+TICKETS = ['ticket_medio_recebido', 'ticket_medio_pago']
+
+
+def build_monthly_cube(df_main):
+    """Agrega o ``df_main`` por (mês, setor, momento). Linhas sem ``DT_REFE`` ficam de fora."""
+    frame = pd.DataFrame({
+        'mes': periods.month_codes(df_main['DT_REFE']),
+        'setor_cnae': df_main['setor_cnae'].to_numpy(),
+        'momento_empresa': df_main['momento_empresa'].to_numpy(),
+    })
+    for col in MEASURES:
+        frame[col] = df_main[col].to_numpy()
+    for col in TICKETS:
+        frame[f'{col}_soma'] = df_main[col].fillna(0).to_numpy()
+        frame[f'{col}_qtd'] = df_main[col].notna().to_numpy().astype(np.int64)
+    frame['num_linhas'] = 1
+
+    frame = frame[frame['mes'] != periods.MISSING]
+    return frame.groupby(KEYS, sort=True, observed=True).sum().reset_index()
+
+
+def monthly_series(cubo, setor=None, momento=None, meses=None):
+    """
+    Reagrega o cubo por mês, aplicando os filtros de setor, momento e meses
+    (códigos de ``analytics.periods``). Retorna as medidas ordenadas por mês,
+    a coluna ``MesAno`` (``%m/%Y``) e as médias dos tickets.
+    """
+    mask = np.ones(len(cubo), dtype=bool)
+    if setor is not None:
+        mask &= (cubo['setor_cnae'] == setor).to_numpy()
+    if momento is not None:
+        mask &= (cubo['momento_empresa'] == momento).to_numpy()
+    if meses is not None:
+        mask &= np.isin(cubo['mes'].to_numpy(), meses)
+
+    medidas = [c for c in cubo.columns if c not in KEYS]
+    data = cubo.loc[mask, ['mes'] + medidas].groupby('mes', sort=True).sum().reset_index()
+    data.insert(0, 'MesAno', periods.month_labels(data['mes']))
+    for col in TICKETS:
+        data[col] = data[f'{col}_soma'] / data[f'{col}_qtd'].replace(0, np.nan)
+    return data
+
+
+def company_series(df_main, linhas, meses, colunas=('total_recebido', 'total_pago')):
+    """
+    Série mensal de uma empresa: as ``colunas`` das suas ``linhas`` (posições
+    em ``df_main``) somadas pelo código de mês de cada linha (``meses``, um por
+    linha de ``df_main``), ordenadas por mês e com ``MesAno``. Linhas sem mês
+    ficam de fora.
+    """
+    linhas = linhas[meses[linhas] != periods.MISSING]
+    codigos, grupos = np.unique(meses[linhas], return_inverse=True)
+    data = pd.DataFrame({'MesAno': periods.month_labels(codigos)})
+    for coluna in colunas:
+        valores = df_main[coluna].to_numpy()[linhas].astype(np.float64)
+        data[coluna] = np.bincount(grupos, weights=valores, minlength=len(codigos))
+    return data
+
+
+def apply_delta(cubo, antigas, novas):
+    """
+    Atualiza o cubo trocando a contribuição das linhas ``antigas`` do ``df_main``
+    pela das ``novas`` (ex.: empresas afetadas por um lote de transações).
+    """
+    remover = build_monthly_cube(antigas)
+    medidas = [c for c in cubo.columns if c not in KEYS]
+    remover[medidas] = -remover[medidas]
+
+    combinado = pd.concat([cubo, remover, build_monthly_cube(novas)], ignore_index=True)
+    combinado = combinado.groupby(KEYS, sort=True, observed=True).sum().reset_index()
+    return combinado[combinado['num_linhas'] != 0].reset_index(drop=True)
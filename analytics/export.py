@@ -0,0 +1,138 @@
+"""
+Exportação dos dados filtrados em blocos de linhas.
+
+Nada é serializado até alguém pedir o arquivo: ``export`` é chamado pelo
+botão de download (``data`` como função) ou pela linha de comando. O frame é
+escrito em blocos de ``chunk_rows`` linhas num arquivo temporário que passa
+para o disco acima de ``SPOOL_BYTES``, de modo que o maior objeto montado em
+memória é um bloco, não o arquivo inteiro. Com ``linhas`` (posições de um
+filtro, como as de ``FilterEngine.transaction_rows``) os blocos saem direto da
+tabela inteira, sem materializar antes o recorte filtrado. Os formatos são CSV, CSV com gzip e
+Parquet (um row group por bloco). Com o relatório da representação compacta
+(``analytics.compact``), cada bloco volta aos dtypes de origem antes de ser
+escrito e o CSV sai idêntico ao de ``DataFrame.to_csv``.
+
+Uso:
+    python -m analytics.export dados.parquet [--tabela base_transacoes] [--formato parquet] [--mes 04/2025]
+"""
+import argparse
+import gzip
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analytics import compact, filters, periods, snapshot
+
+CHUNK_ROWS = 100_000
+SPOOL_BYTES = 32 * 2 ** 20
+# formato -> (extensão, MIME)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def row_count(df, linhas=None):
+    """Linhas exportadas: as de ``linhas`` (posições) ou todas de ``df``."""
+    return len(df) if linhas is None else len(linhas)
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS, relatorio=None, tabela=None, linhas=None):
+    """
+    Blocos consecutivos de ``df`` ou só das posições ``linhas`` (restaurados aos
+    dtypes de origem se houver ``relatorio``).
+    """
+    for inicio in range(0, max(row_count(df, linhas), 1), chunk_rows):
+        if linhas is None:
+            bloco = df.iloc[inicio:inicio + chunk_rows]
+        else:
+            bloco = df.take(linhas[inicio:inicio + chunk_rows])
+        if relatorio is not None:
+            bloco = compact.restore(bloco, relatorio, tabela)
+        yield bloco
+
+
+def write_csv(df, destino, chunk_rows=CHUNK_ROWS, relatorio=None, tabela=None, linhas=None):
+    """Escreve ``df`` como CSV UTF-8 no arquivo binário ``destino``, bloco a bloco."""
+    for i, bloco in enumerate(iter_chunks(df, chunk_rows, relatorio, tabela, linhas)):
+        destino.write(bloco.to_csv(index=False, header=i == 0).encode('utf-8'))
+
+
+def write_parquet(df, destino, chunk_rows=CHUNK_ROWS, relatorio=None, tabela=None, linhas=None):
+    """Escreve ``df`` como Parquet no arquivo binário ``destino``, um row group por bloco."""
+    escritor = None
+    try:
+        for bloco in iter_chunks(df, chunk_rows, relatorio, tabela, linhas):
+            tabela_arrow = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabela_arrow.schema)
+            else:
+                tabela_arrow = tabela_arrow.cast(escritor.schema)
+            escritor.write_table(tabela_arrow)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def write(df, formato, destino, chunk_rows=CHUNK_ROWS, relatorio=None, tabela=None, linhas=None):
+    """Escreve ``df`` no ``formato`` (chave de ``FORMATS``) no arquivo binário ``destino``."""
+    if formato not in FORMATS:
+        raise ValueError(f"Formato desconhecido: {formato!r} (use {', '.join(FORMATS)})")
+    if formato == "parquet":
+        write_parquet(df, destino, chunk_rows, relatorio, tabela, linhas)
+    elif formato == "csv.gz":
+        # mtime=0: o mesmo conteúdo gera sempre o mesmo arquivo
+        with gzip.GzipFile(fileobj=destino, mode='wb', mtime=0) as comprimido:
+            write_csv(df, comprimido, chunk_rows, relatorio, tabela, linhas)
+    else:
+        write_csv(df, destino, chunk_rows, relatorio, tabela, linhas)
+
+
+def export(df, formato, chunk_rows=CHUNK_ROWS, relatorio=None, tabela=None, spool_bytes=SPOOL_BYTES, linhas=None):
+    """Arquivo temporário (posicionado no início) com ``df`` (ou suas ``linhas``) no ``formato``."""
+    arquivo = tempfile.SpooledTemporaryFile(max_size=spool_bytes, mode='w+b')
+    try:
+        write(df, formato, arquivo, chunk_rows, relatorio, tabela, linhas)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
+
+
+def file_name(base, formato):
+    return base + FORMATS[formato][0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta uma tabela do snapshot (opcionalmente filtrada) em blocos.")
+    parser.add_argument("saida", help="Arquivo de saída")
+    parser.add_argument("--tabela", default="df_main", choices=["df_main", "base_transacoes"])
+    parser.add_argument("--formato", default=None, choices=list(FORMATS),
+                        help="Formato (padrão: pela extensão da saída)")
+    parser.add_argument("--setor", default=None, help="Filtro de setor (só df_main)")
+    parser.add_argument("--momento", default=None, help="Filtro de momento (só df_main)")
+    parser.add_argument("--mes", nargs="*", default=None, help="Meses no formato MM/AAAA")
+    parser.add_argument("--blocos", type=int, default=CHUNK_ROWS, help="Linhas por bloco")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    args = parser.parse_args(argv)
+
+    formato = args.formato or next((f for f in ("csv.gz", "parquet") if args.saida.endswith(FORMATS[f][0])), "csv")
+    tabelas = snapshot.load_snapshot(args.data_dir)
+    motor = filters.FilterEngine(tabelas['df_main'], tabelas['base_transacoes'])
+    meses = None if not args.mes else periods.parse_month_labels(args.mes)
+    if args.tabela == "df_main":
+        df, linhas = tabelas['df_main'], motor.company_rows(args.setor, args.momento, meses)
+    else:
+        df, linhas = tabelas['base_transacoes'], motor.transaction_rows(meses)
+
+    with open(args.saida, "wb") as f:
+        write(df, formato, f, args.blocos, linhas=linhas)
+    print(f"{row_count(df, linhas)} linhas de {args.tabela} em {args.saida} ({formato}, {os.path.getsize(args.saida) / 2 ** 20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Exposição das empresas a contrapartes por momento (ou setor), propagada pela
+rede de transações com produtos matriz-vetor esparsos.
+
+A matriz ``S`` (recebedor × pagador, CSR) guarda a fração do valor recebido
+por cada empresa que veio de cada pagador; cada linha soma 1 (ou 0, sem
+recebimentos). Com ``T`` a matriz indicadora empresa × categoria (uma coluna
+por momento ou setor), a exposição direta é ``S @ T``: a fração do recebido
+que veio de empresas de cada categoria. A exposição em ``k`` saltos é
+``S @ (exposição em k - 1 saltos)``: a fração do recebido que veio de
+pagadores cujo recebido, ``k - 1`` saltos acima, veio daquela categoria. Todas
+as empresas e categorias saem de uma vez, sem laços sobre o grafo.
+
+As colunas (``Exposicao_<Categoria>_Direta``, ``Exposicao_<Categoria>_<k>_Saltos``)
+formam as tabelas ``exposicao_periodo`` (período inteiro, pela tabela de
+arestas) e ``exposicao_mensal`` (mês a mês) do snapshot. Pela linha de comando
+os meses podem ser calculados em paralelo, e ``--gravar-rede`` acrescenta as
+colunas do período ao ``dados_rede_para_powerbi.csv`` (para o Power BI).
+
+Uso:
+    python -m analytics.exposure [--data-dir data] [--por momento_empresa] [--saltos 2] [--mensal] [--workers 4]
+                                 [--saida exposicao.csv | --gravar-rede]
+"""
+import argparse
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from analytics import mix, periods, search
+
+PREFIX = 'Exposicao'
+GROUPS = ('momento_empresa', 'setor_cnae')
+HOPS = 2
+# Momento acompanhado pela mesa de risco (destacado no Detalhamento)
+RISK_GROUP = 'DECLÍNIO'
+
+
+def _column_key(categoria):
+    return "_".join(search.normalize(categoria).title().split())
+
+
+def column_name(categoria, salto):
+    """
+    Nome da coluna de exposição à ``categoria`` em ``salto`` saltos (1 = direta).
+    Categorias que só diferem por caixa ou acento caem na mesma coluna.
+    """
+    return f"{PREFIX}_{_column_key(categoria)}_" + ("Direta" if salto == 1 else f"{salto}_Saltos")
+
+
+def column_labels(categorias, saltos=HOPS):
+    """
+    Rótulos de exibição (categorias originais e saltos) das colunas de
+    exposição, na ordem das colunas; uma coluna compartilhada por categorias
+    que colidem lista todas elas.
+    """
+    rotulos = {}
+    for s in range(1, saltos + 1):
+        sufixo = 'direta' if s == 1 else f'{s} saltos'
+        for c in categorias:
+            rotulos.setdefault(column_name(c, s), ({}, sufixo))[0][str(c)] = None
+    return {nome: f"{' / '.join(cs)} ({sufixo})" for nome, (cs, sufixo) in rotulos.items()}
+
+
+# --- Matriz de Participações ---
+def share_matrix(origem, destino, valores, n_nos):
+    """
+    Matriz CSR (n × n, recebedor × pagador) com a fração do valor recebido por
+    cada empresa que veio de cada pagador (pares repetidos são somados).
+    """
+    matriz = sparse.csr_matrix((np.asarray(valores, dtype=np.float64), (destino, origem)), shape=(n_nos, n_nos))
+    matriz.sum_duplicates()
+    recebido = np.asarray(matriz.sum(axis=1)).ravel()
+    escala = np.divide(1.0, recebido, out=np.zeros(n_nos), where=recebido > 0)
+    return sparse.diags(escala).tocsr() @ matriz
+
+
+def exposure_scores(pagadores, recebedores, valores, grupos, saltos=HOPS):
+    """
+    Exposição de cada empresa de ``grupos`` (categoria indexada pelo id) a cada
+    categoria, de 1 a ``saltos`` saltos, a partir das transações (ou arestas)
+    pagador → recebedor com valor positivo. Contrapartes fora de ``grupos``
+    entram na rede, mas não têm categoria.
+    """
+    empresas = np.asarray(grupos.index, dtype=object)
+    valores = np.asarray(valores, dtype=np.float64)
+    positivos = valores > 0
+    pagadores = np.asarray(pagadores, dtype=object)[positivos]
+    recebedores = np.asarray(recebedores, dtype=object)[positivos]
+    codigos, ids = pd.factorize(np.concatenate([empresas, pagadores, recebedores]))
+    m, k = len(empresas), len(pagadores)
+    participacoes = share_matrix(codigos[m:m + k], codigos[m + k:], valores[positivos], len(ids))
+
+    categorias, rotulos = pd.factorize(pd.Series(np.asarray(grupos, dtype=object)), sort=True)
+    # Uma coluna por nome: categorias que colidem (caixa/acento) somam as marcas
+    colunas_categoria, chaves = pd.factorize(pd.Index([_column_key(c) for c in rotulos], dtype=object))
+    representantes = rotulos[np.unique(colunas_categoria, return_index=True)[1]]
+    marcas = np.zeros((len(ids), len(chaves)))
+    com_categoria = categorias >= 0
+    marcas[codigos[:m][com_categoria], colunas_categoria[categorias[com_categoria]]] = 1.0
+
+    colunas, exposicao = {}, marcas
+    for salto in range(1, saltos + 1):
+        exposicao = participacoes @ exposicao
+        for j, categoria in enumerate(representantes):
+            colunas[column_name(categoria, salto)] = exposicao[codigos[:m], j]
+    return pd.DataFrame(colunas, index=pd.Index(empresas, name='id_empresa'))
+
+
+def company_groups(df_main, por=GROUPS[0]):
+    """Categoria (``por``) de cada empresa do ``df_main``, indexada pelo id."""
+    return mix.company_attributes(df_main)[por]
+
+
+# --- Período Inteiro e por Mês ---
+def network_exposure(arestas, grupos, saltos=HOPS):
+    """Colunas de exposição do período inteiro a partir da tabela de arestas (``valor_total`` por par)."""
+    return exposure_scores(arestas['id_pagador'], arestas['id_recebedor'], arestas['valor_total'], grupos, saltos)
+
+
+def build_network_exposure(arestas, df_main):
+    """Tabela ``exposicao_periodo`` do snapshot: exposição por momento no período inteiro, por empresa."""
+    return network_exposure(arestas, company_groups(df_main)).reset_index()
+
+
+def _month_scores(mes, pagadores, recebedores, valores, grupos, saltos):
+    scores = exposure_scores(pagadores, recebedores, valores, grupos, saltos)
+    # Empresas sem exposição no mês (sem recebimentos de empresas conhecidas) ficam de fora
+    scores = scores[scores.to_numpy().any(axis=1)].reset_index()
+    scores.insert(0, 'mes', np.int32(mes))
+    return scores
+
+
+def monthly_exposure(base_transacoes, grupos, saltos=HOPS, workers=None):
+    """
+    Tabela longa (``mes``, ``id_empresa`` e as colunas de exposição) com a
+    rede de cada mês. Os meses são independentes e, com mais de um worker,
+    calculados em um pool de processos.
+    """
+    meses = periods.month_codes(base_transacoes['DT_REFE'])
+    validas = np.flatnonzero(meses != periods.MISSING)
+    ordem = validas[np.argsort(meses[validas], kind='stable')]
+    inicios = np.flatnonzero(np.r_[True, meses[ordem][1:] != meses[ordem][:-1]]) if len(ordem) else []
+    fatias = np.split(ordem, inicios[1:]) if len(ordem) else []
+
+    pagadores = base_transacoes['ID_PGTO'].to_numpy()
+    recebedores = base_transacoes['ID_RCBE'].to_numpy()
+    valores = base_transacoes['VL'].to_numpy(dtype=np.float64)
+    tarefas = [(meses[f[0]], pagadores[f], recebedores[f], valores[f]) for f in fatias]
+
+    workers = min(workers or os.cpu_count() or 1, max(len(tarefas), 1))
+    if workers == 1:
+        partes = [_month_scores(*t, grupos, saltos) for t in tarefas]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            partes = list(pool.map(_month_scores, *zip(*tarefas), [grupos] * len(tarefas), [saltos] * len(tarefas)))
+    if not partes:
+        colunas = ['mes', 'id_empresa'] + list(column_labels(sorted(grupos.dropna().unique()), saltos))
+        return pd.DataFrame({c: [] for c in colunas})
+    return pd.concat(partes, ignore_index=True)
+
+
+def build_monthly_exposure(base_transacoes, df_main):
+    """
+    Tabela ``exposicao_mensal`` do snapshot: exposição por momento, mês a mês.
+    Calculada em série: o snapshot pode ser reconstruído dentro do servidor
+    Streamlit, onde um pool de processos faria fork de um processo com threads
+    (o pool fica para ``python -m analytics.exposure --mensal --workers N``).
+    """
+    return monthly_exposure(base_transacoes, company_groups(df_main), workers=1)
+
+
+def apply_batch(tabelas, lote, empresas_novas=()):
+    """
+    Atualiza ``exposicao_mensal`` com o lote (``tabelas`` já com as
+    transações e o ``df_main`` atualizados). Cada mês é independente: só os
+    meses do lote são recalculados, mais os meses em que ``empresas_novas``
+    já transacionavam (agora com categoria). Se as categorias mudarem (e com
+    elas as colunas), a tabela é refeita.
+    """
+    grupos = company_groups(tabelas['df_main'])
+    anterior = tabelas['exposicao_mensal']
+    base = tabelas['base_transacoes']
+    if set(column_labels(grupos.dropna().unique())) != set(exposure_columns(anterior)):
+        return monthly_exposure(base, grupos, workers=1)
+
+    meses = periods.month_codes(base['DT_REFE'])
+    afetados = np.union1d(periods.month_codes(lote['DT_REFE']), meses[
+        base['ID_PGTO'].isin(empresas_novas).to_numpy() | base['ID_RCBE'].isin(empresas_novas).to_numpy()])
+    afetados = afetados[afetados != periods.MISSING]
+    recalculados = monthly_exposure(base.take(np.flatnonzero(np.isin(meses, afetados))), grupos, workers=1)
+    mantidos = anterior[~anterior['mes'].isin(afetados)]
+    return pd.concat([mantidos, recalculados[list(anterior.columns)]], ignore_index=True).sort_values(
+        'mes', kind='stable', ignore_index=True)
+
+
+def exposure_columns(df):
+    """Colunas de exposição presentes em ``df``."""
+    return [c for c in df.columns if str(c).startswith(PREFIX + '_')]
+
+
+def write_network_columns(metricas, caminho):
+    """Grava as colunas de ``metricas`` no ``dados_rede_para_powerbi.csv``, substituindo as de exposição anteriores."""
+    rede = pd.read_csv(caminho, sep=';', encoding='utf-8-sig', decimal=',')
+    rede = rede.drop(columns=exposure_columns(rede))
+    chave = 'id_empresa' if 'id_empresa' in rede.columns else 'ID'
+    rede = rede.join(metricas, on=chave)
+    rede[list(metricas.columns)] = rede[list(metricas.columns)].fillna(0)
+    rede.to_csv(caminho, index=False, sep=';', decimal=',')
+
+
+def main(argv=None):
+    from analytics import features, snapshot
+
+    parser = argparse.ArgumentParser(description="Calcula a exposição das empresas a contrapartes por momento ou setor.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório de dados (padrão: data)")
+    parser.add_argument("--por", choices=GROUPS, default=GROUPS[0], help="Categoria das contrapartes (padrão: momento_empresa)")
+    parser.add_argument("--saltos", type=int, default=HOPS, help="Saltos de propagação (padrão: 2)")
+    parser.add_argument("--mensal", action="store_true", help="Calcula mês a mês (pool de processos)")
+    parser.add_argument("--workers", type=int, default=None, help="Processos no pool (padrão: núcleos da máquina)")
+    saida = parser.add_mutually_exclusive_group()
+    saida.add_argument("--saida", default=None, help="Grava as exposições em CSV (padrão: só imprime o resumo)")
+    saida.add_argument("--gravar-rede", action="store_true",
+                       help="Acrescenta as colunas do período inteiro ao dados_rede_para_powerbi.csv")
+    args = parser.parse_args(argv)
+    if args.gravar_rede and args.mensal:
+        parser.error("--gravar-rede grava as colunas do período inteiro (sem --mensal)")
+
+    tabelas = snapshot.load_snapshot(args.data_dir)
+    grupos = company_groups(tabelas['df_main'], args.por)
+
+    inicio = time.perf_counter()
+    if args.mensal:
+        metricas = monthly_exposure(tabelas['base_transacoes'], grupos, args.saltos, args.workers)
+    else:
+        arestas = tabelas.get('arestas')
+        if arestas is None:
+            arestas = features.edge_aggregates(tabelas['base_transacoes'])
+        metricas = network_exposure(arestas, grupos, args.saltos)
+    print(f"Exposição de {len(metricas):,} linhas em {time.perf_counter() - inicio:.2f}s")
+
+    if args.gravar_rede:
+        caminho = snapshot.source_path("df_rede", args.data_dir)
+        write_network_columns(metricas, caminho)
+        print(f"Colunas gravadas em {caminho}")
+    elif args.saida:
+        metricas.reset_index(drop=args.mensal).to_csv(args.saida, sep=';', decimal=',', index=False)
+    else:
+        print(metricas[exposure_columns(metricas)].describe().T)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Features financeiras por empresa a partir da tabela de arestas.
+
+A tabela de arestas agrega as transações por par (pagador, recebedor) com
+``valor_total`` e ``num_transacoes``, como no notebook. Ela é suficiente para
+recompor todas as features de ``dados_para_powerbi.csv``, inclusive as
+contagens distintas (cada par é um cliente/fornecedor único), e pode ser
+atualizada somando pares de novos lotes de transações.
+
+Para arquivos maiores que a memória, ``build_features`` lê as transações em
+blocos (row groups do Parquet ou chunks do CSV), calcula agregados parciais
+em um pool de processos e os combina. As contagens distintas podem ser exatas
+(pares pagador → recebedor deduplicados) ou aproximadas por HyperLogLog, que
+ocupa no máximo ``2**precisao`` bytes por empresa.
+
+Uso:
+    python -m analytics.features transacoes.parquet --saida features.parquet [--workers 4] [--hll]
+"""
+import argparse
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow é opcional fora do snapshot
+    pq = None
+
+EDGE_KEYS = ['id_pagador', 'id_recebedor']
+READ_COLS = ['ID_PGTO', 'ID_RCBE', 'VL']
+CHUNK_ROWS = 1_000_000
+HLL_PRECISION = 12
+FEATURE_COLS = [
+    'total_recebido', 'num_transacoes_recebidas', 'num_clientes_unicos',
+    'total_pago', 'num_transacoes_pagas', 'num_fornecedores_unicos',
+    'fluxo_caixa_liquido', 'ticket_medio_recebido', 'ticket_medio_pago'
+]
+
+
+def edge_aggregates(transacoes):
+    """Agrega transações (``ID_PGTO``, ``ID_RCBE``, ``VL``) por par pagador → recebedor."""
+    arestas = transacoes.groupby(['ID_PGTO', 'ID_RCBE'], sort=True, observed=True).agg(
+        valor_total=('VL', 'sum'),
+        num_transacoes=('VL', 'count')
+    ).reset_index()
+    return arestas.rename(columns={'ID_PGTO': 'id_pagador', 'ID_RCBE': 'id_recebedor'})
+
+
+def merge_edges(*tabelas):
+    """Soma tabelas de arestas parciais (pares repetidos são acumulados)."""
+    arestas = pd.concat(tabelas, ignore_index=True)
+    return arestas.groupby(EDGE_KEYS, sort=True, observed=True)[['valor_total', 'num_transacoes']].sum().reset_index()
+
+
+def company_features(arestas, ids=None):
+    """
+    Calcula as features de ``FEATURE_COLS`` por empresa (índice ``id_empresa``).
+    Com ``ids`` o cálculo fica restrito a essas empresas.
+    """
+    if ids is not None:
+        ids = pd.Index(ids)
+        arestas = arestas[arestas['id_pagador'].isin(ids) | arestas['id_recebedor'].isin(ids)]
+
+    recebimentos = arestas.groupby('id_recebedor', observed=True).agg(
+        total_recebido=('valor_total', 'sum'),
+        num_transacoes_recebidas=('num_transacoes', 'sum'),
+        num_clientes_unicos=('id_pagador', 'count')
+    )
+    pagamentos = arestas.groupby('id_pagador', observed=True).agg(
+        total_pago=('valor_total', 'sum'),
+        num_transacoes_pagas=('num_transacoes', 'sum'),
+        num_fornecedores_unicos=('id_recebedor', 'count')
+    )
+    return finalize_features(recebimentos, pagamentos, ids)
+
+
+def finalize_features(recebimentos, pagamentos, ids=None):
+    """Junta recebimentos e pagamentos por empresa e deriva fluxo e tickets médios."""
+    if ids is None:
+        ids = recebimentos.index.union(pagamentos.index)
+    df = pd.DataFrame(index=pd.Index(ids, name='id_empresa'))
+    df = df.join(recebimentos).join(pagamentos).astype(np.float64).fillna(0)
+
+    df['fluxo_caixa_liquido'] = df['total_recebido'] - df['total_pago']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['ticket_medio_recebido'] = df['total_recebido'] / df['num_transacoes_recebidas']
+        df['ticket_medio_pago'] = df['total_pago'] / df['num_transacoes_pagas']
+    return df[FEATURE_COLS].fillna(0)
+
+
+# --- Agregados Parciais (out-of-core) ---
+def _bit_length(valores):
+    """``int.bit_length`` vetorizado para uint64 (exato: cada metade cabe no float64)."""
+    alto = (valores >> np.uint64(32)).astype(np.float64)
+    baixo = (valores & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(alto > 0, np.frexp(alto)[1] + 32, np.frexp(baixo)[1])
+
+
+def hll_sketch(empresas, contrapartes, precisao=HLL_PRECISION):
+    """
+    Registros HyperLogLog das contrapartes de cada empresa, em formato esparso:
+    ``(id_empresa, registro, rank)`` com o maior rank observado por registro.
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(contrapartes), index=False).to_numpy()
+    restante = 64 - precisao
+    registro = (hashes >> np.uint64(restante)).astype(np.int32)
+    sufixo = hashes & np.uint64((1 << restante) - 1)
+    rank = (restante - _bit_length(sufixo) + 1).astype(np.int8)
+
+    sketch = pd.DataFrame({'id_empresa': np.asarray(empresas), 'registro': registro, 'rank': rank})
+    return sketch.groupby(['id_empresa', 'registro'], sort=False, observed=True)['rank'].max().reset_index()
+
+
+def hll_estimate(sketch, precisao=HLL_PRECISION):
+    """Estimativa HyperLogLog (com correção de linear counting) por empresa."""
+    m = float(1 << precisao)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    por_empresa = sketch.assign(inverso=np.exp2(-sketch['rank'].astype(np.float64))).groupby(
+        'id_empresa', observed=True).agg(soma=('inverso', 'sum'), ocupados=('registro', 'count'))
+
+    vazios = m - por_empresa['ocupados']
+    estimativa = alpha * m * m / (por_empresa['soma'] + vazios)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / vazios)
+    pequenas = (estimativa <= 2.5 * m) & (vazios > 0)
+    return estimativa.where(~pequenas, linear).round()
+
+
+def partial_features(transacoes, distintos='exato', precisao=HLL_PRECISION):
+    """
+    Agregado parcial de um bloco de transações: somas e contagens por empresa
+    nos dois papéis e, para as contagens distintas, os pares (``exato``) ou os
+    registros HyperLogLog (``hll``).
+    """
+    valores = pd.to_numeric(transacoes['VL'], errors='coerce').fillna(0)
+    transacoes = transacoes.assign(VL=valores)
+    parcial = {
+        'recebimentos': transacoes.groupby('ID_RCBE', observed=True)['VL'].agg(['sum', 'count']),
+        'pagamentos': transacoes.groupby('ID_PGTO', observed=True)['VL'].agg(['sum', 'count']),
+    }
+    if distintos == 'hll':
+        pares = transacoes[['ID_PGTO', 'ID_RCBE']].dropna()
+        parcial['clientes'] = hll_sketch(pares['ID_RCBE'], pares['ID_PGTO'], precisao)
+        parcial['fornecedores'] = hll_sketch(pares['ID_PGTO'], pares['ID_RCBE'], precisao)
+    else:
+        parcial['pares'] = transacoes[['ID_PGTO', 'ID_RCBE']].dropna().drop_duplicates()
+    return parcial
+
+
+def merge_partials(parciais):
+    """Combina agregados parciais de ``partial_features``."""
+    combinado = {}
+    for chave in parciais[0]:
+        partes = pd.concat([p[chave] for p in parciais])
+        if chave in ('recebimentos', 'pagamentos'):
+            combinado[chave] = partes.groupby(level=0, observed=True).sum()
+        elif chave == 'pares':
+            combinado[chave] = partes.drop_duplicates()
+        else:
+            combinado[chave] = partes.groupby(['id_empresa', 'registro'], sort=False, observed=True)['rank'].max().reset_index()
+    return combinado
+
+
+def features_from_partial(parcial, precisao=HLL_PRECISION):
+    """Features finais (``FEATURE_COLS``) a partir do agregado combinado."""
+    recebimentos = parcial['recebimentos'].rename(columns={'sum': 'total_recebido', 'count': 'num_transacoes_recebidas'})
+    pagamentos = parcial['pagamentos'].rename(columns={'sum': 'total_pago', 'count': 'num_transacoes_pagas'})
+    if 'pares' in parcial:
+        clientes = parcial['pares'].groupby('ID_RCBE', observed=True).size()
+        fornecedores = parcial['pares'].groupby('ID_PGTO', observed=True).size()
+    else:
+        clientes = hll_estimate(parcial['clientes'], precisao)
+        fornecedores = hll_estimate(parcial['fornecedores'], precisao)
+    recebimentos['num_clientes_unicos'] = clientes.reindex(recebimentos.index).fillna(0)
+    pagamentos['num_fornecedores_unicos'] = fornecedores.reindex(pagamentos.index).fillna(0)
+    return finalize_features(recebimentos, pagamentos)
+
+
+# --- Leitura em Blocos ---
+def iter_csv_chunks(path, chunksize=CHUNK_ROWS, sep=';', decimal=','):
+    """Blocos de um CSV de transações (apenas as colunas usadas nas features)."""
+    return pd.read_csv(path, sep=sep, decimal=decimal, encoding='utf-8-sig',
+                       usecols=lambda c: c.strip() in READ_COLS, chunksize=chunksize)
+
+
+def parquet_tasks(path, chunksize=CHUNK_ROWS):
+    """Agrupa os row groups de um Parquet em tarefas de cerca de ``chunksize`` linhas."""
+    metadados = pq.ParquetFile(path).metadata
+    tarefas, atual, linhas = [], [], 0
+    for i in range(metadados.num_row_groups):
+        atual.append(i)
+        linhas += metadados.row_group(i).num_rows
+        if linhas >= chunksize:
+            tarefas.append(atual)
+            atual, linhas = [], 0
+    if atual:
+        tarefas.append(atual)
+    return tarefas
+
+
+def _parquet_partial(path, grupos, distintos, precisao):
+    bloco = pq.ParquetFile(path).read_row_groups(grupos, columns=READ_COLS).to_pandas()
+    return partial_features(bloco, distintos, precisao)
+
+
+def _csv_partial(bloco, distintos, precisao):
+    bloco.columns = bloco.columns.str.strip()
+    return partial_features(bloco, distintos, precisao)
+
+
+def build_features(path, chunksize=CHUNK_ROWS, workers=None, distintos='exato',
+                   precisao=HLL_PRECISION, sep=';', decimal=','):
+    """
+    Calcula as features de todas as empresas de um arquivo de transações
+    (Parquet ou CSV) sem carregá-lo inteiro. ``workers=1`` processa no próprio
+    processo; caso contrário os blocos são distribuídos em um pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("A leitura de Parquet requer o pacote 'pyarrow'.")
+        tarefas = ((_parquet_partial, path, grupos) for grupos in parquet_tasks(path, chunksize))
+    else:
+        tarefas = ((_csv_partial, bloco) for bloco in iter_csv_chunks(path, chunksize, sep, decimal))
+
+    parciais = []
+
+    def acumular(parcial):
+        parciais.append(parcial)
+        # Combina periodicamente para manter a memória limitada
+        if len(parciais) >= 8:
+            parciais[:] = [merge_partials(parciais)]
+
+    if workers == 1:
+        for funcao, *args in tarefas:
+            acumular(funcao(*args, distintos, precisao))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            pendentes = set()
+            for funcao, *args in tarefas:
+                # No máximo 2 blocos por worker em voo (os chunks do CSV vêm do processo principal)
+                if len(pendentes) >= 2 * workers:
+                    prontos, pendentes = concurrent.futures.wait(pendentes, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for futuro in prontos:
+                        acumular(futuro.result())
+                pendentes.add(pool.submit(funcao, *args, distintos, precisao))
+            for futuro in concurrent.futures.as_completed(pendentes):
+                acumular(futuro.result())
+
+    if not parciais:
+        return pd.DataFrame(columns=FEATURE_COLS, index=pd.Index([], name='id_empresa'), dtype=np.float64)
+    return features_from_partial(merge_partials(parciais), precisao)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula as features por empresa a partir de um arquivo de transações.")
+    parser.add_argument("transacoes", help="Arquivo Parquet ou CSV com ID_PGTO, ID_RCBE e VL")
+    parser.add_argument("--saida", required=True, help="Arquivo de saída (.parquet ou .csv)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="Linhas por bloco")
+    parser.add_argument("--workers", type=int, default=None, help="Processos no pool (padrão: núcleos da máquina)")
+    parser.add_argument("--hll", action="store_true", help="Contagens distintas aproximadas (HyperLogLog)")
+    parser.add_argument("--precisao", type=int, default=HLL_PRECISION, help="Bits de precisão do HyperLogLog")
+    parser.add_argument("--sep", default=';', help="Separador do CSV (padrão: ;)")
+    parser.add_argument("--decimal", default=',', help="Separador decimal do CSV (padrão: ,)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    df = build_features(args.transacoes, args.chunksize, args.workers, 'hll' if args.hll else 'exato',
+                        args.precisao, args.sep, args.decimal)
+    if args.saida.endswith('.parquet'):
+        df.reset_index().to_parquet(args.saida, index=False)
+    else:
+        df.reset_index().to_csv(args.saida, index=False)
+    print(f"Features de {len(df):,} empresas em {time.perf_counter() - inicio:.2f}s -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
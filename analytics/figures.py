@@ -0,0 +1,203 @@
+"""
+Construção enxuta das figuras Plotly do dashboard.
+
+Os traços são montados direto dos arrays (um traço por série, sem laços de
+``add_shape``) e os valores seguem para o JSON no menor dtype exato
+(``int32``/``float32`` quando a conversão não perde nada; o Plotly serializa
+arrays NumPy como binário tipado). Linhas com mais de ``WEBGL_POINTS``
+pontos usam ``Scattergl`` e, acima de ``MAX_POINTS``, são reduzidas no
+servidor pelo algoritmo LTTB (Largest-Triangle-Three-Buckets), que preserva
+picos e vales. Os dois limites podem ser trocados pelas variáveis de ambiente
+``DASHBOARD_WEBGL_POINTS`` e ``DASHBOARD_MAX_POINTS``.
+
+``cached`` guarda a figura pronta (e o tamanho do seu JSON) num
+``ResultCache`` sob a impressão digital dos dados de entrada, de modo que a
+mesma entrada não reconstrói a figura em nenhuma sessão.
+"""
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from analytics import compact, resultcache
+
+WEBGL_POINTS = int(os.environ.get("DASHBOARD_WEBGL_POINTS", 1000))
+MAX_POINTS = int(os.environ.get("DASHBOARD_MAX_POINTS", 2000))
+
+
+# --- Arrays ---
+def lean(valores):
+    """Array NumPy no menor dtype exato (rótulos e datas ficam como estão)."""
+    serie = pd.Series(valores)
+    if serie.dtype.kind in 'if':
+        return compact.compact_numeric(serie.astype(np.float64) if serie.dtype.kind == 'f' else serie).to_numpy()
+    return serie.to_numpy()
+
+
+def lttb(x, y, n):
+    """
+    Índices dos ``n`` pontos escolhidos pelo LTTB (o primeiro e o último sempre
+    ficam); ``x`` numérico e crescente. Com ``len(x) <= n`` devolve todos.
+    """
+    total = len(x)
+    if n >= total or n < 3:
+        return np.arange(total)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    limites = np.linspace(1, total - 1, n - 1).astype(np.int64)  # n - 2 baldes entre o primeiro e o último
+    escolhidos = np.empty(n, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, total - 1
+    anterior = 0
+    for i in range(n - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else total
+        media_x = x[fim:proximo_fim].mean() if proximo_fim > fim else x[-1]
+        media_y = y[fim:proximo_fim].mean() if proximo_fim > fim else y[-1]
+        # Área do triângulo (anterior, candidato, média do próximo balde), sem o fator 1/2
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.nanargmax(areas)) if len(areas) else inicio
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def _posicoes(x):
+    """Eixo numérico para o LTTB: o próprio ``x`` se numérico/data, senão a posição."""
+    x = pd.Series(x)
+    if x.dtype.kind in 'iuf':
+        return x.to_numpy(dtype=np.float64)
+    if x.dtype.kind == 'M':
+        return x.to_numpy().astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+# --- Figuras ---
+def line(x, series, title, xaxis_title, yaxis_title, markers=True, ticksuffix=None,
+         webgl_points=None, max_points=None):
+    """
+    Linhas de ``series`` (nome -> valores) sobre ``x``: ``Scattergl`` acima de
+    ``webgl_points`` pontos e redução por LTTB acima de ``max_points``.
+    """
+    webgl_points = WEBGL_POINTS if webgl_points is None else webgl_points
+    max_points = MAX_POINTS if max_points is None else max_points
+    x = pd.Series(x).reset_index(drop=True)
+    tracos = []
+    for nome, valores in series.items():
+        valores = pd.Series(valores).reset_index(drop=True)
+        if len(valores) > max_points:
+            validos = valores.notna().to_numpy()
+            indices = np.flatnonzero(validos)[lttb(_posicoes(x[validos]), valores[validos], max_points)]
+            x_serie, valores = x.iloc[indices], valores.iloc[indices]
+        else:
+            x_serie = x
+        Traco = go.Scattergl if len(valores) > webgl_points else go.Scatter
+        tracos.append(Traco(x=lean(x_serie), y=lean(valores), name=nome,
+                            mode='lines+markers' if markers else 'lines'))
+    fig = go.Figure(data=tracos)
+    fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title, showlegend=len(tracos) > 1)
+    if ticksuffix:
+        fig.update_yaxes(ticksuffix=ticksuffix)
+    return fig
+
+
+def bars(categorias, series, title, xaxis_title, yaxis_title, horizontal=False, texttemplate=None,
+         ticksuffix=None, hover=None):
+    """
+    Barras de ``series`` (nome -> valores) por categoria, agrupadas quando há
+    mais de uma série; ``horizontal`` põe as categorias no eixo y.
+    """
+    categorias = lean(categorias)
+    tracos = []
+    for nome, valores in series.items():
+        valores = lean(valores)
+        eixos = dict(y=categorias, x=valores, orientation='h') if horizontal else dict(x=categorias, y=valores)
+        extra = {}
+        if texttemplate:
+            extra.update(text=valores, texttemplate=texttemplate)
+        if hover:
+            extra.update(customdata=np.column_stack([lean(v) for v in hover.values()]),
+                         hovertemplate="%{x}<br>%{y}" + "".join(
+                             f"<br>{rotulo}=%{{customdata[{i}]}}" for i, rotulo in enumerate(hover)) + "<extra></extra>")
+        tracos.append(go.Bar(name=nome, **eixos, **extra))
+    fig = go.Figure(data=tracos)
+    fig.update_layout(barmode='group', title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title,
+                      showlegend=len(tracos) > 1)
+    if ticksuffix:
+        (fig.update_xaxes if horizontal else fig.update_yaxes)(ticksuffix=ticksuffix)
+    return fig
+
+
+def donut(rotulos, valores, title, hole=0.4):
+    return go.Figure(data=[go.Pie(labels=lean(rotulos), values=lean(valores), hole=hole)],
+                     layout=dict(title=title))
+
+
+def lollipop(rotulos, valores, title, xaxis_title, yaxis_title, cor='red', cor_haste='lightgray'):
+    """
+    Pirulitos horizontais: as hastes são um único traço de segmentos
+    (``NaN`` separa um do outro) e as cabeças, um traço de marcadores.
+    """
+    rotulos = np.asarray(rotulos, dtype=object)
+    valores = lean(valores)
+    n = len(valores)
+    posicoes = np.arange(n, dtype=np.int32)
+    hastes_x = np.column_stack([np.zeros(n), valores, np.full(n, np.nan)]).ravel()
+    hastes_y = np.column_stack([posicoes, posicoes, np.full(n, np.nan)]).ravel()
+    fig = go.Figure(data=[
+        go.Scatter(x=lean(hastes_x), y=lean(hastes_y), mode='lines', line=dict(color=cor_haste, width=2),
+                   hoverinfo='skip', showlegend=False, connectgaps=False),
+        go.Scatter(x=valores, y=posicoes, mode='markers', marker=dict(color=cor, size=10), showlegend=False,
+                   customdata=rotulos, hovertemplate="%{customdata}: %{x}<extra></extra>"),
+    ])
+    fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title,
+                      yaxis=dict(tickmode='array', tickvals=posicoes.tolist(), ticktext=rotulos.tolist()))
+    return fig
+
+
+# --- Cache por Impressão Digital ---
+def fingerprint(*partes):
+    """Hash estável do conteúdo de DataFrames, Series, arrays e valores simples."""
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        if isinstance(parte, (pd.DataFrame, pd.Series)):
+            quadro = parte.to_frame() if isinstance(parte, pd.Series) else parte
+            h.update(repr((list(quadro.columns), [str(t) for t in quadro.dtypes])).encode())
+            h.update(pd.util.hash_pandas_object(quadro, index=True).to_numpy().tobytes())
+        elif isinstance(parte, np.ndarray):
+            h.update(str(parte.dtype).encode())
+            h.update(np.ascontiguousarray(parte).tobytes() if parte.dtype != object else repr(parte.tolist()).encode())
+        else:
+            h.update(repr(resultcache.normalize(parte)).encode())
+    return h.hexdigest()
+
+
+def payload_bytes(fig):
+    """Bytes do JSON que vai para o navegador."""
+    return len(pio.to_json(fig, validate=False))
+
+
+class CachedFigure:
+    """Figura pronta, com o tamanho do seu JSON e o tempo que levou para ser montada."""
+
+    def __init__(self, figura, segundos):
+        self.figura = figura
+        self.segundos = segundos
+        self.json_bytes = payload_bytes(figura)
+
+    def __sizeof__(self):
+        # Orçamento do ResultCache: a figura ocupa em memória da ordem do seu JSON
+        return self.json_bytes
+
+
+def cached(cache, nome, construir, dados, versao=None, *parametros):
+    """``CachedFigure`` de ``construir(dados, *parametros)``, pela impressão digital de ``dados`` e ``parametros``."""
+    def montar():
+        inicio = time.perf_counter()
+        figura = construir(dados, *parametros)
+        return CachedFigure(figura, time.perf_counter() - inicio)
+    chave = (f"figura_{nome}", fingerprint(dados, *parametros))
+    return cache.get_or_compute(chave, montar, versao)
@@ -0,0 +1,145 @@
+"""
+Motor de filtros globais sem cópias de dataframe.
+
+``setor_cnae``, ``momento_empresa`` e ``DS_TRAN`` ficam guardados como códigos
+categóricos e o mês como código inteiro de período (``analytics.periods``).
+Cada combinação de filtros vira uma máscara NumPy cujas posições de linha são
+memorizadas num LRU chaveado por (setor, momento, frozenset de meses); assim,
+alternar entre estados de filtro já vistos não recopia as tabelas. Os
+``df_main`` filtrados também ficam num LRU menor (``FRAME_CACHE_SIZE``); as
+transações filtradas não são materializadas por quem só precisa das posições
+(a exportação lê os blocos direto da tabela).
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+CACHE_SIZE = 256
+FRAME_CACHE_SIZE = 8
+
+
+def _categorical_codes(serie):
+    categorias = pd.Categorical(serie)
+    return categorias.codes, categorias.categories
+
+
+def _code_of(categorias, valor):
+    try:
+        return categorias.get_loc(valor)
+    except KeyError:
+        return -2  # nenhum código válido (os ausentes usam -1)
+
+
+def _read_only(linhas):
+    linhas.setflags(write=False)
+    return linhas
+
+
+class FilterEngine:
+    """Seleciona linhas de ``df_main`` e ``base_transacoes`` pelos filtros globais."""
+
+    def __init__(self, df_main, base_transacoes, cache_size=CACHE_SIZE, frame_cache_size=FRAME_CACHE_SIZE):
+        self.df_main = df_main
+        self.base_transacoes = base_transacoes
+
+        self.setor_codigos, self.setores = _categorical_codes(df_main['setor_cnae'])
+        self.momento_codigos, self.momentos = _categorical_codes(df_main['momento_empresa'])
+        self.mes_empresas = periods.month_codes(df_main['DT_REFE'])
+
+        self.mes_transacoes = periods.month_codes(base_transacoes['DT_REFE'])
+        if 'DS_TRAN' in base_transacoes.columns:
+            self.tipo_codigos, self.tipos = _categorical_codes(base_transacoes['DS_TRAN'])
+        else:
+            self.tipo_codigos, self.tipos = None, pd.Index([])
+
+        self._por_empresa = None
+        self._empresas_cache = functools.lru_cache(maxsize=cache_size)(self._company_rows)
+        self._transacoes_cache = functools.lru_cache(maxsize=cache_size)(self._transaction_rows)
+        self._quadros_cache = functools.lru_cache(maxsize=frame_cache_size)(self._company_frame)
+
+    # --- Chaves normalizadas ---
+    @staticmethod
+    def _months_key(meses):
+        return None if meses is None else frozenset(int(m) for m in meses)
+
+    # --- Cálculo das linhas (memorizado) ---
+    def _company_rows(self, setor, momento, meses):
+        mask = np.ones(len(self.df_main), dtype=bool)
+        if setor is not None:
+            mask &= self.setor_codigos == _code_of(self.setores, setor)
+        if momento is not None:
+            mask &= self.momento_codigos == _code_of(self.momentos, momento)
+        if meses is not None:
+            mask &= np.isin(self.mes_empresas, np.fromiter(meses, dtype=np.int32))
+        if mask.all():
+            return None
+        return _read_only(np.flatnonzero(mask))
+
+    def _company_frame(self, setor, momento, meses):
+        linhas = self._empresas_cache(setor, momento, meses)
+        return self.df_main if linhas is None else self.df_main.take(linhas)
+
+    def _transaction_rows(self, meses, tipos):
+        mask = np.ones(len(self.base_transacoes), dtype=bool)
+        if meses is not None:
+            mask &= np.isin(self.mes_transacoes, np.fromiter(meses, dtype=np.int32))
+        if tipos is not None and self.tipo_codigos is not None:
+            codigos = [_code_of(self.tipos, t) for t in tipos]
+            mask &= np.isin(self.tipo_codigos, codigos)
+        if mask.all():
+            return None
+        return _read_only(np.flatnonzero(mask))
+
+    # --- API pública ---
+    def company_rows(self, setor=None, momento=None, meses=None):
+        """
+        Posições das linhas de ``df_main`` que atendem aos filtros (``None`` em
+        um filtro significa "Todos"). Retorna ``None`` quando nenhuma linha é
+        descartada.
+        """
+        return self._empresas_cache(setor, momento, self._months_key(meses))
+
+    def transaction_rows(self, meses=None, tipos=None):
+        """Posições das linhas de ``base_transacoes`` nos meses e tipos informados."""
+        tipos = None if tipos is None else frozenset(tipos)
+        return self._transacoes_cache(self._months_key(meses), tipos)
+
+    def companies(self, setor=None, momento=None, meses=None):
+        """
+        ``df_main`` filtrado (memorizado por estado de filtro; não deve ser
+        alterado); sem filtros efetivos retorna o próprio ``df_main``.
+        """
+        return self._quadros_cache(setor, momento, self._months_key(meses))
+
+    def transactions(self, meses=None, tipos=None):
+        """
+        ``base_transacoes`` filtrada (uma cópia das linhas a cada chamada; para
+        percorrer em blocos, prefira ``transaction_rows``); sem filtros
+        efetivos retorna a própria tabela.
+        """
+        linhas = self.transaction_rows(meses, tipos)
+        return self.base_transacoes if linhas is None else self.base_transacoes.take(linhas)
+
+    def rows_of_company(self, empresa):
+        """
+        Posições das linhas de ``empresa`` em ``df_main`` (todos os meses). O
+        índice por empresa (ordem das linhas agrupadas por id) é montado na
+        primeira chamada.
+        """
+        if self._por_empresa is None:
+            codigos, ids = pd.factorize(self.df_main['id_empresa'])
+            ordem = np.argsort(codigos, kind='stable')
+            inicios = np.searchsorted(codigos[ordem], np.arange(len(ids) + 1))
+            self._por_empresa = (pd.Index(ids), _read_only(ordem), inicios)
+        ids, ordem, inicios = self._por_empresa
+        codigo = ids.get_indexer([empresa])[0]
+        if codigo < 0:
+            return ordem[:0]
+        return ordem[inicios[codigo]:inicios[codigo + 1]]
+
+    def cache_info(self):
+        return {"empresas": self._empresas_cache.cache_info(), "transacoes": self._transacoes_cache.cache_info(),
+                "quadros_empresas": self._quadros_cache.cache_info()}
@@ -0,0 +1,128 @@
+"""
+Painel de crescimento do fluxo de caixa por empresa e por setor.
+
+As matrizes densas empresa × mês e (setor, momento) × mês de
+``fluxo_caixa_liquido`` (meses consecutivos do calendário) são montadas junto
+ao snapshot, e delas saem de uma vez, em NumPy, as bases de cada mês: o fluxo
+do mês anterior, o de três meses antes e a soma móvel de ``WINDOW`` meses
+terminada no mês e no mês anterior. As bases ficam no painel como somas (com
+a contagem de meses presentes), de modo que qualquer recorte dos filtros
+globais é uma soma das linhas do mês e o crescimento sai de ``growth``:
+``(atual - base) / |base|``, ``NaN`` com base zero ou ausente. Assim uma base
+negativa não inverte o sinal do crescimento e uma base zero não vira
+infinito. Os rankings "que mais cresceram" e "maior queda" passam a ser uma
+fatia do painel no mês de referência, inclusive com "Todos" os meses.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+WINDOW = 3
+MEASURES = ['fluxo', 'fluxo_1m', 'tem_1m', 'fluxo_3m', 'tem_3m', 'janela', 'janela_anterior', 'tem_janela_anterior']
+
+
+# --- Bases Vetorizadas ---
+def _shift(matriz, lag):
+    """``matriz`` deslocada ``lag`` meses para a direita (zeros no início)."""
+    deslocada = np.zeros_like(matriz)
+    if lag < matriz.shape[1]:
+        deslocada[:, lag:] = matriz[:, :matriz.shape[1] - lag]
+    return deslocada
+
+
+def _rolling(matriz, janela):
+    """Soma móvel de ``janela`` meses terminada em cada mês."""
+    acumulada = np.cumsum(matriz, axis=1)
+    return acumulada - _shift(acumulada, janela)
+
+
+def panel_measures(matriz, presente):
+    """
+    Bases do painel para ``matriz`` (linhas × meses consecutivos) e a máscara
+    ``presente`` de células com dados. A janela anterior só vale quando cabe
+    inteira no período (antes disso, ``tem_janela_anterior`` é zero).
+    """
+    presente = np.asarray(presente).astype(np.int32)
+    janela = _rolling(matriz, WINDOW)
+    tem_janela = _rolling(presente, WINDOW).astype(np.int32)
+    tem_janela[:, :WINDOW - 1] = 0
+    return {
+        'fluxo': matriz,
+        'fluxo_1m': _shift(matriz, 1),
+        'tem_1m': _shift(presente, 1),
+        'fluxo_3m': _shift(matriz, 3),
+        'tem_3m': _shift(presente, 3),
+        'janela': janela,
+        'janela_anterior': _shift(janela, 1),
+        'tem_janela_anterior': _shift(tem_janela, 1),
+    }
+
+
+def growth(atual, base, tem):
+    """Crescimento % de ``atual`` sobre ``base`` pelo módulo da base; ``NaN`` com base zero ou sem meses (``tem``)."""
+    atual = np.asarray(atual, dtype=np.float64)
+    base = np.asarray(base, dtype=np.float64)
+    valida = (np.asarray(tem) > 0) & (base != 0)
+    resultado = np.full(len(atual), np.nan)
+    resultado[valida] = (atual[valida] - base[valida]) / np.abs(base[valida]) * 100
+    return resultado
+
+
+def _long(colunas, linhas, posicoes, medidas, chaves):
+    """Painel longo (uma linha por célula, ordenado por mês e chave) a partir das matrizes."""
+    painel = {'mes': colunas[posicoes].astype(np.int32)}
+    painel.update(chaves)
+    for nome in MEASURES:
+        painel[nome] = medidas[nome][linhas, posicoes]
+    return pd.DataFrame(painel)
+
+
+# --- Painéis ---
+def build_company_growth(df_main):
+    """
+    Painel empresa × mês: uma linha por empresa em cada mês em que ela aparece,
+    com o setor e o momento da empresa naquele mês e as bases de ``MEASURES``.
+    """
+    codigos = periods.month_codes(df_main['DT_REFE'])
+    validos = np.flatnonzero(codigos != periods.MISSING)
+    if not len(validos):
+        return pd.DataFrame({c: [] for c in ['mes', 'id_empresa', 'setor_cnae', 'momento_empresa'] + MEASURES})
+    colunas = np.arange(codigos[validos].min(), codigos[validos].max() + 1, dtype=np.int32)
+    empresas, ids = pd.factorize(df_main['id_empresa'], sort=True)
+    validos = validos[empresas[validos] >= 0]
+    linhas_df, posicoes_df = empresas[validos], codigos[validos] - colunas[0]
+
+    matriz = np.zeros((len(ids), len(colunas)), dtype=np.float64)
+    np.add.at(matriz, (linhas_df, posicoes_df), df_main['fluxo_caixa_liquido'].fillna(0).to_numpy()[validos])
+    presente = np.zeros(matriz.shape, dtype=bool)
+    presente[linhas_df, posicoes_df] = True
+
+    # Setor e momento de cada célula: os da primeira linha da empresa no mês
+    celulas, primeira = np.unique(posicoes_df.astype(np.int64) * len(ids) + linhas_df, return_index=True)
+    posicoes, linhas = np.divmod(celulas, len(ids))
+    origem = validos[primeira]
+    chaves = {'id_empresa': np.asarray(ids)[linhas]}
+    for coluna in ('setor_cnae', 'momento_empresa'):
+        chaves[coluna] = df_main[coluna].to_numpy()[origem]
+    return _long(colunas, linhas, posicoes, panel_measures(matriz, presente), chaves)
+
+
+def build_sector_growth(cubo_mensal):
+    """
+    Painel (setor, momento) × mês a partir do cubo mensal, denso em todos os
+    meses do período (mês sem linhas conta como fluxo zero).
+    """
+    pares = cubo_mensal[['setor_cnae', 'momento_empresa']].astype(object)
+    if cubo_mensal.empty:
+        return pd.DataFrame({c: [] for c in ['mes', 'setor_cnae', 'momento_empresa'] + MEASURES})
+    codigos, unicos = pd.factorize(pd.MultiIndex.from_frame(pares), sort=True)
+    meses = cubo_mensal['mes'].to_numpy()
+    colunas = np.arange(meses.min(), meses.max() + 1, dtype=np.int32)
+
+    matriz = np.zeros((len(unicos), len(colunas)), dtype=np.float64)
+    np.add.at(matriz, (codigos, meses - colunas[0]), cubo_mensal['fluxo_caixa_liquido'].to_numpy(dtype=np.float64))
+    posicoes, linhas = np.divmod(np.arange(matriz.size), len(unicos))
+    chaves = {'setor_cnae': unicos.get_level_values(0).to_numpy()[linhas],
+              'momento_empresa': unicos.get_level_values(1).to_numpy()[linhas]}
+    return _long(colunas, linhas, posicoes, panel_measures(matriz, np.ones(matriz.shape, dtype=bool)), chaves)
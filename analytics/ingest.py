@@ -0,0 +1,158 @@
+"""
+Ingestão incremental de lotes de transações.
+
+Um lote (CSV ou Parquet no layout de ``Base2_Transacoes``) é limpo, guardado em
+``data/lotes`` e aplicado sobre o snapshot sem reprocessar o histórico:
+
+- a tabela de arestas recebe os pares do lote (somas, contagens e os pares
+  distintos que dão ``num_clientes_unicos`` / ``num_fornecedores_unicos``);
+- as features e tickets médios são recalculados só para as empresas do lote;
+  empresas novas recebem cluster e momento do modelo salvo, se houver
+  (``analytics.clustering``);
+- o cubo mensal recebe o delta (linhas novas menos linhas antigas) dessas
+  empresas e as sequências negativas são refeitas apenas para elas;
+- o mix por tipo de transação (``analytics.mix``) recebe as somas do lote
+  (e é refeito quando o lote traz empresas novas);
+- a exposição mensal (``analytics.exposure``) é recalculada só nos meses do
+  lote (e nos meses em que as empresas novas já apareciam);
+- as comunidades são refinadas a partir da partição anterior, revisitando só
+  as empresas do lote e seus vizinhos.
+
+Uso:
+    python -m analytics.ingest lote.csv [--data-dir data] [--sep ';'] [--decimal ',']
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import clustering, community, cube, exposure, features, mix, streaks
+
+LOTES_DIRNAME = "lotes"
+TRANSACTION_COLS = ['ID_PGTO', 'ID_RCBE', 'VL', 'DS_TRAN', 'DT_REFE']
+
+
+# --- Leitura e Limpeza ---
+def clean_transactions(base_transacoes):
+    """Limpeza das transações usada tanto na carga das fontes quanto nos lotes."""
+    base_transacoes.columns = base_transacoes.columns.str.strip()
+
+    if 'DS_TRAN' in base_transacoes.columns:
+        base_transacoes['DS_TRAN'] = base_transacoes['DS_TRAN'].fillna('N/A').astype(str).str.strip().str.upper()
+
+    if 'VL' in base_transacoes.columns:
+        base_transacoes['VL'] = pd.to_numeric(base_transacoes['VL'], errors='coerce').fillna(0)
+
+    return base_transacoes
+
+
+def clean_labels(serie):
+    """
+    Padronização de ``setor_cnae`` e ``momento_empresa`` (sem faltantes, sem
+    espaços nas pontas, em maiúsculas) usada na carga das fontes e nas
+    empresas novas dos lotes, cujo momento vem do mapa do modelo (``'Declínio'``).
+    """
+    return serie.fillna('N/A').astype(str).str.strip().str.upper()
+
+
+def read_batch(path, sep=';', decimal=','):
+    """Lê e limpa um lote de transações em CSV ou Parquet."""
+    if path.endswith('.parquet'):
+        lote = pd.read_parquet(path)
+    else:
+        lote = pd.read_csv(path, sep=sep, decimal=decimal, encoding='utf-8-sig')
+
+    lote = clean_transactions(lote)
+    faltantes = [c for c in TRANSACTION_COLS if c not in lote.columns]
+    if faltantes:
+        raise ValueError(f"Lote sem as colunas obrigatórias: {', '.join(faltantes)}")
+    lote['DT_REFE'] = pd.to_datetime(lote['DT_REFE'], errors='coerce')
+    return lote[TRANSACTION_COLS]
+
+
+# --- Atualização Incremental ---
+def _update_companies(df_main, arestas, ids, modelo=None):
+    """
+    Recalcula as features das empresas ``ids`` e acrescenta as que ainda não
+    existem (classificadas pelo ``modelo``, se houver; senão sem momento).
+    Retorna o novo ``df_main`` e as linhas dessas empresas antes e depois.
+    """
+    novas_features = features.company_features(arestas, ids)
+    linhas = df_main['id_empresa'].isin(ids).to_numpy()
+    antigas = df_main[linhas]
+
+    df_main = df_main.copy()
+    valores = novas_features.reindex(antigas['id_empresa'])
+    df_main.loc[linhas, features.FEATURE_COLS] = valores[features.FEATURE_COLS].to_numpy()
+
+    inexistentes = novas_features.index.difference(pd.Index(antigas['id_empresa'].unique()))
+    if len(inexistentes):
+        novas = novas_features.loc[inexistentes].rename_axis('id_empresa').reset_index()
+        novas = novas.reindex(columns=df_main.columns)
+        if modelo is not None:
+            novas[['cluster', 'momento_empresa']] = clustering.score(modelo, novas)[['cluster', 'momento_empresa']]
+        for col in novas.columns:
+            if col in ('setor_cnae', 'momento_empresa'):
+                novas[col] = clean_labels(novas[col])
+            elif col in ('cluster', 'Grupo_Empresas'):
+                novas[col] = novas[col].fillna(-1)
+            elif pd.api.types.is_float_dtype(df_main[col]):
+                novas[col] = novas[col].fillna(0)
+        df_main = pd.concat([df_main, novas.astype(df_main.dtypes.to_dict())], ignore_index=True)
+
+    atualizadas = df_main[df_main['id_empresa'].isin(ids)]
+    return df_main, antigas, atualizadas
+
+
+def apply_batch(tabelas, lote, modelo=None):
+    """
+    Aplica um lote limpo sobre as tabelas do snapshot (em memória) e retorna
+    ``(tabelas, atualizadas)``: o novo dicionário e os nomes das tabelas que
+    foram mantidas incrementalmente. Demais agregados devem ser recalculados.
+    ``modelo`` (de ``clustering.load_model``) classifica as empresas novas.
+    """
+    tabelas = dict(tabelas)
+    tabelas['base_transacoes'] = pd.concat([tabelas['base_transacoes'], lote], ignore_index=True)
+    tabelas['arestas'] = features.merge_edges(tabelas['arestas'], features.edge_aggregates(lote))
+
+    ids = pd.unique(np.concatenate([lote['ID_PGTO'].to_numpy(), lote['ID_RCBE'].to_numpy()]))
+    tabelas['comunidades'] = community.refine_communities(tabelas['comunidades'], tabelas['arestas'], ids)
+    df_main, antigas, atualizadas = _update_companies(tabelas['df_main'], tabelas['arestas'], ids, modelo)
+    tabelas['df_main'] = df_main
+    novas = pd.Index(ids).difference(pd.Index(antigas['id_empresa'].unique()))
+    empresas_novas = len(novas) > 0
+
+    tabelas['cubo_mensal'] = cube.apply_delta(tabelas['cubo_mensal'], antigas, atualizadas)
+    tabelas['sequencias_negativas'] = streaks.update_streak_table(
+        tabelas['sequencias_negativas'], atualizadas, tabelas['cubo_mensal']['mes'].unique()
+    )
+    mantidas = ['base_transacoes', 'arestas', 'comunidades', 'df_main', 'cubo_mensal', 'sequencias_negativas']
+    if 'mix_empresas' in tabelas and 'mix_pares' in tabelas:
+        tabelas['mix_empresas'], tabelas['mix_pares'] = mix.apply_batch(tabelas, lote, empresas_novas)
+        mantidas += ['mix_empresas', 'mix_pares']
+    if 'exposicao_mensal' in tabelas:
+        tabelas['exposicao_mensal'] = exposure.apply_batch(tabelas, lote, novas)
+        mantidas.append('exposicao_mensal')
+    return tabelas, mantidas
+
+
+def main(argv=None):
+    from analytics import snapshot
+
+    parser = argparse.ArgumentParser(description="Acrescenta um lote de transações ao snapshot do dashboard.")
+    parser.add_argument("lote", help="Arquivo CSV ou Parquet no layout de Base2_Transacoes")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório de dados (padrão: data)")
+    parser.add_argument("--sep", default=';', help="Separador do CSV (padrão: ;)")
+    parser.add_argument("--decimal", default=',', help="Separador decimal do CSV (padrão: ,)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    lote = read_batch(args.lote, sep=args.sep, decimal=args.decimal)
+    manifest = snapshot.append_batch(lote, args.lote, args.data_dir)
+    print(f"Lote com {len(lote):,} transações aplicado em {time.perf_counter() - inicio:.2f}s")
+    print(f"Versão: {manifest['version']}")
+
+
+if __name__ == "__main__":
+    main()
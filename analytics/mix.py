@@ -0,0 +1,97 @@
+"""
+Mix por tipo de transação pré-agregado.
+
+Duas tabelas esparsas, geradas junto ao snapshot e somadas a cada lote ingerido:
+
+- ``mix_empresas``: por (mês, empresa, ``DS_TRAN``), valor e quantidade das
+  transações recebidas e pagas pela empresa, com o setor e o momento dela;
+- ``mix_pares``: por (mês, ``DS_TRAN``, setor e momento do pagador, setor e
+  momento do recebedor), valor e quantidade das transações entre empresas da base.
+
+O mix de um conjunto de empresas conta uma vez cada transação com pagador
+**ou** recebedor no conjunto: recebido mais pago das empresas do conjunto,
+menos as transações com os dois lados nele (inclusão–exclusão). Para os
+conjuntos dos filtros globais (setor, momento, meses) o termo dos dois lados
+sai de ``mix_pares``, com o filtro aplicado ao pagador e ao recebedor. Só
+entram empresas presentes no ``df_main``.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+SIDES = (('recebido', 'ID_RCBE'), ('pago', 'ID_PGTO'))
+COMPANY_MEASURES = ['valor_recebido', 'qtd_recebido', 'valor_pago', 'qtd_pago']
+PAIR_KEYS = ['mes', 'DS_TRAN', 'setor_pagador', 'momento_pagador', 'setor_recebedor', 'momento_recebedor']
+PAIR_MEASURES = ['VL', 'qtd']
+
+
+def company_attributes(df_main):
+    """Setor e momento de cada empresa (da primeira linha dela no ``df_main``), indexados pelo id."""
+    empresas = df_main[~df_main['id_empresa'].duplicated()]
+    return pd.DataFrame({'setor_cnae': empresas['setor_cnae'].to_numpy(),
+                         'momento_empresa': empresas['momento_empresa'].to_numpy()},
+                        index=pd.Index(empresas['id_empresa'].to_numpy(), name='id_empresa'))
+
+
+def _transactions(base_transacoes):
+    validas = base_transacoes['DS_TRAN'].notna().to_numpy()
+    transacoes = base_transacoes[validas]
+    return transacoes, periods.month_codes(transacoes['DT_REFE'])
+
+
+def build_company_mix(base_transacoes, df_main):
+    """Tabela ``mix_empresas``: uma linha por (mês, empresa, tipo) com as medidas de ``COMPANY_MEASURES``."""
+    atributos = company_attributes(df_main)
+    transacoes, mes = _transactions(base_transacoes)
+    valores = transacoes['VL'].to_numpy()
+    partes = []
+    for lado, coluna in SIDES:
+        medidas = {m: np.zeros(len(transacoes), dtype=valores.dtype if m.startswith('valor') else np.int64)
+                   for m in COMPANY_MEASURES}
+        medidas[f'valor_{lado}'], medidas[f'qtd_{lado}'] = valores, np.ones(len(transacoes), dtype=np.int64)
+        partes.append(pd.DataFrame({'mes': mes, 'id_empresa': transacoes[coluna].to_numpy(),
+                                    'DS_TRAN': transacoes['DS_TRAN'].to_numpy(), **medidas}))
+    quadro = pd.concat(partes, ignore_index=True)
+    quadro = quadro[quadro['id_empresa'].isin(atributos.index).to_numpy()]
+    mix = quadro.groupby(['mes', 'id_empresa', 'DS_TRAN'], sort=True, observed=True)[COMPANY_MEASURES].sum().reset_index()
+    mix = mix.join(atributos, on='id_empresa')
+    return mix[['mes', 'id_empresa', 'setor_cnae', 'momento_empresa', 'DS_TRAN'] + COMPANY_MEASURES]
+
+
+def build_pair_mix(base_transacoes, df_main):
+    """Tabela ``mix_pares``: valor e quantidade por mês, tipo e (setor, momento) de cada lado."""
+    atributos = company_attributes(df_main)
+    transacoes, mes = _transactions(base_transacoes)
+    pagador = atributos.reindex(transacoes['ID_PGTO'].to_numpy())
+    recebedor = atributos.reindex(transacoes['ID_RCBE'].to_numpy())
+    conhecidas = (transacoes['ID_PGTO'].isin(atributos.index) & transacoes['ID_RCBE'].isin(atributos.index)).to_numpy()
+    quadro = pd.DataFrame({
+        'mes': mes, 'DS_TRAN': transacoes['DS_TRAN'].to_numpy(),
+        'setor_pagador': pagador['setor_cnae'].to_numpy(), 'momento_pagador': pagador['momento_empresa'].to_numpy(),
+        'setor_recebedor': recebedor['setor_cnae'].to_numpy(), 'momento_recebedor': recebedor['momento_empresa'].to_numpy(),
+        'VL': transacoes['VL'].to_numpy(), 'qtd': np.ones(len(transacoes), dtype=np.int64),
+    })[conhecidas]
+    return quadro.groupby(PAIR_KEYS, sort=True, observed=True, dropna=False)[PAIR_MEASURES].sum().reset_index()
+
+
+def merge_mix(tabela, delta, chaves):
+    """Soma ``delta`` (mesmo layout) à tabela agregada, pelas ``chaves``."""
+    medidas = [c for c in tabela.columns if c not in chaves]
+    juntas = pd.concat([tabela, delta], ignore_index=True)
+    return juntas.groupby(chaves, sort=True, observed=True, dropna=False)[medidas].sum().reset_index()[list(tabela.columns)]
+
+
+def apply_batch(tabelas, lote, empresas_novas):
+    """
+    Atualiza ``mix_empresas`` e ``mix_pares`` com as transações do lote. Com
+    ``empresas_novas`` as tabelas são refeitas: transações antigas com essas
+    empresas passam a contar.
+    """
+    if empresas_novas:
+        return (build_company_mix(tabelas['base_transacoes'], tabelas['df_main']),
+                build_pair_mix(tabelas['base_transacoes'], tabelas['df_main']))
+    chaves_empresas = ['mes', 'id_empresa', 'setor_cnae', 'momento_empresa', 'DS_TRAN']
+    return (merge_mix(tabelas['mix_empresas'], build_company_mix(lote, tabelas['df_main']), chaves_empresas),
+            merge_mix(tabelas['mix_pares'], build_pair_mix(lote, tabelas['df_main']), PAIR_KEYS))
+
@@ -0,0 +1,156 @@
+"""
+Renderização em memória da rede de transações (vis-network).
+
+Os nós e arestas são montados a partir de arrays (sem ``iterrows``) e o HTML é
+gerado como string, sem gravar arquivos temporários. Os assets locais de
+``lib/vis-9.1.2`` são lidos uma única vez por processo e embutidos no HTML. Opcionalmente
+as posições dos nós são calculadas no servidor (layout de forças em NumPy), o
+que desliga a física no navegador para empresas com muitas conexões.
+"""
+import functools
+import html
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+VIS_DIR = os.path.join("lib", "vis-9.1.2")
+
+COR_CENTRO = "#FF4D4D"
+COR_PAGADOR = "#C30000"
+COR_RECEBEDOR = "#00A9E0"
+
+DEFAULT_OPTIONS = {
+    "edges": {
+        "color": {"inherit": True},
+        "smooth": {"enabled": True, "type": "dynamic"},
+    },
+    "physics": {
+        "barnesHut": {
+            "gravitationalConstant": -80000,
+            "springConstant": 0.001,
+            "springLength": 200,
+        },
+        "minVelocity": 0.75,
+    },
+}
+
+TEMPLATE = """<html>
+<head>
+<meta charset="utf-8">
+<style type="text/css">{css}</style>
+<script type="text/javascript">{js}</script>
+<style type="text/css">
+    #mynetwork {{
+        width: {width};
+        height: {height};
+        background-color: {bgcolor};
+        border: 1px solid lightgray;
+        position: relative;
+        float: left;
+    }}
+</style>
+</head>
+<body>
+<div id="mynetwork"></div>
+<script type="text/javascript">
+    var container = document.getElementById('mynetwork');
+    var grafo = {grafo};
+    var data = {{nodes: new vis.DataSet(grafo.nodes), edges: new vis.DataSet(grafo.edges)}};
+    var network = new vis.Network(container, data, grafo.options);
+</script>
+</body>
+</html>
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def load_vis_assets(vis_dir=VIS_DIR):
+    """Lê (uma vez por processo) o JS e o CSS locais do vis-network."""
+    with open(os.path.join(vis_dir, "vis-network.min.js"), encoding="utf-8") as f:
+        js = f.read()
+    with open(os.path.join(vis_dir, "vis-network.css"), encoding="utf-8") as f:
+        css = f.read()
+    # Evita que o conteúdo embutido feche a tag <script> antes da hora
+    return js.replace("</script", "<\\/script"), css
+
+
+def spring_layout(n_nos, origem, destino, iteracoes=60, seed=42, escala=1000.0):
+    """
+    Layout de forças (Fruchterman-Reingold) vetorizado em NumPy.
+    ``origem``/``destino`` são índices de nós; retorna um array (n_nos, 2).
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1.0, 1.0, size=(n_nos, 2))
+    if n_nos < 2:
+        return pos[:, :2] * 0.0
+    k = np.sqrt(4.0 / n_nos)
+    temperatura = 0.1
+    passo = temperatura / (iteracoes + 1)
+
+    for _ in range(iteracoes):
+        delta = pos[:, None, :] - pos[None, :, :]
+        distancia = np.linalg.norm(delta, axis=-1)
+        np.fill_diagonal(distancia, 1.0)
+        distancia = np.maximum(distancia, 0.01)
+        deslocamento = (delta * (k * k / distancia ** 2)[:, :, None]).sum(axis=1)
+
+        d = pos[origem] - pos[destino]
+        dist = np.maximum(np.linalg.norm(d, axis=1), 0.01)
+        atracao = d * (dist / k)[:, None]
+        np.add.at(deslocamento, origem, -atracao)
+        np.add.at(deslocamento, destino, atracao)
+
+        tamanho = np.maximum(np.linalg.norm(deslocamento, axis=1), 0.01)
+        pos += deslocamento * (np.minimum(tamanho, temperatura) / tamanho)[:, None]
+        temperatura -= passo
+
+    pos -= pos.mean(axis=0)
+    raio = np.abs(pos).max() or 1.0
+    return pos / raio * escala
+
+
+def build_graph(pagadores, recebedores, valores, centro, font_color="white",
+                layout_servidor=False, format_value=str):
+    """
+    Monta o dicionário ``{nodes, edges, options}`` do vis-network a partir dos
+    arrays de arestas. A cor de cada nó segue o primeiro papel em que ele
+    aparece (pagador ou recebedor); a empresa central é destacada.
+    """
+    pagadores = np.asarray(pagadores, dtype=object)
+    recebedores = np.asarray(recebedores, dtype=object)
+    valores = np.asarray(valores, dtype=np.float64)
+
+    intercalados = np.column_stack([pagadores, recebedores]).ravel()
+    codigos, nos = pd.factorize(intercalados)
+    _, primeira = np.unique(codigos, return_index=True)
+    cores = np.where(primeira % 2 == 0, COR_PAGADOR, COR_RECEBEDOR).astype(object)
+    cores[np.asarray(nos, dtype=object) == centro] = COR_CENTRO
+
+    ids = [str(n) for n in nos]
+    nodes = [
+        {"id": i, "label": i, "title": f"Empresa {i}", "color": c, "shape": "dot", "font": {"color": font_color}}
+        for i, c in zip(ids, cores.tolist())
+    ]
+    origem, destino = codigos[0::2], codigos[1::2]
+    edges = [
+        {"from": ids[o], "to": ids[d], "value": v, "title": f"Valor: {format_value(v)}", "arrows": "to"}
+        for o, d, v in zip(origem.tolist(), destino.tolist(), valores.tolist())
+    ]
+
+    options = json.loads(json.dumps(DEFAULT_OPTIONS))
+    if layout_servidor:
+        posicoes = spring_layout(len(nodes), origem, destino)
+        for no, (x, y) in zip(nodes, posicoes.tolist()):
+            no.update(x=x, y=y)
+        options["physics"] = {"enabled": False}
+    return {"nodes": nodes, "edges": edges, "options": options}
+
+
+def render_html(grafo, height="600px", width="100%", bgcolor="#222222"):
+    """Gera o HTML completo (assets embutidos) a partir do dicionário de ``build_graph``."""
+    js, css = load_vis_assets()
+    dados = json.dumps(grafo, ensure_ascii=False).replace("</", "<\\/")
+    return TEMPLATE.format(css=css, js=js, width=html.escape(width), height=html.escape(height),
+                           bgcolor=html.escape(bgcolor), grafo=dados)
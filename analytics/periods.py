@@ -0,0 +1,40 @@
+"""
+Códigos inteiros de mês usados pelas agregações do dashboard.
+
+Um mês é representado pelo ordinal de ``pd.Period(freq='M')`` (meses desde
+01/1970), o que permite filtrar e ordenar sem passar por strings ``%m/%Y``.
+"""
+import numpy as np
+import pandas as pd
+
+MISSING = np.iinfo(np.int32).min
+# Nomes dos meses em português sem depender do locale pt_BR do sistema
+MONTH_NAMES = [
+    'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+
+
+def month_codes(datas):
+    """Converte datas em códigos de mês (int32); datas ausentes viram ``MISSING``."""
+    datas = pd.DatetimeIndex(datas)
+    ausente = datas.isna()
+    codigos = np.full(len(datas), MISSING, dtype=np.int32)
+    codigos[~ausente] = (datas.year[~ausente] - 1970) * 12 + datas.month[~ausente] - 1
+    return codigos
+
+
+def month_labels(codigos):
+    """Converte códigos de mês nos rótulos ``%m/%Y`` exibidos no dashboard."""
+    codigos = np.asarray(codigos, dtype=np.int64)
+    anos, meses = np.divmod(codigos, 12)
+    return [f"{m + 1:02d}/{a + 1970}" for a, m in zip(anos.tolist(), meses.tolist())]
+
+
+def parse_month_labels(rotulos):
+    """Converte rótulos ``%m/%Y`` em códigos de mês (int32)."""
+    codigos = []
+    for rotulo in rotulos:
+        mes, ano = rotulo.split('/')
+        codigos.append((int(ano) - 1970) * 12 + int(mes) - 1)
+    return np.asarray(codigos, dtype=np.int32)
@@ -0,0 +1,326 @@
+"""
+Perfil de desempenho das execuções (reruns) do dashboard, por etapa.
+
+Cada etapa nomeada (``load_data``, filtros, KPIs, cada ``plot_*``, cálculos
+das abas, rede) registra o tempo de parede, as linhas de entrada e de
+saída e, com ``memoria=True``, os bytes alocados no pico (``tracemalloc``).
+Desligado, ``stage`` devolve um contexto nulo compartilhado e ``wrap``
+devolve a própria função, de modo que o custo é de uma chamada por etapa.
+
+Os registros de uma execução podem ser gravados em JSON lines para análise
+offline, e ganchos (``CProfileHook``, ``SamplingHook``) envolvem uma execução
+inteira com o cProfile ou com um profiler por amostragem.
+
+Uso offline:
+    python -m analytics.profiling data/.perfil/execucoes.jsonl [--etapa plot_] [--aba Declínio]
+"""
+import argparse
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+import pandas as pd
+
+PROFILE_DIR = os.path.join("data", ".perfil")
+LOG_PATH = os.path.join(PROFILE_DIR, "execucoes.jsonl")
+STATS_LINES = 30
+
+
+def count_rows(obj):
+    """Linhas de um DataFrame/array, pontos de uma figura Plotly ou ``len``; ``None`` se não houver."""
+    if obj is None or isinstance(obj, (str, bytes)):
+        return None
+    forma = getattr(obj, 'shape', None)
+    if forma:
+        return int(forma[0])
+    traces = getattr(obj, 'data', None)
+    if isinstance(traces, tuple):
+        total = 0
+        for trace in traces:
+            eixo = getattr(trace, 'x', None)
+            if eixo is None:
+                eixo = getattr(trace, 'values', None)
+            total += 0 if eixo is None else len(eixo)
+        return total
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+# --- Etapas ---
+class _NullStage:
+    """Etapa do profiler desligado: não mede nada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def output(self, obj):
+        return obj
+
+    def note(self, **medidas):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, perfil, nome, entrada):
+        self.perfil = perfil
+        self.registro = {"stage": nome, "rows_in": count_rows(entrada), "rows_out": None}
+        self.pico_filhas = 0
+
+    def output(self, obj):
+        """Registra as linhas de saída da etapa e devolve ``obj``."""
+        self.registro["rows_out"] = count_rows(obj)
+        return obj
+
+    def note(self, **medidas):
+        """Acrescenta medidas próprias da etapa ao registro (ex.: ``payload_bytes``)."""
+        self.registro.update(medidas)
+
+    def __enter__(self):
+        perfil = self.perfil
+        self.registro["depth"] = len(perfil._pilha)
+        perfil._pilha.append(self)
+        perfil.registros.append(self.registro)
+        if perfil.memoria:
+            # O pico do tracemalloc é global: cada etapa zera o pico ao entrar e
+            # repassa o seu pico absoluto à etapa que a contém ao sair
+            self.base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registro["seconds"] = time.perf_counter() - self.inicio
+        perfil = self.perfil
+        perfil._pilha.pop()
+        if perfil.memoria:
+            pico = max(tracemalloc.get_traced_memory()[1], self.pico_filhas)
+            self.registro["alloc_bytes"] = max(pico - self.base, 0)
+            if perfil._pilha:
+                perfil._pilha[-1].pico_filhas = max(perfil._pilha[-1].pico_filhas, pico)
+        return False
+
+
+# --- Ganchos de Execução ---
+class CProfileHook:
+    """Envolve uma execução com o ``cProfile``; grava o ``.prof`` em ``path`` (opcional)."""
+
+    def __init__(self, path=None, ordem="cumulative", linhas=STATS_LINES):
+        self.path, self.ordem, self.linhas = path, ordem, linhas
+        self.relatorio = None
+
+    def start(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.profile.dump_stats(self.path)
+        saida = io.StringIO()
+        pstats.Stats(self.profile, stream=saida).sort_stats(self.ordem).print_stats(self.linhas)
+        self.relatorio = saida.getvalue()
+
+
+class SamplingHook:
+    """Envolve uma execução com o profiler por amostragem ``pyinstrument`` (dependência opcional)."""
+
+    def __init__(self, path=None, intervalo=0.001):
+        try:
+            from pyinstrument import Profiler as Amostrador
+        except ImportError as e:
+            raise ImportError("SamplingHook requer o pacote opcional 'pyinstrument'") from e
+        self.amostrador = Amostrador(interval=intervalo)
+        self.path = path
+        self.relatorio = None
+
+    def start(self):
+        self.amostrador.start()
+
+    def stop(self):
+        self.amostrador.stop()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self.amostrador.output_html())
+        self.relatorio = self.amostrador.output_text()
+
+
+# --- Profiler de uma Execução ---
+class Profiler:
+    """
+    Registros das etapas de uma execução do script. ``memoria`` liga o
+    ``tracemalloc`` (mais lento) e ``ganchos`` são objetos com ``start()`` e
+    ``stop()`` chamados no início e no fim da execução. O mesmo objeto pode
+    servir a várias execuções (a completa e as reexecuções de fragmentos):
+    cada ``start`` abre um registro novo.
+    """
+
+    def __init__(self, enabled=False, memoria=False, ganchos=(), contexto=None):
+        self.contexto = dict(contexto or {})
+        self.registros = []
+        self._pilha = []
+        self._memoria_propria = False
+        self.running = False
+        self.configure(enabled, memoria, ganchos)
+
+    def configure(self, enabled=False, memoria=False, ganchos=()):
+        """Liga ou desliga a medição (e os ganchos) para as próximas execuções."""
+        self.enabled = enabled
+        self.memoria = enabled and memoria
+        self.ganchos = list(ganchos) if enabled else []
+        return self
+
+    def start(self, contexto=None):
+        """Abre uma execução: zera os registros e, se informado, troca o ``contexto``."""
+        self.running = True
+        self.registros, self._pilha = [], []
+        if contexto is not None:
+            self.contexto = dict(contexto)
+        if not self.enabled:
+            return self
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._memoria_propria = True
+        for gancho in self.ganchos:
+            gancho.start()
+        self.inicio = time.perf_counter()
+        return self
+
+    def finish(self):
+        """Encerra a execução: para os ganchos e devolve o total em segundos (``None`` se desligado)."""
+        self.running = False
+        if not self.enabled:
+            return None
+        total = time.perf_counter() - self.inicio
+        for gancho in reversed(self.ganchos):
+            gancho.stop()
+        if self._memoria_propria:
+            tracemalloc.stop()
+            self._memoria_propria = False
+        self.contexto["total_seconds"] = total
+        return total
+
+    def stage(self, nome, entrada=None):
+        """Contexto que mede a etapa ``nome``; ``entrada`` dá as linhas de entrada."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, nome, entrada)
+
+    def wrap(self, funcao=None, nome=None):
+        """Decorador que mede cada chamada (entrada: primeiro argumento; saída: o retorno)."""
+        if funcao is None:
+            return functools.partial(self.wrap, nome=nome)
+        if not self.enabled:
+            return funcao
+        nome = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with self.stage(nome, args[0] if args else None) as etapa:
+                return etapa.output(funcao(*args, **kwargs))
+        return medida
+
+    def frame(self):
+        """Registros da execução como DataFrame (uma linha por etapa, na ordem de início)."""
+        colunas = ["stage", "depth", "seconds", "rows_in", "rows_out", "alloc_bytes", "payload_bytes"]
+        return pd.DataFrame(self.registros).reindex(columns=colunas)
+
+    def record(self):
+        """Registro JSON da execução: contexto (sessão, aba, filtros, total), nº de etapas e etapas."""
+        etapas = [{k: v for k, v in r.items() if v is not None} for r in self.registros]
+        return {**self.contexto, "n_stages": len(etapas), "stages": etapas}
+
+    def append_jsonl(self, path=LOG_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.record(), ensure_ascii=False, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def profiled_run(perfil, contexto=None):
+    """Executa o bloco entre ``perfil.start(contexto)`` e ``perfil.finish()``."""
+    perfil.start(contexto)
+    try:
+        yield perfil
+    finally:
+        perfil.finish()
+
+
+# --- Análise Offline ---
+def read_jsonl(path=LOG_PATH):
+    """Uma linha por etapa de cada execução gravada, com o contexto da execução."""
+    linhas = []
+    with open(path, encoding="utf-8") as f:
+        for numero, linha in enumerate(f):
+            execucao = json.loads(linha)
+            etapas = execucao.pop("stages", [])
+            for etapa in etapas:
+                linhas.append({"run": numero, **execucao, **etapa})
+    return pd.DataFrame(linhas)
+
+
+def summarize(df):
+    """Tempo por etapa (contagem, mediana, p95, máximo) e alocação mediana, do mais lento ao mais rápido."""
+    agregacoes = {
+        "execucoes": ("seconds", "size"),
+        "mediana_s": ("seconds", "median"),
+        "p95_s": ("seconds", lambda s: s.quantile(0.95)),
+        "max_s": ("seconds", "max"),
+    }
+    if "alloc_bytes" in df.columns:
+        agregacoes["alloc_mediana_mb"] = ("alloc_bytes", lambda s: s.median() / 2 ** 20)
+    if "payload_bytes" in df.columns:
+        agregacoes["payload_mediana_kb"] = ("payload_bytes", lambda s: s.median() / 2 ** 10)
+    return df.groupby("stage").agg(**agregacoes).sort_values("p95_s", ascending=False)
+
+
+def interactions(df):
+    """Etapas e tempo por execução, por escopo (script completo ou fragmento): o custo de cada interação."""
+    if "scope" not in df.columns:
+        df = df.assign(scope="script")
+    colunas = [c for c in ("scope", "fragment") if c in df.columns]
+    por_execucao = df.groupby("run").agg(
+        **{c: (c, "first") for c in colunas}, etapas=("stage", "size"), total_s=("total_seconds", "first"))
+    return por_execucao.groupby(colunas, dropna=False).agg(
+        execucoes=("etapas", "size"), etapas_mediana=("etapas", "median"), total_mediana_s=("total_s", "median"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resume o log de perfil das execuções do dashboard.")
+    parser.add_argument("log", nargs="?", default=LOG_PATH, help="Arquivo JSON lines (padrão: data/.perfil/execucoes.jsonl)")
+    parser.add_argument("--etapa", default=None, help="Só etapas cujo nome começa com este prefixo")
+    parser.add_argument("--aba", default=None, help="Só execuções com esta aba ativa")
+    args = parser.parse_args(argv)
+
+    df = read_jsonl(args.log)
+    if df.empty:
+        print("Log vazio.")
+        return
+    if args.aba and "active_tab" in df.columns:
+        df = df[df["active_tab"] == args.aba]
+    execucoes = interactions(df)
+    if args.etapa:
+        df = df[df["stage"].str.startswith(args.etapa)]
+    with pd.option_context("display.width", 160, "display.max_rows", 200):
+        print(summarize(df).round(4))
+        print()
+        print(execucoes.round(4))
+
+
+if __name__ == "__main__":
+    main()
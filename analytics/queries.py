@@ -0,0 +1,366 @@
+"""
+Agregações das abas com motor de consulta plugável (pandas ou DuckDB).
+
+Cada agregação é descrita uma única vez como um ``GroupBy``: a tabela lógica,
+as chaves, as medidas somadas e as colunas em que os filtros globais de setor
+e momento se aplicam. Dois motores executam a mesma descrição e devolvem o
+mesmo quadro agrupado (ordenado pelas chaves):
+
+- ``PandasBackend`` sobre as tabelas em memória, com as linhas dos filtros
+  vindas do ``FilterEngine``;
+- ``DuckDBBackend`` com SQL sobre os Parquet do snapshot, com pushdown de predicados e colunas e varredura em várias
+  threads, sem carregar as tabelas na memória do processo.
+
+O acabamento (rótulos de mês, médias, top N, crescimento sobre as bases do
+painel de ``analytics.growth``, inclusão–exclusão do mix de ``analytics.mix``)
+é feito em pandas sobre o resultado agrupado, que é pequeno, e é o mesmo para
+os dois motores. O motor do dashboard é escolhido por ``DASHBOARD_BACKEND``
+(``pandas``, o padrão, ou ``duckdb``, dependência opcional). Conferência de
+paridade entre os dois:
+
+    python -m analytics.queries [--data-dir data] [--top-n 10]
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import cube, filters, growth, mix, periods, snapshot
+
+BACKENDS = ("pandas", "duckdb")
+DEFAULT_BACKEND = os.environ.get("DASHBOARD_BACKEND", "pandas")
+RTOL = 1e-9
+# Tabelas com a coluna ``mes`` (código de mês) em vez de ``DT_REFE``
+MONTH_TABLES = ('cubo_mensal', 'crescimento_empresas', 'crescimento_setores', 'mix_empresas', 'mix_pares')
+
+
+# --- Descrição das Agregações ---
+class GroupBy:
+    """
+    Soma de ``medidas`` por ``chaves`` nas linhas de ``tabela`` que passam nos
+    filtros globais. ``mes`` é o código de mês (``analytics.periods``) de
+    ``DT_REFE`` (nas tabelas de ``MONTH_TABLES``, a própria coluna). Os filtros
+    de setor e momento valem em todas as colunas de ``setores`` e ``momentos``
+    (nos pares do mix, no pagador e no recebedor).
+    """
+
+    def __init__(self, nome, tabela, chaves, medidas, setores=('setor_cnae',), momentos=('momento_empresa',)):
+        self.nome = nome
+        self.tabela = tabela
+        self.chaves = list(chaves)
+        self.medidas = list(medidas)
+        self.setores = tuple(setores)
+        self.momentos = tuple(momentos)
+
+
+MONTHLY = GroupBy("serie_mensal", "cubo_mensal", ['mes'],
+                  cube.MEASURES + [f'{c}_{s}' for c in cube.TICKETS for s in ('soma', 'qtd')] + ['num_linhas'])
+SECTOR_RECEIVED = GroupBy("recebido_por_setor", "df_main", ['setor_cnae'], ['total_recebido'])
+MIX_COMPANIES = GroupBy("mix_empresas", "mix_empresas", ['DS_TRAN'], mix.COMPANY_MEASURES)
+MIX_PAIRS = GroupBy("mix_pares", "mix_pares", ['DS_TRAN'], mix.PAIR_MEASURES,
+                    setores=('setor_pagador', 'setor_recebedor'), momentos=('momento_pagador', 'momento_recebedor'))
+COMPANY_GROWTH = GroupBy("crescimento_empresa", "crescimento_empresas", ['id_empresa'], growth.MEASURES)
+SECTOR_GROWTH = GroupBy("crescimento_setor", "crescimento_setores", ['setor_cnae'], growth.MEASURES)
+MONTHLY_GROWTH = GroupBy("crescimento_mensal", "crescimento_setores", ['mes'], growth.MEASURES)
+QUERIES = [MONTHLY, SECTOR_RECEIVED, MIX_COMPANIES, MIX_PAIRS, COMPANY_GROWTH, SECTOR_GROWTH, MONTHLY_GROWTH]
+
+
+def _plain_keys(agrupado, chaves):
+    """Chaves categóricas voltam ao dtype das categorias (os dois motores devolvem o mesmo quadro)."""
+    for chave in chaves:
+        if isinstance(agrupado[chave].dtype, pd.CategoricalDtype):
+            agrupado[chave] = agrupado[chave].astype(agrupado[chave].cat.categories.dtype)
+    return agrupado
+
+
+# --- Motores ---
+class PandasBackend:
+    """Executa as agregações sobre as tabelas em memória (``df_main`` e as tabelas agregadas do snapshot)."""
+
+    nome = "pandas"
+
+    def __init__(self, tabelas, motor=None):
+        self.tabelas = tabelas
+        self.motor = motor or filters.FilterEngine(tabelas['df_main'], tabelas['base_transacoes'])
+
+    def _month_table_rows(self, consulta, setor, momento, meses):
+        tabela = self.tabelas[consulta.tabela]
+        mask = np.ones(len(tabela), dtype=bool)
+        for valor, colunas in ((setor, consulta.setores), (momento, consulta.momentos)):
+            if valor is not None:
+                for coluna in colunas:
+                    mask &= (tabela[coluna] == valor).to_numpy()
+        if meses is not None:
+            mask &= np.isin(tabela['mes'].to_numpy(), meses)
+        return tabela[mask], tabela['mes'].to_numpy()[mask]
+
+    def run(self, consulta, setor=None, momento=None, meses=None):
+        """Quadro agrupado de ``consulta`` (chaves + medidas, ordenado pelas chaves)."""
+        if consulta.tabela in MONTH_TABLES:
+            linhas, mes = self._month_table_rows(consulta, setor, momento, meses)
+        else:
+            posicoes = self.motor.company_rows(setor, momento, meses)
+            linhas = self.motor.companies(setor, momento, meses)
+            mes = self.motor.mes_empresas if posicoes is None else self.motor.mes_empresas[posicoes]
+
+        quadro = pd.DataFrame({c: (mes if c == 'mes' else linhas[c].to_numpy())
+                               for c in consulta.chaves + consulta.medidas})
+        if 'mes' in consulta.chaves:
+            quadro = quadro[quadro['mes'] != periods.MISSING]
+        agrupado = quadro.groupby(consulta.chaves, sort=True, observed=True)[consulta.medidas].sum().reset_index()
+        return _plain_keys(agrupado, consulta.chaves)
+
+
+class DuckDBBackend:
+    """
+    Executa as agregações em SQL no DuckDB sobre os Parquet do snapshot. Cada
+    consulta usa um cursor próprio da conexão (seguro entre as sessões do
+    Streamlit); ``threads`` limita as threads de varredura.
+    """
+
+    nome = "duckdb"
+
+    def __init__(self, data_dir=snapshot.DATA_DIR, threads=None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DuckDBBackend requer o pacote opcional 'duckdb'") from e
+        manifest = snapshot.read_manifest(data_dir)
+        if not manifest:
+            raise FileNotFoundError(f"Snapshot não encontrado em {snapshot.snapshot_dir(data_dir)} "
+                                    "(gere com python -m analytics.snapshot)")
+        self.versao = manifest["version"]
+        self.conexao = duckdb.connect()
+        if threads:
+            self.conexao.execute(f"SET threads TO {int(threads)}")
+        snap = snapshot.snapshot_dir(data_dir)
+        for tabela in ('df_main',) + MONTH_TABLES:
+            caminho = os.path.join(snap, f"{tabela}.parquet").replace("'", "''")
+            self.conexao.execute(f"CREATE VIEW {tabela} AS SELECT * FROM read_parquet('{caminho}')")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _month(tabela):
+        return "mes" if tabela in MONTH_TABLES else "((year(DT_REFE) - 1970) * 12 + month(DT_REFE) - 1)"
+
+    @classmethod
+    def _conditions(cls, consulta, setor, momento, meses, parametros):
+        condicoes = []
+        for valor, colunas in ((setor, consulta.setores), (momento, consulta.momentos)):
+            if valor is not None:
+                for coluna in colunas:
+                    condicoes.append(f"{coluna} = ?")
+                    parametros.append(valor)
+        if meses is not None:
+            condicoes.append(f"{cls._month(consulta.tabela)} IN ({', '.join(str(int(m)) for m in meses) or 'NULL'})")
+        return condicoes
+
+    def sql(self, consulta, setor=None, momento=None, meses=None):
+        """SQL (e parâmetros) de ``consulta`` com os filtros globais."""
+        parametros = []
+        mes = self._month(consulta.tabela)
+        colunas = [f"{mes} AS mes" if c == 'mes' else c for c in consulta.chaves]
+        colunas += [f"COALESCE(SUM({m}), 0) AS {m}" for m in consulta.medidas]
+        condicoes = self._conditions(consulta, setor, momento, meses, parametros)
+        condicoes += [f"{'DT_REFE' if c == 'mes' and consulta.tabela not in MONTH_TABLES else c} IS NOT NULL"
+                      for c in consulta.chaves]
+        chaves = ", ".join(consulta.chaves)
+        texto = (f"SELECT {', '.join(colunas)} FROM {consulta.tabela}"
+                 + (f" WHERE {' AND '.join(condicoes)}" if condicoes else "")
+                 + f" GROUP BY {chaves} ORDER BY {chaves}")
+        return texto, parametros
+
+    def run(self, consulta, setor=None, momento=None, meses=None):
+        texto, parametros = self.sql(consulta, setor, momento, meses)
+        with self._lock:
+            cursor = self.conexao.cursor()
+        try:
+            agrupado = cursor.execute(texto, parametros).df()
+        finally:
+            cursor.close()
+        if 'mes' in agrupado.columns:
+            agrupado['mes'] = agrupado['mes'].astype(np.int32)
+        return agrupado
+
+
+def backend(nome=None, tabelas=None, motor=None, data_dir=snapshot.DATA_DIR):
+    """Motor ``nome`` (``DASHBOARD_BACKEND`` se omitido): pandas sobre ``tabelas`` ou DuckDB sobre ``data_dir``."""
+    nome = nome or DEFAULT_BACKEND
+    if nome == "pandas":
+        return PandasBackend(tabelas, motor)
+    if nome == "duckdb":
+        return DuckDBBackend(data_dir)
+    raise ValueError(f"Motor de consulta desconhecido: {nome!r} (use {', '.join(BACKENDS)})")
+
+
+# --- Acabamento (comum aos dois motores) ---
+def monthly_series(motor, setor=None, momento=None, meses=None):
+    """Série mensal (recebido, pago, fluxo, contagens e tickets médios) com ``MesAno``, como ``cube.monthly_series``."""
+    data = motor.run(MONTHLY, setor, momento, meses)
+    data.insert(0, 'MesAno', periods.month_labels(data['mes']))
+    for col in cube.TICKETS:
+        data[col] = data[f'{col}_soma'] / data[f'{col}_qtd'].replace(0, np.nan)
+    return data
+
+
+def top_sectors_received(motor, top_n, setor=None, momento=None, meses=None):
+    """``top_n`` setores por total recebido, em ordem crescente (para barras horizontais)."""
+    data = motor.run(SECTOR_RECEIVED, setor, momento, meses)
+    return data.set_index('setor_cnae')['total_recebido'].nlargest(top_n).sort_values(ascending=True).reset_index()
+
+
+def transaction_mix(motor, setor=None, momento=None, meses=None):
+    """
+    Valor por tipo de transação (``DS_TRAN``) das transações com pagador ou
+    recebedor entre as empresas filtradas: recebido + pago dessas empresas
+    menos as transações com os dois lados entre elas (``analytics.mix``).
+    """
+    empresas = motor.run(MIX_COMPANIES, setor, momento, meses).set_index('DS_TRAN')
+    pares = motor.run(MIX_PAIRS, setor, momento, meses).set_index('DS_TRAN').reindex(empresas.index, fill_value=0)
+    valor = empresas['valor_recebido'] + empresas['valor_pago'] - pares['VL']
+    return valor.rename('VL').reset_index()
+
+
+def monthly_growth(motor, setor=None, momento=None, meses=None):
+    """
+    Crescimento % do fluxo mês a mês (``crescimento_mm_fluxo``), sobre três
+    meses antes (``variacao_3m_fluxo``) e da soma móvel de ``growth.WINDOW``
+    meses (``crescimento_janela_fluxo``), com ``MesAno``. As bases vêm do
+    painel, então um mês isolado é comparado ao mês anterior do calendário.
+    """
+    data = motor.run(MONTHLY_GROWTH, setor, momento, meses)
+    data.insert(0, 'MesAno', periods.month_labels(data['mes']))
+    data['crescimento_mm_fluxo'] = growth.growth(data['fluxo'], data['fluxo_1m'], data['tem_1m'])
+    data['variacao_3m_fluxo'] = growth.growth(data['fluxo'], data['fluxo_3m'], data['tem_3m'])
+    data['crescimento_janela_fluxo'] = growth.growth(data['janela'], data['janela_anterior'], data['tem_janela_anterior'])
+    return data
+
+
+def reference_month(motor, meses=None):
+    """Mês dos rankings de crescimento: o último selecionado ou, com "Todos", o último do painel."""
+    if meses is not None:
+        return int(np.max(meses)) if len(meses) else None
+    todos = motor.run(MONTHLY_GROWTH)['mes']
+    return int(todos.max()) if len(todos) else None
+
+
+def _month_slice(motor, consulta, setor, momento, meses):
+    """Linhas do painel no mês de referência (e o mês, ``None`` sem dados)."""
+    mes = reference_month(motor, meses)
+    return motor.run(consulta, setor, momento, [] if mes is None else [mes]), mes
+
+
+def company_growth(motor, top_n, setor=None, momento=None, meses=None):
+    """
+    ``top_n`` empresas pelo crescimento % do fluxo no mês de referência sobre o
+    mês anterior, com o crescimento sobre três meses antes e o da janela móvel.
+    """
+    painel, mes = _month_slice(motor, COMPANY_GROWTH, setor, momento, meses)
+    crescimento = pd.DataFrame({
+        'id_empresa': painel['id_empresa'],
+        'crescimento_mm_fluxo': growth.growth(painel['fluxo'], painel['fluxo_1m'], painel['tem_1m']),
+        'crescimento_3m_fluxo': growth.growth(painel['fluxo'], painel['fluxo_3m'], painel['tem_3m']),
+        'crescimento_janela_fluxo': growth.growth(painel['janela'], painel['janela_anterior'],
+                                                  painel['tem_janela_anterior']),
+    }).dropna(subset=['crescimento_mm_fluxo'])
+    crescimento = crescimento.nlargest(top_n, 'crescimento_mm_fluxo')
+    crescimento = crescimento.sort_values('crescimento_mm_fluxo', ascending=True, kind='stable', ignore_index=True)
+    crescimento.insert(1, 'MesAno', periods.month_labels([mes] * len(crescimento)))
+    return crescimento
+
+
+def sector_flow_deltas(motor, top_n, setor=None, momento=None, meses=None):
+    """
+    Setores com maior queda de fluxo do mês anterior para o mês de referência
+    (colunas com os rótulos dos dois meses e ``delta``); ``None`` sem mês anterior.
+    """
+    painel, mes = _month_slice(motor, SECTOR_GROWTH, setor, momento, meses)
+    if painel.empty or not (painel['tem_1m'] > 0).any():
+        return None
+    anterior, atual = periods.month_labels([mes - 1, mes])
+    quedas = pd.DataFrame({'setor_cnae': painel['setor_cnae'], anterior: painel['fluxo_1m'],
+                           atual: painel['fluxo'], 'delta': painel['fluxo'] - painel['fluxo_1m']})
+    return quedas.nsmallest(top_n, 'delta').reset_index(drop=True)
+
+
+AGGREGATIONS = {
+    "serie_mensal": lambda motor, top_n, *filtros: monthly_series(motor, *filtros),
+    "top_setores_recebido": top_sectors_received,
+    "mix_transacoes": lambda motor, top_n, *filtros: transaction_mix(motor, *filtros),
+    "crescimento_mensal": lambda motor, top_n, *filtros: monthly_growth(motor, *filtros),
+    "top_crescimento_empresas": company_growth,
+    "queda_setores": sector_flow_deltas,
+}
+
+
+# --- Paridade entre os Motores ---
+def compare(esperado, obtido, rtol=RTOL):
+    """Diferença entre dois resultados (``None`` se iguais: chaves e ordem exatas, medidas com ``rtol``)."""
+    if esperado is None or obtido is None:
+        return None if esperado is None and obtido is None else "um dos motores devolveu None"
+    if list(esperado.columns) != list(obtido.columns):
+        return f"colunas diferentes: {list(esperado.columns)} x {list(obtido.columns)}"
+    if len(esperado) != len(obtido):
+        return f"linhas diferentes: {len(esperado)} x {len(obtido)}"
+    for coluna in esperado.columns:
+        a, b = esperado[coluna].to_numpy(), obtido[coluna].to_numpy()
+        if a.dtype.kind in 'iuf' and b.dtype.kind in 'iuf':
+            if not np.allclose(a.astype(np.float64), b.astype(np.float64), rtol=rtol, atol=0, equal_nan=True):
+                return f"valores diferentes em {coluna!r}"
+        elif not (pd.Series(a, dtype=object).astype(str) == pd.Series(b, dtype=object).astype(str)).all():
+            return f"valores diferentes em {coluna!r}"
+    return None
+
+
+def filter_states(tabelas):
+    """Estados de filtro conferidos: todos os momentos × ("Todos", um setor) × ("Todos", cada mês, os dois últimos)."""
+    df_main = tabelas['df_main']
+    momentos = [None] + sorted(df_main['momento_empresa'].dropna().unique().tolist())
+    setores = [None, df_main['setor_cnae'].value_counts().index[0]]
+    codigos = np.unique(periods.month_codes(df_main['DT_REFE'].dropna()))
+    meses = [None] + [np.asarray([c], dtype=np.int32) for c in codigos] + [codigos[-2:].astype(np.int32)]
+    return [(setor, momento, mes) for momento in momentos for setor in setores for mes in meses]
+
+
+def parity(motores, tabelas, top_n=10, rtol=RTOL):
+    """Roda as agregações em cada estado de ``filter_states`` nos dois motores; devolve as divergências e os tempos."""
+    referencia, outro = motores
+    divergencias, tempos = [], {m.nome: 0.0 for m in motores}
+    for setor, momento, meses in filter_states(tabelas):
+        for nome, agregacao in AGGREGATIONS.items():
+            resultados = []
+            for motor in (referencia, outro):
+                inicio = time.perf_counter()
+                resultados.append(agregacao(motor, top_n, setor, momento, meses))
+                tempos[motor.nome] += time.perf_counter() - inicio
+            diferenca = compare(*resultados, rtol=rtol)
+            if diferenca:
+                divergencias.append((nome, setor, momento, None if meses is None else periods.month_labels(meses), diferenca))
+    return divergencias, tempos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confere que os motores pandas e DuckDB devolvem as mesmas agregações.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--rtol", type=float, default=RTOL, help="Tolerância relativa das medidas (ordem de soma)")
+    args = parser.parse_args(argv)
+
+    tabelas = snapshot.load_snapshot(args.data_dir)
+    motores = (PandasBackend(tabelas), DuckDBBackend(args.data_dir))
+    divergencias, tempos = parity(motores, tabelas, args.top_n, args.rtol)
+    estados = len(filter_states(tabelas))
+    print(f"{estados} estados de filtro × {len(AGGREGATIONS)} agregações; "
+          + ", ".join(f"{nome}: {segundos:.2f}s" for nome, segundos in tempos.items()))
+    for nome, setor, momento, meses, diferenca in divergencias:
+        print(f"  DIVERGE {nome} setor={setor} momento={momento} meses={meses}: {diferenca}")
+    if divergencias:
+        raise SystemExit(1)
+    print("Resultados idênticos nos dois motores.")
+
+
+if __name__ == "__main__":
+    main()
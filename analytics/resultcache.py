@@ -0,0 +1,172 @@
+"""
+Cache de resultados compartilhado entre as sessões do dashboard.
+
+Guarda resultados pequenos e caros de recalcular — KPIs, séries e agregados
+das abas, rankings top-N — sob uma chave com o estado normalizado dos filtros,
+de modo que a mesma visão aberta por várias sessões é calculada uma única vez
+no processo. O tamanho é limitado por número de entradas e por um orçamento
+de bytes (descarte LRU), as entradas expiram após um TTL e todo o cache é
+invalidado quando a versão do snapshot muda. Chamadas concorrentes para uma
+mesma chave esperam o primeiro cálculo em vez de repeti-lo.
+
+Os valores devolvidos são os próprios objetos guardados: quem os recebe não
+deve modificá-los.
+"""
+import collections
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+MAX_BYTES = 256 * 2 ** 20
+MAX_ENTRIES = 2048
+TTL_SECONDS = 3600.0
+
+
+def normalize(valor):
+    """Forma hashable e canônica de um valor de filtro (listas e arrays viram tuplas ordenadas)."""
+    if valor is None or isinstance(valor, (str, bytes, bool, int, float)):
+        return valor
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+        return tuple(sorted(normalize(v) for v in valor))
+    return valor
+
+
+def make_key(nome, *args, **filtros):
+    """Chave ``(nome, args..., (filtro, valor)...)`` com os valores normalizados."""
+    return (nome,) + tuple(normalize(a) for a in args) + tuple(sorted((k, normalize(v)) for k, v in filtros.items()))
+
+
+def size_of(valor):
+    """Bytes aproximados de um resultado (DataFrames e arrays pelo conteúdo)."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, pd.Index)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if isinstance(uso, pd.Series) else int(uso)
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(size_of(k) + size_of(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(size_of(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+_AUSENTE = object()
+
+
+class ResultCache:
+    """Cache LRU com TTL, orçamento de bytes e invalidação pela versão dos dados."""
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, relogio=time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.relogio = relogio
+        self.versao = None
+        self._entradas = collections.OrderedDict()
+        self._calculando = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.contadores = collections.Counter()
+        self.por_nome = collections.defaultdict(collections.Counter)
+
+    # --- Manutenção (chamadas com o lock) ---
+    def _check_version(self, versao):
+        if versao is not None and versao != self.versao:
+            if self._entradas:
+                self.contadores['invalidations'] += 1
+            self._entradas.clear()
+            self.bytes = 0
+            self.versao = versao
+
+    def _drop(self, chave):
+        _, tamanho, _ = self._entradas.pop(chave)
+        self.bytes -= tamanho
+
+    def _lookup(self, chave):
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return _AUSENTE
+        valor, _, criado = entrada
+        if self.ttl is not None and self.relogio() - criado > self.ttl:
+            self._drop(chave)
+            self.contadores['expirations'] += 1
+            return _AUSENTE
+        self._entradas.move_to_end(chave)
+        return valor
+
+    def _store(self, chave, valor, versao):
+        if versao is not None and versao != self.versao:
+            return  # a versão mudou durante o cálculo
+        tamanho = size_of(valor)
+        if tamanho > self.max_bytes:
+            self.contadores['rejected'] += 1
+            return
+        if chave in self._entradas:
+            self._drop(chave)
+        self._entradas[chave] = (valor, tamanho, self.relogio())
+        self.bytes += tamanho
+        while self.bytes > self.max_bytes or len(self._entradas) > self.max_entries:
+            self._drop(next(iter(self._entradas)))
+            self.contadores['evictions'] += 1
+
+    def _count(self, chave, evento):
+        self.contadores[evento] += 1
+        self.por_nome[chave[0] if isinstance(chave, tuple) and chave else chave][evento] += 1
+
+    # --- API pública ---
+    def get_or_compute(self, chave, calcular, versao=None):
+        """Valor de ``chave``; na falta, ``calcular()`` é chamado (uma vez por chave) e guardado."""
+        with self._lock:
+            self._check_version(versao)
+            valor = self._lookup(chave)
+            if valor is not _AUSENTE:
+                self._count(chave, 'hits')
+                return valor
+            evento = self._calculando.get(chave)
+            dono = evento is None
+            if dono:
+                evento = self._calculando[chave] = threading.Event()
+            self._count(chave, 'misses' if dono else 'waits')
+
+        if not dono:
+            evento.wait()
+            with self._lock:
+                valor = self._lookup(chave)
+            # Se o cálculo do dono falhou, esta chamada calcula por conta própria
+            return calcular() if valor is _AUSENTE else valor
+
+        try:
+            valor = calcular()
+            with self._lock:
+                self._store(chave, valor, versao)
+        finally:
+            with self._lock:
+                self._calculando.pop(chave).set()
+        return valor
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Contadores (acertos, faltas, descartes...), ocupação e taxa de acerto global e por nome."""
+        with self._lock:
+            consultas = self.contadores['hits'] + self.contadores['misses'] + self.contadores['waits']
+            return {
+                "entries": len(self._entradas),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "version": self.versao,
+                "hit_rate": (self.contadores['hits'] + self.contadores['waits']) / consultas if consultas else None,
+                **{k: self.contadores[k] for k in ('hits', 'misses', 'waits', 'evictions', 'expirations',
+                                                    'invalidations', 'rejected')},
+                "by_name": {nome: dict(c) for nome, c in sorted(self.por_nome.items())},
+            }
@@ -0,0 +1,244 @@
+"""
+Índice de busca de empresas do Detalhamento.
+
+Montado uma vez por versão dos dados, com uma linha por empresa em ordem do
+id normalizado (minúsculas, sem acentos):
+
+- prefixo do id: faixa contígua achada por busca binária nas chaves ordenadas;
+- trecho do id (três caracteres ou mais): listas de trigramas em CSR,
+  intersectadas e conferidas contra as chaves;
+- setor, momento e grupo: prefixo das palavras de cada categoria, resolvido
+  sobre as categorias distintas (poucas) e aplicado pelos códigos.
+
+Cada palavra da busca precisa casar com algum desses campos. As empresas são
+percorridas em blocos na ordem do critério de ranking (``RANKINGS``),
+restritas à máscara dos filtros globais, até achar ``RESULTS``; quando a
+palavra mais seletiva casa com poucas empresas, só as linhas dela são
+conferidas. O resultado
+tem tamanho fixo, qualquer que seja o número de empresas.
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+RESULTS = 20
+BLOCK = 4096
+# Uma palavra que casa com até 1/SELECTIVE das empresas é varrida pelas suas linhas
+SELECTIVE = 16
+RANKINGS = ('total_recebido', 'Centralidade_de_Conexoes')
+FIELDS = ('setor_cnae', 'momento_empresa', 'Grupo_Empresas')
+
+
+def normalize(texto):
+    """Texto em minúsculas e sem acentos."""
+    return unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _trigrams(chaves):
+    """Pares (trigrama, linha) de um array de bytes de largura fixa (zeros no fim de cada chave)."""
+    largura = chaves.dtype.itemsize
+    if largura < 3 or not len(chaves):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    matriz = np.frombuffer(chaves.tobytes(), dtype=np.uint8).reshape(len(chaves), largura).astype(np.int64)
+    codigos = (matriz[:, :-2] << 16) | (matriz[:, 1:-1] << 8) | matriz[:, 2:]
+    validos = matriz[:, 2:] != 0
+    linhas = np.broadcast_to(np.arange(len(chaves))[:, None], validos.shape)
+    return codigos[validos], linhas[validos]
+
+
+def _intersect(menor, maior):
+    """Interseção de dois arrays ordenados sem repetição, por busca binária dos elementos do menor."""
+    if not len(maior):
+        return menor[:0]
+    posicoes = np.searchsorted(maior, menor).clip(max=len(maior) - 1)
+    return menor[maior[posicoes] == menor]
+
+
+class _Field:
+    """Campo categórico do índice: códigos por empresa, palavras das categorias e linhas por categoria (CSR)."""
+
+    def __init__(self, codigos, categorias, palavras, palavra_codigos, contagens, linhas, inicios):
+        self.codigos = codigos
+        self.categorias = categorias
+        self.palavras = palavras
+        self.palavra_codigos = palavra_codigos
+        self.contagens = contagens
+        self.linhas = linhas
+        self.inicios = inicios
+
+
+class _Word:
+    """
+    Uma palavra da busca: linhas casadas pelo id (ordenadas), por campo a
+    tabela e os códigos das categorias casadas, e o número de linhas casadas
+    (limite superior).
+    """
+
+    def __init__(self, linhas, tabelas, tamanho):
+        self.linhas = linhas
+        self.tabelas = tabelas
+        self.tamanho = tamanho
+
+    def empty(self):
+        return not self.tamanho
+
+
+class CompanySearchIndex:
+    """Busca por prefixo/trigramas nas empresas de ``df_main``, ranqueada por ``RANKINGS``."""
+
+    def __init__(self, df_main):
+        empresas = df_main[~df_main['id_empresa'].duplicated()]
+        chaves = (empresas['id_empresa'].astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore')
+                  .str.decode('ascii').str.lower().to_numpy().astype(bytes))
+        ordem = np.argsort(chaves, kind='stable')
+        empresas = empresas.iloc[ordem]
+        self.chaves = chaves[ordem]
+        self.ids = np.asarray(empresas['id_empresa'].astype(str), dtype=object)
+        self._linha = pd.Index(self.ids)
+
+        # Trigramas do id em CSR: linhas de cada trigrama, ordenadas
+        codigos, linhas = _trigrams(self.chaves)
+        pares = np.sort(codigos << 32 | linhas)
+        pares = pares[np.r_[True, pares[1:] != pares[:-1]]]
+        trigramas = pares >> 32
+        inicios = np.flatnonzero(np.r_[True, trigramas[1:] != trigramas[:-1]])
+        self.trigramas = trigramas[inicios]
+        self.inicios = np.append(inicios, len(pares))
+        self.postings = (pares & 0xFFFFFFFF).astype(np.int32)
+
+        # Campos categóricos: códigos por empresa, palavras (ordenadas) de cada categoria
+        # e as linhas de cada categoria em CSR
+        self.campos = {}
+        for campo in FIELDS:
+            if campo not in empresas.columns:
+                continue
+            valores = pd.Categorical(empresas[campo].astype(str))
+            palavras = sorted({(p, codigo) for codigo, categoria in enumerate(valores.categories)
+                               for p in [normalize(categoria)] + normalize(categoria).split()})
+            contagens = np.bincount(valores.codes[valores.codes >= 0], minlength=len(valores.categories))
+            self.campos[campo] = _Field(valores.codes, valores.categories, np.array([p for p, _ in palavras]),
+                                        np.array([c for _, c in palavras], dtype=np.int32), contagens,
+                                        np.argsort(valores.codes, kind='stable').astype(np.int32),
+                                        np.concatenate([[0], np.cumsum(contagens)]) + int((valores.codes < 0).sum()))
+
+        # Ordem de cada ranking (maior primeiro) e a posição de cada linha nela
+        self.ordens, self.posicoes = {}, {}
+        for criterio in RANKINGS:
+            if criterio not in empresas.columns:
+                continue
+            valores = pd.to_numeric(empresas[criterio], errors='coerce').fillna(-np.inf).to_numpy(dtype=np.float64)
+            self.ordens[criterio] = np.argsort(-valores, kind='stable')
+            posicao = np.empty(len(valores), dtype=np.int64)
+            posicao[self.ordens[criterio]] = np.arange(len(valores))
+            self.posicoes[criterio] = posicao
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- Máscara dos Filtros ---
+    def mask(self, ids):
+        """Máscara (uma posição por empresa do índice) das empresas em ``ids``."""
+        linhas = self._linha.get_indexer(pd.Index(ids).astype(str))
+        mascara = np.zeros(len(self.ids), dtype=bool)
+        mascara[linhas[linhas >= 0]] = True
+        return mascara
+
+    def contains(self, empresa, mascara=None):
+        linha = self._linha.get_indexer([empresa])[0]
+        return linha >= 0 and (mascara is None or bool(mascara[linha]))
+
+    # --- Casamento ---
+    def _substring(self, palavra):
+        """Linhas cujo id contém ``palavra`` (três caracteres ou mais), pelos trigramas."""
+        codigos, _ = _trigrams(np.array([palavra], dtype=bytes))
+        posicoes = np.searchsorted(self.trigramas, codigos)
+        if not len(codigos) or (posicoes >= len(self.trigramas)).any() or (self.trigramas[posicoes] != codigos).any():
+            return np.empty(0, dtype=np.int32)
+        listas = sorted((self.postings[self.inicios[p]:self.inicios[p + 1]] for p in np.unique(posicoes)), key=len)
+        linhas = listas[0]
+        for lista in listas[1:]:
+            # Listas de trigramas muito comuns quase não filtram: a conferência final resolve
+            if len(linhas) <= BLOCK or len(lista) * 2 > len(self.ids):
+                break
+            linhas = _intersect(linhas, lista)
+        return linhas[np.char.find(self.chaves[linhas], palavra) >= 0]
+
+    def _word(self, palavra):
+        chave = palavra.encode('ascii')
+        inicio = np.searchsorted(self.chaves, chave, 'left')
+        fim = np.searchsorted(self.chaves, chave + b'\xff', 'left')
+        linhas = np.arange(inicio, fim, dtype=np.int32)
+        if len(chave) >= 3:
+            linhas = np.union1d(linhas, self._substring(chave))
+        tabelas, tamanho = {}, len(linhas)
+        for nome, campo in self.campos.items():
+            faixa = slice(np.searchsorted(campo.palavras, palavra, 'left'),
+                          np.searchsorted(campo.palavras, palavra + '\uffff', 'left'))
+            casadas = np.unique(campo.palavra_codigos[faixa])
+            if len(casadas):
+                tabela = np.zeros(len(campo.categorias), dtype=bool)
+                tabela[casadas] = True
+                tabelas[nome] = (tabela, casadas)
+                tamanho += int(campo.contagens[casadas].sum())
+        return _Word(linhas, tabelas, tamanho)
+
+    def _rows(self, palavra):
+        """Todas as linhas casadas por ``palavra`` (id e categorias), ordenadas."""
+        partes = [palavra.linhas]
+        for nome, (_, casadas) in palavra.tabelas.items():
+            campo = self.campos[nome]
+            partes += [campo.linhas[campo.inicios[c]:campo.inicios[c + 1]] for c in casadas]
+        return np.unique(np.concatenate(partes)) if len(partes) > 1 else palavra.linhas
+
+    def _matches(self, palavra, linhas):
+        if len(palavra.linhas):
+            posicoes = np.searchsorted(palavra.linhas, linhas).clip(max=len(palavra.linhas) - 1)
+            casa = palavra.linhas[posicoes] == linhas
+        else:
+            casa = np.zeros(len(linhas), dtype=bool)
+        for nome, (tabela, _) in palavra.tabelas.items():
+            casa |= tabela[self.campos[nome].codigos[linhas]]
+        return casa
+
+    def search(self, texto, mascara=None, ranking=RANKINGS[0], limite=RESULTS):
+        """
+        Ids das até ``limite`` melhores empresas (pelo ``ranking``) que casam com
+        todas as palavras de ``texto`` e estão em ``mascara`` (``None``: todas).
+        Texto vazio devolve as melhores empresas da máscara.
+        """
+        palavras = [self._word(p) for p in normalize(texto).split()]
+        if any(p.empty() for p in palavras):
+            return []
+        ordem, posicao = self.ordens[ranking], self.posicoes[ranking]
+
+        # A palavra (ou a máscara) mais seletiva, se casar com poucas linhas, limita a varredura a elas
+        seletiva = min(palavras, key=lambda p: p.tamanho, default=None)
+        tamanho = len(ordem) if seletiva is None else seletiva.tamanho
+        na_mascara = len(ordem) if mascara is None else int(np.count_nonzero(mascara))
+        if min(tamanho, na_mascara) * SELECTIVE <= len(ordem):
+            linhas = self._rows(seletiva) if tamanho <= na_mascara else np.flatnonzero(mascara)
+            blocos = [linhas[np.argsort(posicao[linhas], kind='stable')]]
+        else:
+            blocos = (ordem[i:i + BLOCK] for i in range(0, len(ordem), BLOCK))
+
+        achadas, total = [], 0
+        for bloco in blocos:
+            casa = np.ones(len(bloco), dtype=bool) if mascara is None else mascara[bloco]
+            for palavra in palavras:
+                casa[casa] = self._matches(palavra, bloco[casa])
+            achadas.append(bloco[casa])
+            total += int(casa.sum())
+            if total >= limite:
+                break
+        linhas = np.concatenate(achadas)[:limite] if achadas else np.empty(0, dtype=np.int64)
+        return self.ids[linhas].tolist()
+
+    def describe(self, empresa):
+        """Setor e momento de ``empresa`` (para o rótulo das opções)."""
+        linha = self._linha.get_indexer([empresa])[0]
+        if linha < 0:
+            return ""
+        partes = [str(self.campos[c].categorias[self.campos[c].codigos[linha]])
+                  for c in ('setor_cnae', 'momento_empresa') if c in self.campos]
+        return " · ".join(partes)
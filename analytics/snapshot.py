@@ -0,0 +1,495 @@
+"""
+Snapshot colunar dos dados do dashboard.
+
+Na primeira carga as quatro fontes (``Base1_ID.xlsx``, ``Base2_Transacoes.xlsx``,
+``dados_para_powerbi.csv`` e ``dados_rede_para_powerbi.csv``) são lidas, limpas
+e mescladas com as mesmas etapas do dashboard e gravadas em Parquet dentro de
+``data/.snapshot``, junto com as tabelas agregadas de ``AGGREGATES``. As cargas
+seguintes leem apenas o snapshot, que é invalidado quando o mtime ou o hash do
+conteúdo de alguma fonte muda. As planilhas podem ser substituídas por um
+Parquet de mesmo nome (``Base2_Transacoes.parquet``), usado nas bases que
+passam do limite de linhas do Excel. Lotes de transações ingeridos depois
+(``analytics.ingest``) ficam em ``data/lotes`` e são reaplicados em uma
+reconstrução completa.
+
+Pré-aquecimento (antes de subir o servidor):
+    python -m analytics.snapshot [--data-dir data] [--hash] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from analytics import clustering, community, cube, exposure, features, growth, ingest, mix, streaks
+
+try:
+    import pyarrow  # noqa: F401  (motor de Parquet do pandas)
+except ImportError:
+    pyarrow = None
+
+DATA_DIR = "data"
+SNAPSHOT_DIRNAME = ".snapshot"
+MANIFEST_NAME = "manifest.json"
+# Incrementar ao mudar a preparação das tabelas base (``prepare_frames``)
+FORMAT_VERSION = 2
+
+SOURCES = {
+    "base_id": "Base1_ID.xlsx",
+    "base_transacoes": "Base2_Transacoes.xlsx",
+    "df_powerbi": "dados_para_powerbi.csv",
+    "df_rede": "dados_rede_para_powerbi.csv",
+}
+TABLES = ["df_main", "base_id", "base_transacoes"]
+
+# Tabelas derivadas gravadas junto ao snapshot: nome -> (função, tabelas de
+# entrada, versão da definição). Incrementar a versão ao mudar o que a função
+# calcula: snapshots gravados com outra versão recalculam o agregado (e os que
+# dependem dele) na próxima carga, sem reler as fontes.
+AGGREGATES = {
+    "cubo_mensal": (cube.build_monthly_cube, ["df_main"], 1),
+    "sequencias_negativas": (streaks.build_streak_table, ["df_main"], 1),
+    "crescimento_empresas": (growth.build_company_growth, ["df_main"], 1),
+    "crescimento_setores": (growth.build_sector_growth, ["cubo_mensal"], 1),
+    "mix_empresas": (mix.build_company_mix, ["base_transacoes", "df_main"], 1),
+    "mix_pares": (mix.build_pair_mix, ["base_transacoes", "df_main"], 1),
+    "exposicao_mensal": (exposure.build_monthly_exposure, ["base_transacoes", "df_main"], 1),
+    "arestas": (features.edge_aggregates, ["base_transacoes"], 1),
+    "exposicao_periodo": (exposure.build_network_exposure, ["arestas", "df_main"], 1),
+    "comunidades": (community.build_communities, ["arestas"], 1),
+}
+
+NETWORK_COLS = [
+    'id_empresa', 'Centralidade_de_Conexoes', 'Centralidade_de_Recebimentos',
+    'Centralidade_de_Pagamentos', 'Centralidade_de_Ponte', 'Grupo_Empresas'
+]
+NUMERIC_COLS = [
+    'total_recebido', 'num_transacoes_recebidas', 'num_clientes_unicos',
+    'total_pago', 'num_transacoes_pagas', 'num_fornecedores_unicos',
+    'fluxo_caixa_liquido', 'ticket_medio_recebido', 'ticket_medio_pago',
+    'faturamento', 'Centralidade_de_Conexoes', 'Centralidade_de_Recebimentos',
+    'Centralidade_de_Pagamentos', 'Centralidade_de_Ponte'
+]
+
+HASH_CHUNK = 1 << 20
+
+
+# --- Leitura e Preparação das Fontes ---
+def source_path(nome, data_dir=DATA_DIR):
+    """Caminho da fonte; uma planilha ausente pode vir de um Parquet de mesmo nome."""
+    path = os.path.join(data_dir, SOURCES[nome])
+    alternativo = os.path.splitext(path)[0] + ".parquet"
+    if path.endswith(".xlsx") and not os.path.exists(path) and os.path.exists(alternativo):
+        return alternativo
+    return path
+
+
+def _read_sheet(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_excel(path)
+
+
+def read_sources(data_dir=DATA_DIR):
+    """Lê as quatro fontes brutas do diretório de dados."""
+    def path(nome):
+        return source_path(nome, data_dir)
+
+    return {
+        "base_id": _read_sheet(path("base_id")),
+        "base_transacoes": _read_sheet(path("base_transacoes")),
+        "df_powerbi": pd.read_csv(path("df_powerbi"), sep=';', encoding='utf-8-sig', decimal=','),
+        "df_rede": pd.read_csv(path("df_rede"), sep=';', encoding='utf-8-sig', decimal=','),
+    }
+
+
+def prepare_frames(base_id, base_transacoes, df_powerbi, df_rede):
+    """
+    Padroniza, mescla e converte os tipos das fontes brutas.
+    Retorna um dicionário com ``df_main``, ``base_id`` e ``base_transacoes``.
+    """
+    # Padronização de Nomes de Colunas
+    for df in [base_id, base_transacoes, df_powerbi, df_rede]:
+        df.columns = df.columns.str.strip()
+
+    for df in [base_id, df_powerbi, df_rede]:
+        if 'ID' in df.columns:
+            df.rename(columns={'ID': 'id_empresa'}, inplace=True)
+
+    # Merge Estratégico e Definitivo
+    df_main = df_powerbi
+
+    if 'id_empresa' in base_id.columns:
+        date_cols_to_add = ['id_empresa']
+        if 'DT_REFE' in base_id.columns: date_cols_to_add.append('DT_REFE')
+        if 'DT_ABRT' in base_id.columns: date_cols_to_add.append('DT_ABRT')
+        df_main = pd.merge(df_main, base_id[date_cols_to_add], on='id_empresa', how='left')
+
+    if 'id_empresa' in df_rede.columns:
+        valid_network_cols = [col for col in NETWORK_COLS if col in df_rede.columns]
+        df_main = pd.merge(df_main, df_rede[valid_network_cols], on='id_empresa', how='left')
+
+    # Limpeza e Conversão de Tipos
+    for col in ['DT_ABRT', 'DT_REFE']:
+        if col in df_main.columns:
+            df_main[col] = pd.to_datetime(df_main[col], errors='coerce')
+
+    for col in ['setor_cnae', 'momento_empresa']:
+        if col in df_main.columns:
+            df_main[col] = ingest.clean_labels(df_main[col])
+
+    for col in NUMERIC_COLS:
+        if col in df_main.columns:
+            df_main[col] = pd.to_numeric(df_main[col], errors='coerce').fillna(0)
+
+    base_transacoes = ingest.clean_transactions(base_transacoes)
+
+    return {"df_main": df_main, "base_id": base_id, "base_transacoes": base_transacoes}
+
+
+# --- Impressões Digitais das Fontes ---
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def source_fingerprints(data_dir=DATA_DIR, with_hash=True):
+    """Retorna mtime, tamanho e (opcionalmente) sha256 de cada fonte."""
+    fingerprints = {}
+    for nome in SOURCES:
+        path = source_path(nome, data_dir)
+        stat = os.stat(path)
+        fingerprints[nome] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if with_hash:
+            fingerprints[nome]["sha256"] = _file_sha256(path)
+    return fingerprints
+
+
+def aggregate_versions():
+    """Versão da definição de cada agregado, como registrada no manifesto."""
+    return {nome: versao for nome, (_, _, versao) in AGGREGATES.items()}
+
+
+def _version_of(fingerprints, lotes=()):
+    conteudo = json.dumps({n: f["sha256"] for n, f in sorted(fingerprints.items())}, sort_keys=True)
+    definicoes = json.dumps(aggregate_versions(), sort_keys=True)
+    versao = hashlib.sha256(f"{FORMAT_VERSION}:{definicoes}:{conteudo}".encode()).hexdigest()[:16]
+    for lote in lotes:
+        versao = _chain_version(versao, lote)
+    return versao
+
+
+def _chain_version(versao, lote):
+    return hashlib.sha256(f"{versao}:{lote['sha256']}".encode()).hexdigest()[:16]
+
+
+# --- Lotes Ingeridos ---
+def batches_dir(data_dir=DATA_DIR):
+    return os.path.join(data_dir, ingest.LOTES_DIRNAME)
+
+
+def list_batches(data_dir=DATA_DIR, with_hash=False):
+    """Lotes gravados em ``data/lotes``, na ordem de ingestão."""
+    pasta = batches_dir(data_dir)
+    if not os.path.isdir(pasta):
+        return []
+    lotes = []
+    for arquivo in sorted(f for f in os.listdir(pasta) if f.endswith('.parquet')):
+        path = os.path.join(pasta, arquivo)
+        stat = os.stat(path)
+        lote = {"file": arquivo, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if with_hash:
+            lote["sha256"] = _file_sha256(path)
+        lotes.append(lote)
+    return lotes
+
+
+# --- Manifesto do Snapshot ---
+def snapshot_dir(data_dir=DATA_DIR):
+    return os.path.join(data_dir, SNAPSHOT_DIRNAME)
+
+
+def current_version(data_dir=DATA_DIR):
+    """Versão registrada no manifesto (muda a cada reconstrução ou lote ingerido)."""
+    manifest = read_manifest(data_dir)
+    return manifest["version"] if manifest else None
+
+
+def ensure_snapshot(data_dir=DATA_DIR, validate="mtime"):
+    """
+    Reconstrói o snapshot se ele faltar ou estiver desatualizado e retorna a
+    versão válida (``None`` sem ``pyarrow``). Chamada antes da carga, para que
+    a versão usada como chave de cache seja a dos dados que serão lidos.
+    """
+    if pyarrow is None:
+        return None
+    manifest = read_manifest(data_dir)
+    if not is_valid(manifest, data_dir, validate):
+        build_snapshot(data_dir)
+        manifest = read_manifest(data_dir)
+    elif stale_aggregates(manifest):
+        load_snapshot(data_dir, validate)
+        manifest = read_manifest(data_dir)
+    return manifest["version"]
+
+
+def read_manifest(data_dir=DATA_DIR):
+    """Lê o manifesto do snapshot ou retorna ``None`` se ele não existir."""
+    path = os.path.join(snapshot_dir(data_dir), MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def stale_aggregates(manifest):
+    """
+    Agregados que faltam no snapshot ou foram gravados com outra versão da
+    definição, mais os que dependem deles (na ordem de ``AGGREGATES``).
+    """
+    salvas = manifest.get("aggregates", {})
+    tabelas = set(manifest.get("tables", []))
+    vencidos = []
+    for nome, (_, entradas, versao) in AGGREGATES.items():
+        if nome not in tabelas or salvas.get(nome) != versao or any(e in vencidos for e in entradas):
+            vencidos.append(nome)
+    return vencidos
+
+
+def _write_manifest(data_dir, manifest):
+    path = os.path.join(snapshot_dir(data_dir), MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def is_valid(manifest, data_dir=DATA_DIR, validate="mtime"):
+    """
+    Verifica se o snapshot descrito pelo manifesto ainda corresponde às fontes.
+
+    Com ``validate="mtime"`` compara mtime e tamanho; se só o mtime mudou
+    (ex.: checkout do git), confere o hash antes de invalidar e atualiza o
+    manifesto. Com ``validate="hash"`` sempre compara o sha256 do conteúdo.
+    """
+    if not manifest or manifest.get("format") != FORMAT_VERSION:
+        return False
+    if not set(TABLES) <= set(manifest.get("tables", [])):
+        return False
+    snap = snapshot_dir(data_dir)
+    if not all(os.path.exists(os.path.join(snap, f"{t}.parquet")) for t in TABLES):
+        return False
+
+    salvas = manifest.get("sources", {})
+    try:
+        atuais = source_fingerprints(data_dir, with_hash=False)
+    except OSError:
+        return False
+    if set(salvas) != set(atuais):
+        return False
+
+    registrados = [(l["file"], l["size"], l["mtime_ns"]) for l in manifest.get("batches", [])]
+    if registrados != [(l["file"], l["size"], l["mtime_ns"]) for l in list_batches(data_dir)]:
+        return False
+
+    mudaram = [n for n, f in atuais.items()
+               if validate == "hash"
+               or f["mtime_ns"] != salvas[n]["mtime_ns"] or f["size"] != salvas[n]["size"]]
+    if not mudaram:
+        return True
+
+    for nome in mudaram:
+        if _file_sha256(source_path(nome, data_dir)) != salvas[nome].get("sha256"):
+            return False
+        salvas[nome].update(atuais[nome])
+    _write_manifest(data_dir, manifest)
+    return True
+
+
+# --- Construção e Leitura ---
+def _write_tables(data_dir, tabelas):
+    snap = snapshot_dir(data_dir)
+    tmp_dir = os.path.join(snap, f"tmp-{os.getpid()}")
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        for nome, df in tabelas.items():
+            df.to_parquet(os.path.join(tmp_dir, f"{nome}.parquet"), index=False)
+        for nome in tabelas:
+            os.replace(os.path.join(tmp_dir, f"{nome}.parquet"), os.path.join(snap, f"{nome}.parquet"))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def build_aggregates(tabelas, nomes=None):
+    """
+    Calcula as tabelas derivadas de ``AGGREGATES`` (todas ou só ``nomes``), na
+    ordem do dicionário: um agregado pode usar outro como entrada.
+    """
+    agregados = {}
+    for nome in (AGGREGATES if nomes is None else nomes):
+        funcao, entradas, _ = AGGREGATES[nome]
+        agregados[nome] = funcao(*[agregados[e] if e in agregados else tabelas[e] for e in entradas])
+    return agregados
+
+
+def _apply_batch(tabelas, lote, data_dir):
+    caminho = clustering.model_path(data_dir)
+    modelo = clustering.load_model(caminho)
+    if modelo is None:
+        ids = pd.Index(pd.unique(np.concatenate([lote['ID_PGTO'].to_numpy(), lote['ID_RCBE'].to_numpy()])))
+        novas = int((~ids.isin(tabelas['df_main']['id_empresa'])).sum())
+        if novas:
+            warnings.warn(f"{novas} empresa(s) nova(s) no lote ficam com momento 'N/A': não há modelo salvo em "
+                          f"{caminho} (gere com 'python -m analytics.clustering fit', requer scikit-learn).",
+                          RuntimeWarning, stacklevel=2)
+    tabelas, mantidas = ingest.apply_batch(tabelas, lote, modelo)
+    tabelas.update(build_aggregates(tabelas, [a for a in AGGREGATES if a not in mantidas]))
+    return tabelas, mantidas
+
+
+def _read_transactions(data_dir, manifest):
+    snap = snapshot_dir(data_dir)
+    partes = [pd.read_parquet(os.path.join(snap, "base_transacoes.parquet"))]
+    partes += [pd.read_parquet(os.path.join(batches_dir(data_dir), l["file"])) for l in manifest.get("batches", [])]
+    return partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+
+
+def build_snapshot(data_dir=DATA_DIR):
+    """
+    Lê as fontes, aplica a limpeza, reaplica os lotes de ``data/lotes`` e grava
+    o snapshot Parquet e o manifesto.
+    """
+    if pyarrow is None:
+        raise RuntimeError("O snapshot colunar requer o pacote 'pyarrow'.")
+
+    inicio = time.perf_counter()
+    fingerprints = source_fingerprints(data_dir)
+    tabelas = prepare_frames(**read_sources(data_dir))
+    tabelas.update(build_aggregates(tabelas))
+    transacoes_fonte = tabelas['base_transacoes']
+
+    lotes = list_batches(data_dir, with_hash=True)
+    for lote in lotes:
+        dados_lote = pd.read_parquet(os.path.join(batches_dir(data_dir), lote["file"]))
+        lote["rows"] = len(dados_lote)
+        tabelas, _ = _apply_batch(tabelas, dados_lote, data_dir)
+    _write_tables(data_dir, {**tabelas, 'base_transacoes': transacoes_fonte})
+
+    _write_manifest(data_dir, {
+        "format": FORMAT_VERSION,
+        "version": _version_of(fingerprints, lotes),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - inicio, 3),
+        "sources": fingerprints,
+        "batches": lotes,
+        "tables": list(tabelas),
+        "aggregates": aggregate_versions(),
+        "rows": {nome: len(df) for nome, df in tabelas.items()},
+    })
+    return tabelas
+
+
+def append_batch(lote, origem, data_dir=DATA_DIR):
+    """
+    Grava um lote limpo em ``data/lotes`` e atualiza o snapshot de forma
+    incremental (sem reler as fontes nem reescrever as transações anteriores).
+    Retorna o manifesto atualizado.
+    """
+    if pyarrow is None:
+        raise RuntimeError("A ingestão de lotes requer o pacote 'pyarrow'.")
+
+    tabelas = load_snapshot(data_dir)
+    manifest = read_manifest(data_dir)
+
+    # 1. O lote é gravado primeiro: se o processo parar no meio, o manifesto
+    #    deixa de bater com data/lotes e a próxima carga reconstrói tudo.
+    pasta = batches_dir(data_dir)
+    os.makedirs(pasta, exist_ok=True)
+    nome = os.path.splitext(os.path.basename(origem))[0]
+    arquivo = f"{len(manifest.get('batches', [])) + 1:04d}_{nome}.parquet"
+    path = os.path.join(pasta, arquivo)
+    lote.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+    # 2. Atualização incremental das tabelas afetadas
+    tabelas, mantidas = _apply_batch(tabelas, lote, data_dir)
+    alteradas = [n for n in tabelas if n != 'base_transacoes' and (n in mantidas or n in AGGREGATES)]
+    _write_tables(data_dir, {n: tabelas[n] for n in alteradas})
+
+    # 3. Manifesto por último
+    stat = os.stat(path)
+    registro = {"file": arquivo, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                "sha256": _file_sha256(path), "rows": len(lote)}
+    manifest.setdefault("batches", []).append(registro)
+    manifest["version"] = _chain_version(manifest["version"], registro)
+    manifest["tables"] = list(tabelas)
+    manifest["rows"] = {nome: len(df) for nome, df in tabelas.items()}
+    _write_manifest(data_dir, manifest)
+    return manifest
+
+
+def load_snapshot(data_dir=DATA_DIR, validate="mtime"):
+    """
+    Retorna os dataframes limpos (``df_main``, ``base_id``, ``base_transacoes``)
+    e as tabelas de ``AGGREGATES``, lendo o snapshot quando válido e
+    reconstruindo-o caso contrário. Agregados ausentes de um snapshot válido
+    ou de outra versão da definição são (re)calculados sem reler as fontes, e
+    a versão dos dados muda com eles. Sem ``pyarrow`` as
+    fontes são preparadas diretamente, sem persistência.
+    """
+    if pyarrow is None:
+        tabelas = prepare_frames(**read_sources(data_dir))
+        tabelas.update(build_aggregates(tabelas))
+        return tabelas
+
+    manifest = read_manifest(data_dir)
+    if not is_valid(manifest, data_dir, validate):
+        return build_snapshot(data_dir)
+
+    snap = snapshot_dir(data_dir)
+    vencidos = stale_aggregates(manifest)
+    tabelas = {nome: pd.read_parquet(os.path.join(snap, f"{nome}.parquet"))
+               for nome in TABLES + [a for a in AGGREGATES if a not in vencidos]
+               if nome != 'base_transacoes'}
+    tabelas['base_transacoes'] = _read_transactions(data_dir, manifest)
+    if vencidos:
+        novos = build_aggregates(tabelas, vencidos)
+        _write_tables(data_dir, novos)
+        tabelas.update(novos)
+        manifest["tables"] = list(tabelas)
+        manifest["aggregates"] = aggregate_versions()
+        manifest["version"] = _version_of(manifest["sources"], manifest.get("batches", []))
+        manifest["rows"] = {nome: len(df) for nome, df in tabelas.items()}
+        _write_manifest(data_dir, manifest)
+    return tabelas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera (pré-aquece) o snapshot colunar do dashboard.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    parser.add_argument("--hash", action="store_true", help="Valida o snapshot pelo hash do conteúdo das fontes")
+    parser.add_argument("--force", action="store_true", help="Reconstrói o snapshot mesmo se estiver válido")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if not args.force and is_valid(read_manifest(args.data_dir), args.data_dir, "hash" if args.hash else "mtime"):
+        print("Snapshot válido; nada a fazer.")
+    else:
+        build_snapshot(args.data_dir)
+        print(f"Snapshot gerado em {time.perf_counter() - inicio:.2f}s")
+
+    manifest = read_manifest(args.data_dir)
+    print(f"Versão: {manifest['version']}")
+    for nome, linhas in manifest["rows"].items():
+        print(f"  {nome}: {linhas:,} linhas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Sequências de fluxo de caixa negativo por empresa.
+
+A matriz densa empresa × mês de ``fluxo_caixa_liquido`` é analisada de uma vez
+com run-length em NumPy: para cada empresa calcula-se a maior sequência de
+meses consecutivos com fluxo negativo e a sequência atual (a que termina no
+último mês). A tabela resultante é gerada junto ao snapshot, e o ranking do
+dashboard passa a ser uma consulta mais um ``argpartition``.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics import periods
+
+
+def negative_runs(matriz):
+    """
+    Para cada linha de ``matriz`` (empresas × meses em ordem), retorna a maior
+    sequência de valores negativos e a sequência negativa final.
+    """
+    negativo = np.asarray(matriz) < 0
+    n, m = negativo.shape
+
+    borda = np.zeros((n, m + 2), dtype=np.int8)
+    borda[:, 1:-1] = negativo
+    degraus = np.diff(borda, axis=1)
+    linhas, inicios = np.nonzero(degraus == 1)
+    _, fins = np.nonzero(degraus == -1)
+    maior = np.zeros(n, dtype=np.int32)
+    np.maximum.at(maior, linhas, (fins - inicios).astype(np.int32))
+
+    nao_negativo = ~negativo
+    atual = np.argmax(nao_negativo[:, ::-1], axis=1).astype(np.int32)
+    atual[~nao_negativo.any(axis=1)] = m
+    return maior, atual
+
+
+def build_streak_table(df_main, meses=None):
+    """
+    Tabela por empresa com ``maior_sequencia_negativa`` e ``sequencia_negativa_atual``.
+    ``meses`` fixa as colunas da matriz (padrão: meses presentes no ``df_main``).
+    """
+    codigos = periods.month_codes(df_main['DT_REFE'])
+    if meses is None:
+        meses = codigos[codigos != periods.MISSING]
+    colunas = np.unique(meses)
+
+    # Coluna de cada linha; meses fora de ``colunas`` (ou ausentes) são descartados
+    posicoes = np.searchsorted(colunas, codigos)
+    validos = posicoes < len(colunas)
+    validos[validos] = colunas[posicoes[validos]] == codigos[validos]
+    empresas, ids = pd.factorize(df_main['id_empresa'], sort=True)
+
+    matriz = np.zeros((len(ids), len(colunas)), dtype=np.float64)
+    np.add.at(matriz, (empresas[validos], posicoes[validos]), df_main['fluxo_caixa_liquido'].to_numpy()[validos])
+
+    maior, atual = negative_runs(matriz)
+    return pd.DataFrame({
+        'id_empresa': np.asarray(ids),
+        'maior_sequencia_negativa': maior,
+        'sequencia_negativa_atual': atual,
+    })
+
+
+def update_streak_table(tabela, df_empresas, meses):
+    """Substitui na tabela as linhas das empresas presentes em ``df_empresas``."""
+    novas = build_streak_table(df_empresas, meses)
+    restantes = tabela[~tabela['id_empresa'].isin(df_empresas['id_empresa'].unique())]
+    return pd.concat([restantes, novas], ignore_index=True).sort_values('id_empresa', ignore_index=True)
+
+
+def rank_streaks(tabela, ids_empresas, top_n, coluna='maior_sequencia_negativa'):
+    """
+    Top ``top_n`` empresas de ``ids_empresas`` pela sequência negativa, em ordem
+    crescente para o gráfico horizontal (empates pela ordem do id).
+    """
+    posicoes = pd.Index(tabela['id_empresa']).get_indexer(ids_empresas)
+    posicoes = np.unique(posicoes[posicoes >= 0])
+    valores = tabela[coluna].to_numpy()[posicoes]
+
+    if len(posicoes) > top_n:
+        # Partição em O(N); empates no limiar ficam com os primeiros ids
+        limiar = np.partition(valores, len(valores) - top_n)[len(valores) - top_n]
+        acima = np.flatnonzero(valores > limiar)
+        empatadas = np.flatnonzero(valores == limiar)[:top_n - len(acima)]
+        escolhidas = np.concatenate([acima, empatadas])
+        posicoes, valores = posicoes[escolhidas], valores[escolhidas]
+    ordem = np.lexsort((posicoes, -valores))[::-1]
+    return pd.DataFrame({
+        'id_empresa': tabela['id_empresa'].to_numpy()[posicoes[ordem]],
+        'negative_cashflow_streak': valores[ordem],
+    })
@@ -0,0 +1,248 @@
+"""
+Gerador de bases sintéticas no formato das fontes do dashboard.
+
+Produz ``Base1_ID``, ``Base2_Transacoes``, ``dados_para_powerbi.csv`` e
+``dados_rede_para_powerbi.csv`` com as mesmas colunas das originais, em
+tamanhos configuráveis (de milhares a milhões de empresas). As transações são
+sorteadas sobre um conjunto fixo de relacionamentos pagador → recebedor cujos
+graus seguem uma lei de potência (poucas empresas concentram a maior parte
+das conexões), e são escritas em blocos, então o volume de transações não
+precisa caber na memória: só os acumuladores por par ficam em RAM.
+
+As planilhas são gravadas em ``.xlsx`` nas bases pequenas (a escrita e a
+leitura de Excel ficam inviáveis perto do limite de linhas) e em ``.parquet``
+(lido pelo snapshot no lugar da planilha) acima disso. As features, clusters, centralidades, exposições e comunidades dos CSVs saem dos
+módulos de ``analytics`` (o ajuste dos clusters requer ``scikit-learn``).
+
+Uso:
+    python -m analytics.synthetic bench_data/100k --empresas 100000 --transacoes 2000000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import centrality, clustering, community, exposure, features
+
+EXCEL_MAX_ROWS = 1_048_575
+XLSX_AUTO_ROWS = 200_000
+CHUNK_ROWS = 2_000_000
+MAX_COMMUNITY_NODES = 1_000_000
+CLUSTER_SAMPLE = 200_000
+
+SETORES = [
+    'Cultivo de soja', 'Criação de bovinos', 'Extração de minério de ferro', 'Fabricação de laticínios',
+    'Fabricação de automóveis', 'Fabricação de medicamentos', 'Geração de energia elétrica',
+    'Construção de edifícios', 'Comércio atacadista de alimentos', 'Comércio varejista de vestuário',
+    'Supermercados', 'Transporte rodoviário de carga', 'Transporte ferroviário de carga',
+    'Restaurantes', 'Hotéis', 'Desenvolvimento de software', 'Telecomunicações',
+    'Atividades de contabilidade', 'Produção cinematográfica', 'Atividades hospitalares',
+]
+TIPOS_TRANSACAO = {'PIX': 0.70, 'BOLETO': 0.15, 'TED': 0.10, 'SISTEMICO': 0.05}
+
+
+# --- Empresas e Relacionamentos ---
+def company_ids(n_empresas):
+    """Ids ``CNPJ_00001``... com largura fixa (mínimo de 5 dígitos, como a base original)."""
+    largura = max(5, len(str(n_empresas)))
+    return ('CNPJ_' + pd.Series(np.arange(1, n_empresas + 1)).astype(str).str.zfill(largura)).to_numpy(dtype=object)
+
+
+def _power_law(n, alpha, rng):
+    pesos = np.arange(1, n + 1, dtype=np.float64) ** -alpha
+    rng.shuffle(pesos)
+    return pesos / pesos.sum()
+
+
+def generate_relationships(n_empresas, n_pares, alpha, rng):
+    """Pares pagador → recebedor distintos, com graus de entrada e saída assimétricos."""
+    atividade_pagadores = _power_law(n_empresas, alpha, rng)
+    atividade_recebedores = _power_law(n_empresas, alpha, rng)
+    pagadores = rng.choice(n_empresas, size=n_pares, p=atividade_pagadores)
+    recebedores = rng.choice(n_empresas, size=n_pares, p=atividade_recebedores)
+    pares = np.unique(pagadores.astype(np.int64) * n_empresas + recebedores)
+    return pares // n_empresas, pares % n_empresas
+
+
+def month_ends(inicio, n_meses):
+    return pd.period_range(inicio, periods=n_meses, freq='M').to_timestamp(how='end').normalize()
+
+
+def base_id_months(ids, meses, rng):
+    """Blocos mensais de ``Base1_ID`` (uma linha por empresa e mês)."""
+    n = len(ids)
+    faturamento = rng.lognormal(13.0, 1.2, n)
+    saldo = rng.lognormal(11.5, 1.5, n)
+    abertura = pd.Timestamp('2025-01-01') - pd.to_timedelta(rng.integers(180, 365 * 40, n), unit='D')
+    setores = np.asarray(SETORES, dtype=object)[rng.integers(0, len(SETORES), n)]
+    for mes in meses:
+        yield pd.DataFrame({
+            'ID': ids,
+            'VL_FATU': (faturamento * rng.lognormal(0, 0.1, n)).astype(np.int64),
+            'VL_SLDO': (saldo * rng.normal(1.0, 0.3, n)).astype(np.int64),
+            'DT_ABRT': abertura,
+            'DS_CNAE': setores,
+            'DT_REFE': mes,
+        })
+
+
+def transaction_chunks(ids, pagadores, recebedores, n_transacoes, meses, alpha, rng, chunksize=CHUNK_ROWS):
+    """
+    Blocos de ``Base2_Transacoes``. Retorna um gerador de ``(bloco, pares)``,
+    onde ``pares`` é o índice do relacionamento de cada transação.
+    """
+    intensidade = _power_law(len(pagadores), alpha / 2, rng)
+    tipos, probabilidades = list(TIPOS_TRANSACAO), list(TIPOS_TRANSACAO.values())
+    inicio_mes = meses.to_period('M').to_timestamp()
+    dias = meses.day.to_numpy()
+    for inicio in range(0, n_transacoes, chunksize):
+        n = min(chunksize, n_transacoes - inicio)
+        pares = rng.choice(len(pagadores), size=n, p=intensidade)
+        mes = rng.integers(0, len(meses), n)
+        datas = inicio_mes[mes] + pd.to_timedelta(rng.integers(0, dias[mes]), unit='D')
+        bloco = pd.DataFrame({
+            'ID_PGTO': ids[pagadores[pares]],
+            'ID_RCBE': ids[recebedores[pares]],
+            'VL': np.maximum(rng.lognormal(8.5, 1.6, n), 1).astype(np.int64),
+            'DS_TRAN': np.asarray(tipos, dtype=object)[rng.choice(len(tipos), size=n, p=probabilidades)],
+            'DT_REFE': datas,
+        })
+        yield bloco, pares
+
+
+# --- Escrita ---
+class _SheetWriter:
+    """Grava uma planilha em ``.xlsx`` ou em Parquet (em blocos)."""
+
+    def __init__(self, path_sem_extensao, total_linhas, formato):
+        if formato == 'xlsx' and total_linhas > EXCEL_MAX_ROWS:
+            raise ValueError(f"{total_linhas:,} linhas não cabem em uma planilha do Excel.")
+        self.excel = formato == 'xlsx' or (formato == 'auto' and total_linhas <= XLSX_AUTO_ROWS)
+        self.path = path_sem_extensao + ('.xlsx' if self.excel else '.parquet')
+        self.blocos, self.escritor = [], None
+
+    def write(self, bloco):
+        if self.excel:
+            self.blocos.append(bloco)
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+        if self.escritor is None:
+            self.escritor = pq.ParquetWriter(self.path, tabela.schema)
+        self.escritor.write_table(tabela)
+
+    def close(self):
+        if self.excel:
+            pd.concat(self.blocos, ignore_index=True).to_excel(self.path, index=False)
+        elif self.escritor is not None:
+            self.escritor.close()
+        return self.path
+
+
+def _remove_stale(path):
+    """Apaga a variante de outra extensão para o snapshot não ler a fonte errada."""
+    base, extensao = os.path.splitext(path)
+    outro = base + ('.parquet' if extensao == '.xlsx' else '.xlsx')
+    if os.path.exists(outro):
+        os.remove(outro)
+
+
+def generate(out_dir, n_empresas=10_000, n_transacoes=100_000, n_meses=5, inicio='2025-01',
+             seed=0, alpha=1.1, pares_por_empresa=10, formato='auto', k_intermediacao=1000,
+             comunidades=None, chunksize=CHUNK_ROWS, log=print):
+    """
+    Gera as quatro fontes em ``out_dir``. ``comunidades=None`` roda o Louvain
+    só até ``MAX_COMMUNITY_NODES`` empresas (acima disso ``Grupo_Empresas = -1``).
+    Retorna os caminhos gravados.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    inicio_geracao = time.perf_counter()
+    ids = company_ids(n_empresas)
+    meses = month_ends(inicio, n_meses)
+
+    # Base1_ID
+    planilha = _SheetWriter(os.path.join(out_dir, 'Base1_ID'), n_empresas * n_meses, formato)
+    for i, bloco in enumerate(base_id_months(ids, meses, rng)):
+        planilha.write(bloco)
+        if i == 0:
+            info = bloco.set_index('ID')[['VL_FATU', 'DS_CNAE']]
+    caminhos = {'base_id': planilha.close()}
+    log(f"Base1_ID: {n_empresas * n_meses:,} linhas ({time.perf_counter() - inicio_geracao:.1f}s)")
+
+    # Base2_Transacoes (acumulando soma e contagem por relacionamento)
+    pagadores, recebedores = generate_relationships(n_empresas, n_empresas * pares_por_empresa, alpha, rng)
+    soma = np.zeros(len(pagadores))
+    contagem = np.zeros(len(pagadores), dtype=np.int64)
+    planilha = _SheetWriter(os.path.join(out_dir, 'Base2_Transacoes'), n_transacoes, formato)
+    for bloco, pares in transaction_chunks(ids, pagadores, recebedores, n_transacoes, meses, alpha, rng, chunksize):
+        planilha.write(bloco)
+        soma += np.bincount(pares, weights=bloco['VL'].to_numpy(), minlength=len(soma))
+        contagem += np.bincount(pares, minlength=len(contagem))
+    caminhos['base_transacoes'] = planilha.close()
+    log(f"Base2_Transacoes: {n_transacoes:,} linhas ({time.perf_counter() - inicio_geracao:.1f}s)")
+
+    usados = contagem > 0
+    arestas = pd.DataFrame({
+        'id_pagador': ids[pagadores[usados]],
+        'id_recebedor': ids[recebedores[usados]],
+        'valor_total': soma[usados],
+        'num_transacoes': contagem[usados],
+    })
+
+    # dados_para_powerbi.csv (features + faturamento + setor + cluster/momento)
+    df_empresas = features.company_features(arestas, ids)
+    df_empresas['faturamento'] = info['VL_FATU'].reindex(df_empresas.index).astype(np.float64)
+    df_empresas['setor_cnae'] = info['DS_CNAE'].reindex(df_empresas.index)
+    amostra = df_empresas.sample(min(len(df_empresas), CLUSTER_SAMPLE), random_state=seed)
+    modelo = clustering.fit_model(amostra)
+    classificacao = clustering.score(modelo, df_empresas)
+    df_empresas['cluster'] = classificacao['cluster']
+    export = df_empresas.assign(momento_empresa=classificacao['momento_empresa']).rename_axis('id_empresa').reset_index()
+    caminhos['df_powerbi'] = os.path.join(out_dir, 'dados_para_powerbi.csv')
+    export.to_csv(caminhos['df_powerbi'], index=False, sep=';', decimal=',')
+    log(f"dados_para_powerbi.csv ({time.perf_counter() - inicio_geracao:.1f}s)")
+
+    # dados_rede_para_powerbi.csv (centralidades + exposições + comunidades)
+    rede = centrality.network_metrics(arestas, k=min(k_intermediacao, n_empresas) or None, seed=42)
+    rede['Grupo_Empresas'] = -1
+    if comunidades or (comunidades is None and n_empresas <= MAX_COMMUNITY_NODES):
+        grupos = community.build_communities(arestas, peso=None).set_index('id_empresa')['comunidade']
+        rede['Grupo_Empresas'] = grupos.reindex(rede.index).to_numpy()
+    rede = rede.join(exposure.network_exposure(arestas, classificacao['momento_empresa']))
+    df_rede = df_empresas.join(rede, how='left')
+    df_rede['Grupo_Empresas'] = df_rede['Grupo_Empresas'].fillna(-1).astype(int)
+    caminhos['df_rede'] = os.path.join(out_dir, 'dados_rede_para_powerbi.csv')
+    df_rede.rename_axis('id_empresa').reset_index().to_csv(caminhos['df_rede'], index=False, sep=';', decimal=',')
+    log(f"dados_rede_para_powerbi.csv ({time.perf_counter() - inicio_geracao:.1f}s)")
+
+    for path in (caminhos['base_id'], caminhos['base_transacoes']):
+        _remove_stale(path)
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera uma base sintética no formato das fontes do dashboard.")
+    parser.add_argument("saida", help="Diretório de saída (ex.: bench_data/100k)")
+    parser.add_argument("--empresas", type=int, default=10_000, help="Número de empresas")
+    parser.add_argument("--transacoes", type=int, default=100_000, help="Número de transações")
+    parser.add_argument("--meses", type=int, default=5, help="Meses de referência")
+    parser.add_argument("--inicio", default="2025-01", help="Primeiro mês (AAAA-MM)")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador")
+    parser.add_argument("--alpha", type=float, default=1.1, help="Expoente da lei de potência dos graus")
+    parser.add_argument("--pares-por-empresa", type=int, default=10, help="Relacionamentos sorteados por empresa")
+    parser.add_argument("--formato", choices=["auto", "xlsx", "parquet"], default="auto", help="Formato das planilhas")
+    parser.add_argument("--k-intermediacao", type=int, default=1000, help="Fontes amostradas na intermediação (0 = todas)")
+    parser.add_argument("--sem-comunidades", action="store_true", help="Não roda o Louvain (Grupo_Empresas = -1)")
+    args = parser.parse_args(argv)
+
+    generate(args.saida, args.empresas, args.transacoes, args.meses, args.inicio, args.seed, args.alpha,
+             args.pares_por_empresa, args.formato, args.k_intermediacao,
+             comunidades=False if args.sem_comunidades else None)
+
+
+if __name__ == "__main__":
+    main()
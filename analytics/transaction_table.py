@@ -0,0 +1,113 @@
+"""
+Tabela paginada das transações de uma empresa.
+
+A partir do índice CSR (``analytics.adjacency``), ``CompanyTransactions`` guarda
+as posições em ``base_transacoes`` das transações da empresa e, alinhados a
+elas, valor, data, tipo (``DS_TRAN``) e contraparte. Ordenar por ``VL`` ou
+``DT_REFE``, filtrar por tipo e paginar são operações sobre esses vetores
+(O(grau), ordenações memorizadas por coluna e sentido); só a página visível
+é montada como DataFrame. Os resumos por contraparte e por tipo têm tamanho
+limitado (as ``top`` maiores contrapartes, uma linha "Demais" e o total), de
+modo que o que vai para o navegador não cresce com o grau da empresa.
+"""
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+TOP_COUNTERPARTIES = 10
+SORT_COLUMNS = ('VL', 'DT_REFE')
+
+
+class CompanyTransactions:
+    """Transações de ``empresa`` (pagadora ou recebedora) em ``base_transacoes``."""
+
+    def __init__(self, base_transacoes, indice, empresa):
+        self.empresa = empresa
+        self.empresas = indice.empresas
+        codigo = indice.code(empresa)
+        self.linhas = indice.rows(empresa)
+        self.pagou = indice.pagador[self.linhas] == codigo
+        self.contraparte = np.where(self.pagou, indice.recebedor[self.linhas], indice.pagador[self.linhas])
+        self.valores = {
+            'VL': indice.valor[self.linhas],
+            'DT_REFE': pd.DatetimeIndex(base_transacoes['DT_REFE'].take(self.linhas)).asi8,
+        }
+        if 'DS_TRAN' in base_transacoes.columns:
+            tipos = pd.Categorical(base_transacoes['DS_TRAN'].take(self.linhas))
+            self.tipo_codigos, self.tipos = tipos.codes, tipos.categories
+        else:
+            self.tipo_codigos, self.tipos = np.full(len(self.linhas), -1, dtype=np.int8), pd.Index([])
+        self._ordens = {}
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def types(self):
+        """Tipos de transação presentes, em ordem alfabética."""
+        return [self.tipos[c] for c in np.unique(self.tipo_codigos) if c >= 0]
+
+    def _mask(self, tipos):
+        if not tipos:
+            return None
+        codigos = [self.tipos.get_loc(t) for t in tipos if t in self.tipos]
+        return np.isin(self.tipo_codigos, codigos)
+
+    def _order(self, coluna, decrescente):
+        """Posições locais ordenadas por ``coluna`` (empates pela posição em ``base_transacoes``)."""
+        chave = (coluna, decrescente)
+        if chave not in self._ordens:
+            if coluna not in SORT_COLUMNS:
+                raise ValueError(f"Ordenação por {coluna!r} não suportada (use {', '.join(SORT_COLUMNS)})")
+            valores = self.valores[coluna]
+            self._ordens[chave] = np.lexsort((self.linhas, -valores if decrescente else valores))
+        return self._ordens[chave]
+
+    def count(self, tipos=None):
+        mascara = self._mask(tipos)
+        return len(self.linhas) if mascara is None else int(mascara.sum())
+
+    def page(self, pagina=0, tamanho=PAGE_SIZE, coluna='VL', decrescente=True, tipos=None):
+        """Posições em ``base_transacoes`` da página ``pagina`` (a partir de 0) na ordem pedida."""
+        ordem = self._order(coluna, decrescente)
+        mascara = self._mask(tipos)
+        if mascara is not None:
+            ordem = ordem[mascara[ordem]]
+        return self.linhas[ordem[pagina * tamanho:(pagina + 1) * tamanho]]
+
+    def by_counterparty(self, tipos=None, top=TOP_COUNTERPARTIES):
+        """Recebido, pago e nº de transações por contraparte: as ``top`` maiores, "Demais" e "Total"."""
+        mascara = self._mask(tipos)
+        contraparte, pagou, valor = self.contraparte, self.pagou, self.valores['VL']
+        if mascara is not None:
+            contraparte, pagou, valor = contraparte[mascara], pagou[mascara], valor[mascara]
+        codigos, inverso = np.unique(contraparte, return_inverse=True)
+        resumo = pd.DataFrame({
+            'contraparte': self.empresas[codigos].astype(str),
+            'recebido': np.bincount(inverso, weights=np.where(pagou, 0.0, valor), minlength=len(codigos)),
+            'pago': np.bincount(inverso, weights=np.where(pagou, valor, 0.0), minlength=len(codigos)),
+            'transacoes': np.bincount(inverso, minlength=len(codigos)),
+        })
+        resumo = resumo.iloc[np.lexsort((codigos, -(resumo['recebido'] + resumo['pago']).to_numpy()))]
+        linhas = [resumo.iloc[:top]]
+        if len(resumo) > top:
+            demais = resumo.iloc[top:]
+            linhas.append(pd.DataFrame([{'contraparte': f"Demais ({len(demais)} contrapartes)",
+                                         **demais[['recebido', 'pago', 'transacoes']].sum()}]))
+        linhas.append(pd.DataFrame([{'contraparte': "Total", **resumo[['recebido', 'pago', 'transacoes']].sum()}]))
+        return pd.concat(linhas, ignore_index=True).astype({'transacoes': 'int64'})
+
+    def by_type(self, tipos=None):
+        """Recebido, pago e nº de transações por tipo (``DS_TRAN``), com a linha "Total"."""
+        mascara = self._mask(tipos)
+        codigos, pagou, valor = self.tipo_codigos, self.pagou, self.valores['VL']
+        if mascara is not None:
+            codigos, pagou, valor = codigos[mascara], pagou[mascara], valor[mascara]
+        presentes, inverso = np.unique(codigos, return_inverse=True)
+        resumo = pd.DataFrame({
+            'tipo': [self.tipos[c] if c >= 0 else "(sem tipo)" for c in presentes],
+            'recebido': np.bincount(inverso, weights=np.where(pagou, 0.0, valor), minlength=len(presentes)),
+            'pago': np.bincount(inverso, weights=np.where(pagou, valor, 0.0), minlength=len(presentes)),
+            'transacoes': np.bincount(inverso, minlength=len(presentes)),
+        })
+        total = pd.DataFrame([{'tipo': "Total", **resumo[['recebido', 'pago', 'transacoes']].sum()}])
+        return pd.concat([resumo, total], ignore_index=True).astype({'transacoes': 'int64'})
@@ -0,0 +1,542 @@
+"""
+Visões das abas do dashboard e armazém de visões pré-calculadas.
+
+As abas de análise (Visão Geral e uma por momento) são descritas aqui, sem o
+Streamlit: ``tab_view`` devolve, para um estado dos filtros globais
+(``ViewContext``), a lista de elementos da aba (``Panel``, um gráfico com os
+dados agregados e a função que monta a figura; ``Message``, um aviso) e o
+``app.py`` só os desenha. Assim o mesmo cálculo serve ao dashboard e ao
+pré-cálculo em lote.
+
+O pré-cálculo enumera as visões mais abertas (cada aba × cada setor ou
+"Todos" × "Todos" os meses ou um único mês, momento global "Todos" e o Top N
+padrão), calcula-as num pool de processos e grava cada uma em
+``data/.visoes``: o JSON de cada figura (sem o template, que o dashboard
+reaplica ao carregar) e a tabela agregada de cada gráfico em Parquet. O
+manifesto registra a versão dos dados; com a mesma versão, o dashboard serve
+as figuras gravadas em vez de recalcular a aba. Rodar logo depois da
+atualização dos dados:
+
+    python -m analytics.snapshot && python -m analytics.views [--processos 4] [--top-n 10]
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from analytics import compact, figures, filters, periods, profiling, queries, resultcache, snapshot, streaks
+
+TOP_N = 10
+STORE_DIRNAME = ".visoes"
+FORMAT_VERSION = 2
+
+
+# --- Estado dos Filtros ---
+class ViewContext:
+    """
+    Tabelas e filtros globais de uma execução (``None`` = "Todos"). ``todos_meses``
+    indica "Todos" no filtro de mês (as séries da Visão Geral ignoram então os
+    filtros). As séries mensais, rankings de setores, mix de transações e
+    variações entre meses são executados por ``backend`` (``analytics.queries``;
+    padrão: pandas sobre ``tabelas``). Com ``cache``, os agregados saem de um
+    ``ResultCache`` chaveado pelos filtros normalizados; ``perfil`` mede as etapas.
+    """
+
+    def __init__(self, tabelas, motor, setor=None, momento=None, meses=None, todos_meses=None,
+                 cache=None, versao=None, perfil=None, backend=None):
+        self.tabelas = tabelas
+        self.motor = motor
+        self.backend = backend or queries.PandasBackend(tabelas, motor)
+        self.setor = setor
+        self.momento = momento
+        self.meses = meses
+        self.todos_meses = meses is None if todos_meses is None else todos_meses
+        self.cache = cache
+        self.versao = versao
+        self.perfil = perfil or profiling.Profiler()
+
+    def result(self, nome, calcular, *parametros):
+        """Resultado de ``calcular()`` para estes filtros (e ``parametros``), pelo cache se houver."""
+        if self.cache is None:
+            return calcular()
+        chave = resultcache.make_key(nome, *parametros, setor=self.setor, momento=self.momento, meses=self.meses)
+        return self.cache.get_or_compute(chave, calcular, self.versao)
+
+    def companies(self, momento_aba=None):
+        """Empresas filtradas, restritas ao momento da aba (vazio se o filtro global for outro momento)."""
+        with self.perfil.stage("empresas_da_aba", self.tabelas['df_main']) as etapa:
+            if momento_aba is None:
+                return etapa.output(self.motor.companies(self.setor, self.momento, self.meses))
+            if self.momento not in (None, momento_aba):
+                return etapa.output(self.tabelas['df_main'].iloc[0:0])
+            return etapa.output(self.motor.companies(self.setor, momento_aba, self.meses))
+
+    def transaction_count(self):
+        """Número de transações nos meses filtrados, pelas posições do motor (sem copiar linhas)."""
+        linhas = self.motor.transaction_rows(self.meses)
+        return len(self.motor.base_transacoes) if linhas is None else len(linhas)
+
+    def _monthly(self, momento_aba, ignorar_filtros):
+        if ignorar_filtros:
+            return queries.monthly_series(self.backend)
+        if momento_aba is not None and self.momento not in (None, momento_aba):
+            return queries.monthly_series(self.backend, momento=momento_aba).iloc[0:0]
+        return queries.monthly_series(self.backend, self.setor, momento_aba or self.momento, self.meses)
+
+    def query(self, nome, top_n, momento_aba=None):
+        """Agregação ``nome`` de ``queries.AGGREGATIONS`` com os filtros globais e o momento da aba."""
+        return self.result(nome, lambda: queries.AGGREGATIONS[nome](self.backend, top_n, self.setor,
+                                                                    momento_aba or self.momento, self.meses),
+                           momento_aba, top_n)
+
+    def monthly(self, momento_aba=None, ignorar_filtros=False):
+        """Série mensal do cubo com os filtros globais e, opcionalmente, o momento da aba."""
+        with self.perfil.stage("serie_mensal", momento_aba) as etapa:
+            return etapa.output(self.result("serie_mensal", lambda: self._monthly(momento_aba, ignorar_filtros),
+                                            momento_aba, ignorar_filtros))
+
+
+# --- Elementos de uma Aba ---
+class Panel:
+    """Gráfico ``construir(dados, *parametros)`` na coluna ``coluna`` (0 ou 1) da aba."""
+
+    def __init__(self, nome, coluna, construir, dados, *parametros, key=None):
+        self.nome = nome
+        self.coluna = coluna
+        self.construir = construir
+        self.dados = dados
+        self.parametros = parametros
+        self.key = key
+
+    def figure(self):
+        return self.construir(self.dados, *self.parametros)
+
+
+class Message:
+    """Aviso (``nivel``: ``info`` ou ``warning``) na coluna ``coluna`` ou, com ``None``, acima delas."""
+
+    def __init__(self, nivel, texto, coluna=None):
+        self.nivel = nivel
+        self.texto = texto
+        self.coluna = coluna
+
+
+# --- Figuras ---
+def plot_empresas_por_momento(data):
+    return figures.bars(data['momento_empresa'], {'clientes': data['clientes']}, "Empresas por Momento",
+                        "Nº de Empresas", "Momento da Empresa", horizontal=True, texttemplate='%{text}')
+
+
+def plot_recebido_vs_pago_mes(data):
+    return figures.bars(data['MesAno'], {'Total Recebido': data['total_recebido'], 'Total Pago': data['total_pago']},
+                        "Recebido vs Pago por Mês", "Mês/Ano", "Valor (R$)")
+
+
+def plot_fluxo_caixa_linha(data):
+    return figures.line(data['MesAno'], {'fluxo_caixa_liquido': data['fluxo_caixa_liquido']},
+                        "Fluxo de Caixa (Linha)", "Mês/Ano", "Fluxo de Caixa (R$)")
+
+
+def plot_top_setores_recebido(data, top_n):
+    return figures.bars(data['setor_cnae'], {'total_recebido': data['total_recebido']}, f"Top {top_n} Setores por Recebido",
+                        "Total Recebido (R$)", "Setor", horizontal=True, texttemplate='%{text:,.2s}')
+
+
+def plot_top_setores_empresas(data, top_n):
+    return figures.bars(data['setor_cnae'], {'clientes': data['clientes']}, f"Top {top_n} Setores com mais empresas (Início)",
+                        'clientes', 'setor_cnae', horizontal=True)
+
+
+def plot_ranking_empresas(data, coluna, titulo, ticksuffix=None, hover=()):
+    return figures.bars(data['id_empresa'], {coluna: data[coluna]}, titulo, coluna, 'id_empresa',
+                        horizontal=True, ticksuffix=ticksuffix, hover={c: data[c] for c in hover} or None)
+
+
+def plot_linha_mensal(data, coluna, titulo, ticksuffix=None):
+    return figures.line(data['MesAno'], {coluna: data[coluna]}, titulo, 'MesAno', coluna, ticksuffix=ticksuffix)
+
+
+def plot_barras_mensais(data, series, titulo, yaxis_title):
+    return figures.bars(data['MesAno'], {nome: data[coluna] for nome, coluna in series}, titulo, "Mês/Ano", yaxis_title)
+
+
+def plot_mix_transacoes(data):
+    return figures.donut(data['DS_TRAN'], data['VL'], "Mix por Tipo de Transação")
+
+
+def plot_queda_setores(data):
+    ultimo_mes = data.columns[-2]
+    return figures.bars(data['setor_cnae'], {ultimo_mes: data[ultimo_mes]}, "Setores com maior queda de fluxo",
+                        'setor_cnae', ultimo_mes, hover={'delta': data['delta']})
+
+
+def plot_sequencias_negativas(data, top_n):
+    return figures.lollipop(data['id_empresa'], data['negative_cashflow_streak'],
+                            f"Top {top_n} Empresas por Sequência de Fluxo de Caixa Negativo",
+                            "Meses Consecutivos com Fluxo de Caixa Negativo", "Empresa")
+
+
+# --- Agregados e Rankings das Abas ---
+def empresas_por_momento(df):
+    data = df['momento_empresa'].value_counts().loc[lambda c: c > 0].reset_index()
+    data.columns = ['momento_empresa', 'clientes']
+    return data
+
+
+def top_setores_empresas(df, top_n):
+    data = df['setor_cnae'].value_counts().loc[lambda c: c > 0].nlargest(top_n).sort_values(ascending=True).reset_index()
+    data.columns = ['setor_cnae', 'clientes']
+    return data
+
+
+def top_empresas_recebido(df, top_n):
+    return df.groupby('id_empresa', observed=True)['total_recebido'].sum().nlargest(top_n).sort_values(ascending=True).reset_index()
+
+
+# --- Abas ---
+def _sem_dados(momento):
+    rotulo = momento.capitalize()
+    return [Message("warning", f"Nenhum dado disponível para empresas em '{rotulo}' com os filtros selecionados.")]
+
+
+def visao_geral(ctx, top_n):
+    serie = ctx.monthly(ignorar_filtros=ctx.todos_meses)
+    df_filtrado = ctx.companies()
+    data_top_setores = ctx.query("top_setores_recebido", top_n)
+    return [
+        Panel("plot_empresas_por_momento", 0, plot_empresas_por_momento,
+              ctx.result("empresas_por_momento", lambda: empresas_por_momento(df_filtrado))),
+        Panel("plot_fluxo_caixa_linha", 0, plot_fluxo_caixa_linha, serie, key="fluxo_caixa_geral"),
+        Panel("plot_recebido_vs_pago_mes", 1, plot_recebido_vs_pago_mes, serie, key="recebido_pago_geral"),
+        Panel("plot_top_setores_recebido", 1, plot_top_setores_recebido, data_top_setores, top_n, key="top_setores_geral"),
+    ]
+
+
+def inicio(ctx, top_n):
+    df_inicio = ctx.companies('INÍCIO')
+    if df_inicio.empty:
+        return _sem_dados('INÍCIO')
+    serie = ctx.monthly('INÍCIO')
+    with ctx.perfil.stage("inicio_top_setores", df_inicio):
+        data_setores = ctx.result("top_setores_empresas", lambda: top_setores_empresas(df_inicio, top_n), 'INÍCIO', top_n)
+    with ctx.perfil.stage("inicio_top_empresas", df_inicio):
+        data_top_empresas = ctx.result("top_empresas_recebido", lambda: top_empresas_recebido(df_inicio, top_n), 'INÍCIO', top_n)
+    return [
+        Panel("fig_inicio_top_setores", 0, plot_top_setores_empresas, data_setores, top_n),
+        Panel("plot_fluxo_caixa_linha", 0, plot_fluxo_caixa_linha, serie, key="fluxo_caixa_inicio"),
+        Panel("plot_recebido_vs_pago_mes", 1, plot_recebido_vs_pago_mes, serie, key="recebido_pago_inicio"),
+        Panel("fig_inicio_top_empresas", 1, plot_ranking_empresas, data_top_empresas, 'total_recebido',
+              f"Top {top_n} Empresas por Recebido (Início)"),
+    ]
+
+
+def maturidade(ctx, top_n):
+    df_maturidade = ctx.companies('MATURIDADE')
+    if df_maturidade.empty:
+        return _sem_dados('MATURIDADE')
+    elementos = []
+    if ctx.transaction_count():
+        with ctx.perfil.stage("maturidade_mix_transacoes") as etapa:
+            data_mix = etapa.output(ctx.query("mix_transacoes", None, 'MATURIDADE'))
+        elementos.append(Panel("fig_maturidade_mix", 0, plot_mix_transacoes, data_mix))
+
+    serie = ctx.monthly('MATURIDADE')
+    with ctx.perfil.stage("maturidade_razao_fluxo", serie):
+        data_razao = serie[['MesAno', 'total_recebido', 'total_pago']].copy()
+        data_razao['razao_receb_pago'] = data_razao['total_recebido'] / data_razao['total_pago'].replace(0, np.nan)
+    data_top_setores = ctx.query("top_setores_recebido", top_n, 'MATURIDADE')
+    series_ticket = (('Ticket Médio Recebido', 'ticket_medio_recebido'), ('Ticket Médio Pago', 'ticket_medio_pago'))
+    return elementos + [
+        Panel("fig_maturidade_razao", 0, plot_linha_mensal, data_razao, 'razao_receb_pago',
+              "Estabilidade do Fluxo (Razão Receb/Pago)"),
+        Panel("fig_maturidade_ticket", 1, plot_barras_mensais, serie[['MesAno', 'ticket_medio_recebido', 'ticket_medio_pago']],
+              series_ticket, "Ticket Médio (Recebido x Pago)", "Valor (R$)"),
+        Panel("plot_top_setores_recebido", 1, plot_top_setores_recebido, data_top_setores, top_n, key="top_setores_maturidade"),
+    ]
+
+
+def expansao(ctx, top_n):
+    df_expansao = ctx.companies('EXPANSÃO')
+    if df_expansao.empty:
+        return _sem_dados('EXPANSÃO')
+    serie = ctx.monthly('EXPANSÃO')
+    # Crescimento M/M e ranking do mês: fatias do painel de crescimento (analytics.growth)
+    with ctx.perfil.stage("expansao_crescimento_fluxo"):
+        fluxo_mes = ctx.query("crescimento_mensal", None, 'EXPANSÃO')[['MesAno', 'crescimento_mm_fluxo']]
+    elementos = [Panel("fig_expansao_crescimento", 0, plot_linha_mensal, fluxo_mes, 'crescimento_mm_fluxo',
+                       "Crescimento % M/M do Fluxo", "%")]
+
+    # Top N empresas que mais cresceram no último mês selecionado (com "Todos", o último mês)
+    with ctx.perfil.stage("expansao_top_crescimento", df_expansao):
+        crescimento = ctx.query("top_crescimento_empresas", top_n, 'EXPANSÃO')
+    mes = f" ({crescimento['MesAno'].iloc[0]})" if len(crescimento) else ""
+    elementos.append(Panel("fig_expansao_top_crescimento", 0, plot_ranking_empresas, crescimento, 'crescimento_mm_fluxo',
+                           f"Top {top_n} Empresas que mais cresceram no mês{mes}", "%",
+                           ('crescimento_3m_fluxo', 'crescimento_janela_fluxo')))
+
+    series_volume = (('Transações Recebidas', 'num_transacoes_recebidas'), ('Transações Pagas', 'num_transacoes_pagas'))
+    elementos.append(Panel("fig_expansao_volume", 1, plot_barras_mensais,
+                           serie[['MesAno', 'num_transacoes_recebidas', 'num_transacoes_pagas']],
+                           series_volume, "Volume de Transações", "Número de Transações"))
+    return elementos
+
+
+def declinio(ctx, top_n):
+    df_declinio = ctx.companies('DECLÍNIO')
+    if df_declinio.empty:
+        return _sem_dados('DECLÍNIO')
+    with ctx.perfil.stage("declinio_variacao_3m"):
+        fluxo_mes = ctx.query("crescimento_mensal", None, 'DECLÍNIO')[['MesAno', 'variacao_3m_fluxo']]
+    elementos = [Panel("fig_declinio_variacao_3m", 0, plot_linha_mensal, fluxo_mes, 'variacao_3m_fluxo',
+                       "Variação % 3M do Fluxo", "%")]
+
+    # Setores com maior queda de fluxo no último mês selecionado (com "Todos", o último mês)
+    with ctx.perfil.stage("declinio_queda_setores", df_declinio):
+        data_queda = ctx.query("queda_setores", top_n, 'DECLÍNIO')
+    if data_queda is not None:
+        elementos.append(Panel("fig_declinio_queda_setores", 0, plot_queda_setores, data_queda))
+
+    # Top N empresas por sequência de fluxo de caixa negativo (tabela pré-calculada no snapshot)
+    with ctx.perfil.stage("declinio_sequencias_negativas", df_declinio) as etapa:
+        data_streaks = etapa.output(ctx.result(
+            "ranking_sequencias_negativas",
+            lambda: streaks.rank_streaks(ctx.tabelas['sequencias_negativas'], df_declinio['id_empresa'].unique(), top_n),
+            'DECLÍNIO', top_n))
+    elementos.append(Panel("fig_declinio_sequencias_negativas", 1, plot_sequencias_negativas, data_streaks, top_n))
+    return elementos
+
+
+# aba -> (título, função que monta os elementos)
+TABS = {
+    "Visão Geral": ("Visão Geral do Ecossistema", visao_geral),
+    "Início": ("Análise de Empresas em Início", inicio),
+    "Maturidade": ("Análise de Empresas em Maturidade", maturidade),
+    "Expansão": ("Análise de Empresas em Expansão", expansao),
+    "Declínio": ("Análise de Empresas em Declínio", declinio),
+}
+
+
+def tab_view(ctx, aba, top_n=TOP_N):
+    """Elementos (``Panel``/``Message``) da aba ``aba`` para os filtros de ``ctx``."""
+    return TABS[aba][1](ctx, top_n)
+
+
+# --- Armazém de Visões Pré-calculadas ---
+def store_dir(data_dir=snapshot.DATA_DIR):
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def view_key(aba, setor=None, momento=None, meses=None, todos_meses=None, top_n=TOP_N):
+    """Identificador (hash) de uma visão: aba, filtros normalizados e Top N."""
+    meses = None if meses is None else sorted(int(m) for m in meses)
+    todos_meses = meses is None if todos_meses is None else bool(todos_meses)
+    texto = json.dumps([aba, setor, momento, meses, todos_meses, int(top_n)], ensure_ascii=False)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def store_stamp(data_dir=snapshot.DATA_DIR):
+    """``mtime_ns`` do manifesto do armazém (``None`` se não houver): muda a cada pré-cálculo."""
+    try:
+        return os.stat(os.path.join(store_dir(data_dir), snapshot.MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class StoredPanel:
+    """Gráfico de uma visão gravada: a figura pronta e os bytes do seu JSON."""
+
+    def __init__(self, nome, coluna, figura, json_bytes, key=None):
+        self.nome = nome
+        self.coluna = coluna
+        self.figura = figura
+        self.json_bytes = json_bytes
+        self.key = key
+
+
+class StoredView:
+    def __init__(self, elementos):
+        self.elementos = elementos
+
+    def __sizeof__(self):
+        return sum(getattr(e, 'json_bytes', 0) for e in self.elementos)
+
+
+class ViewStore:
+    """Visões gravadas por ``precompute`` para uma versão dos dados."""
+
+    def __init__(self, pasta, manifest):
+        self.pasta = pasta
+        self.manifest = manifest
+        self.visoes = manifest.get("views", {})
+
+    @classmethod
+    def open(cls, data_dir=snapshot.DATA_DIR, versao=None):
+        """Armazém gravado para ``versao`` (``None`` se não houver ou se for de outra versão dos dados)."""
+        try:
+            with open(os.path.join(store_dir(data_dir), snapshot.MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format") != FORMAT_VERSION or (versao is not None and manifest.get("version") != versao):
+            return None
+        return cls(os.path.join(store_dir(data_dir), manifest["dir"]), manifest)
+
+    def __contains__(self, chave):
+        return chave in self.visoes
+
+    def load(self, chave):
+        """Elementos da visão ``chave`` (``None`` se ela não foi gravada ou foi removida)."""
+        if chave not in self.visoes:
+            return None
+        try:
+            with open(os.path.join(self.pasta, chave, "view.json"), encoding='utf-8') as f:
+                visao = json.load(f)
+        except (OSError, ValueError):
+            return None
+        elementos = []
+        for e in visao["elements"]:
+            if e["type"] == "message":
+                elementos.append(Message(e["level"], e["text"], e["column"]))
+            else:
+                # go.Figure reaplica o template padrão do processo (o tema do Streamlit no dashboard)
+                figura = go.Figure(e["figure"], skip_invalid=True)
+                elementos.append(StoredPanel(e["name"], e["column"], figura, e["json_bytes"], e.get("key")))
+        return StoredView(elementos)
+
+
+def write_view(pasta, elementos):
+    """Grava os elementos de uma visão em ``pasta``: ``view.json`` com as figuras e um Parquet por gráfico."""
+    os.makedirs(pasta, exist_ok=True)
+    registros = []
+    for elemento in elementos:
+        if isinstance(elemento, Message):
+            registros.append({"type": "message", "level": elemento.nivel, "text": elemento.texto,
+                              "column": elemento.coluna})
+            continue
+        figura = elemento.figure().to_dict()
+        figura.get("layout", {}).pop("template", None)
+        texto = pio.to_json(figura, validate=False)
+        dados = elemento.dados
+        if isinstance(dados, pd.DataFrame):
+            tabela = dados.copy()
+            tabela.columns = [str(c) for c in tabela.columns]
+            tabela.to_parquet(os.path.join(pasta, f"{elemento.nome}.parquet"), index=False)
+        registros.append({"type": "panel", "name": elemento.nome, "column": elemento.coluna, "key": elemento.key,
+                          "json_bytes": len(texto), "figure": json.loads(texto)})
+    with open(os.path.join(pasta, "view.json"), "w", encoding='utf-8') as f:
+        json.dump({"elements": registros}, f, ensure_ascii=False, separators=(',', ':'))
+
+
+# --- Pré-cálculo em Lote ---
+def load_tables(data_dir=snapshot.DATA_DIR):
+    """Tabelas do snapshot na representação compacta usada pelo dashboard."""
+    tabelas, _ = compact.compact_tables(snapshot.load_snapshot(data_dir))
+    return tabelas
+
+
+def canned_views(tabelas, abas=None):
+    """Combinações (setor, meses) pré-calculadas: cada setor ou "Todos" × "Todos" ou cada mês com dados."""
+    setores = [None] + sorted(tabelas['df_main']['setor_cnae'].dropna().unique().tolist())
+    codigos = np.unique(np.concatenate([periods.month_codes(tabelas['df_main']['DT_REFE']),
+                                        periods.month_codes(tabelas['base_transacoes']['DT_REFE'])]))
+    meses = [None] + [(int(c),) for c in codigos if c != periods.MISSING]
+    return [(setor, mes) for setor in setores for mes in meses]
+
+
+_estado = {}
+
+
+def _init_worker(data_dir):
+    tabelas = load_tables(data_dir)
+    _estado['tabelas'] = tabelas
+    _estado['motor'] = filters.FilterEngine(tabelas['df_main'], tabelas['base_transacoes'])
+    _estado['backend'] = queries.backend(tabelas=tabelas, motor=_estado['motor'], data_dir=data_dir)
+
+
+def _compute(pasta, setor, meses, abas, tops):
+    """Calcula e grava as abas de um estado de filtros; devolve as entradas do manifesto."""
+    ctx = ViewContext(_estado['tabelas'], _estado['motor'], setor, None,
+                      None if meses is None else np.asarray(meses, dtype=np.int32), backend=_estado['backend'])
+    entradas = {}
+    for top_n in tops:
+        for aba in abas:
+            chave = view_key(aba, setor, None, meses, None, top_n)
+            write_view(os.path.join(pasta, chave), tab_view(ctx, aba, top_n))
+            entradas[chave] = {"tab": aba, "setor": setor,
+                               "mes": None if meses is None else periods.month_labels(meses)[0], "top_n": top_n}
+    return entradas
+
+
+def precompute(data_dir=snapshot.DATA_DIR, processos=None, tops=(TOP_N,), abas=None):
+    """
+    Calcula as visões de ``canned_views`` num pool de processos e publica um
+    novo armazém: as visões vão para uma pasta nova, o manifesto é trocado por
+    último (de forma atômica) e as pastas anteriores são removidas.
+    """
+    inicio = time.perf_counter()
+    abas = list(abas or TABS)
+    tabelas = snapshot.load_snapshot(data_dir)  # reconstrói o snapshot se as fontes mudaram
+    versao = snapshot.current_version(data_dir)
+    combinacoes = canned_views(tabelas)
+    del tabelas
+
+    raiz = store_dir(data_dir)
+    nome = f"{versao}-{time.strftime('%Y%m%d%H%M%S')}"
+    pasta = os.path.join(raiz, nome)
+    os.makedirs(pasta, exist_ok=True)
+    visoes = {}
+    try:
+        with concurrent.futures.ProcessPoolExecutor(processos, initializer=_init_worker, initargs=(data_dir,)) as pool:
+            tarefas = [pool.submit(_compute, pasta, setor, meses, abas, tuple(tops)) for setor, meses in combinacoes]
+            for tarefa in concurrent.futures.as_completed(tarefas):
+                visoes.update(tarefa.result())
+    except BaseException:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": versao,
+        "dir": nome,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - inicio, 3),
+        "top_n": list(tops),
+        "views": visoes,
+    }
+    path = os.path.join(raiz, snapshot.MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    for antiga in os.listdir(raiz):
+        if antiga != nome and os.path.isdir(os.path.join(raiz, antiga)):
+            shutil.rmtree(os.path.join(raiz, antiga), ignore_errors=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula as visões mais abertas das abas do dashboard.")
+    parser.add_argument("--data-dir", default=snapshot.DATA_DIR, help="Diretório com as fontes (padrão: data)")
+    parser.add_argument("--processos", type=int, default=None, help="Processos do pool (padrão: nº de CPUs)")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[TOP_N], help="Valores de Top N pré-calculados")
+    parser.add_argument("--abas", nargs="+", default=None, choices=list(TABS), help="Abas (padrão: todas)")
+    args = parser.parse_args(argv)
+
+    manifest = precompute(args.data_dir, args.processos, args.top_n, args.abas)
+    pasta = os.path.join(store_dir(args.data_dir), manifest["dir"])
+    tamanho = sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, arquivos in os.walk(pasta) for f in arquivos)
+    print(f"{len(manifest['views'])} visões em {manifest['build_seconds']:.1f}s "
+          f"({tamanho / 2 ** 20:.1f} MB em {pasta}, versão {manifest['version']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
-
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from pyvis.network import Network
-import openpyxl
 from datetime import datetime
 import calendar
+import functools
+import json
 import os
+import time
+import uuid
+
+from analytics import (adjacency, community, compact, cube, export, exposure, figures, filters, network, periods,
+                       profiling, queries, resultcache, search, snapshot, transaction_table, views)
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -71,68 +73,85 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- Perfil de Desempenho (opcional) ---
+# Ligado pelo painel "Perfil de desempenho" da sidebar ou por DASHBOARD_PROFILE=1.
+# Desligado, perfil.stage() devolve um contexto nulo e perfil.wrap() a própria função.
+# O profiler é um só por sessão: as reexecuções dos fragmentos usam as funções medidas
+# definidas na última execução completa e abrem nele o seu próprio registro.
+if 'perfil_sessao' not in st.session_state:
+    st.session_state.perfil_sessao = uuid.uuid4().hex[:12]
+    st.session_state.perfil_execucoes = 0
+    st.session_state.perfil_historico = []
+    st.session_state.perfil = profiling.Profiler()
+st.session_state.perfil_execucoes += 1
+
+perfil_ganchos = []
+perfil_gancho_pendente = st.session_state.pop("perfil_gancho", None)
+if perfil_gancho_pendente == "cprofile":
+    perfil_ganchos.append(profiling.CProfileHook(os.path.join(profiling.PROFILE_DIR, "ultima_execucao.prof")))
+elif perfil_gancho_pendente == "amostragem":
+    try:
+        perfil_ganchos.append(profiling.SamplingHook(os.path.join(profiling.PROFILE_DIR, "ultima_execucao.html")))
+    except ImportError as e:
+        st.sidebar.warning(str(e))
+
+perfil = st.session_state.perfil.configure(
+    enabled=st.session_state.get("perfil_ativo", os.environ.get("DASHBOARD_PROFILE") == "1") or bool(perfil_ganchos),
+    memoria=st.session_state.get("perfil_memoria", False),
+    ganchos=perfil_ganchos,
+).start({
+    "session": st.session_state.perfil_sessao,
+    "rerun": st.session_state.perfil_execucoes,
+    "scope": "script",
+    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+})
+
+def registrar_execucao():
+    """Guarda o registro da execução no histórico da sessão (e no JSONL, se pedido) e o devolve."""
+    registro = perfil.record()
+    st.session_state.perfil_historico = (st.session_state.perfil_historico + [registro])[-50:]
+    if st.session_state.get("perfil_gravar", False):
+        perfil.append_jsonl()
+    return registro
+
+def fragmento(funcao):
+    """
+    ``st.fragment`` medido: quando um widget do fragmento muda, só ele é
+    reexecutado, com um registro próprio no perfil (``scope: fragment``) e uma
+    legenda com as etapas que a interação reexecutou.
+    """
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        if perfil.running:  # dentro da execução completa do script (ou de outro fragmento)
+            return funcao(*args, **kwargs)
+        st.session_state.perfil_execucoes += 1
+        perfil.configure(perfil.enabled, perfil.memoria)  # ganchos valem só para a execução completa
+        contexto = {**perfil.contexto, "rerun": st.session_state.perfil_execucoes, "scope": "fragment",
+                    "fragment": funcao.__name__, "active_tab": st.session_state.get("active_tab"),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with profiling.profiled_run(perfil, contexto):
+            funcao(*args, **kwargs)
+        if perfil.enabled:
+            registro = registrar_execucao()
+            st.caption(f"Esta interação reexecutou {registro['n_stages']} etapas "
+                       f"(fragmento {funcao.__name__}) em {registro['total_seconds']:.3f}s")
+    return st.fragment(executar)
+
 # --- Carregamento e Cache dos Dados ---
 @st.cache_data
-def load_data():
+def load_data(versao=None):
     """
     Carrega, limpa, padroniza, mescla e prepara todos os dataframes para o dashboard.
-    Versão final baseada no diagnóstico de colunas.
+    As etapas de limpeza ficam em analytics.snapshot, que guarda o resultado em
+    Parquet e só relê as planilhas quando alguma fonte muda. ``versao`` (do
+    manifesto) entra na chave do cache: um lote ingerido recarrega os dados.
     """
     try:
-        # 1. Leitura dos arquivos
-        base_id = pd.read_excel("data/Base1_ID.xlsx")
-        base_transacoes = pd.read_excel("data/Base2_Transacoes.xlsx")
-        df_powerbi = pd.read_csv("data/dados_para_powerbi.csv", sep=';', encoding='utf-8-sig', decimal=',')
-        df_rede = pd.read_csv("data/dados_rede_para_powerbi.csv", sep=';', encoding='utf-8-sig', decimal=',')
-
-        # 2. Padronização de Nomes de Colunas
-        for df in [base_id, base_transacoes, df_powerbi, df_rede]:
-            df.columns = df.columns.str.strip()
-
-        for df in [base_id, df_powerbi, df_rede]:
-            if 'ID' in df.columns:
-                df.rename(columns={'ID': 'id_empresa'}, inplace=True)
-
-        # 3. Merge Estratégico e Definitivo
-        df_main = df_powerbi
-
-        if 'id_empresa' in base_id.columns:
-            date_cols_to_add = ['id_empresa']
-            if 'DT_REFE' in base_id.columns: date_cols_to_add.append('DT_REFE')
-            if 'DT_ABRT' in base_id.columns: date_cols_to_add.append('DT_ABRT')
-            df_main = pd.merge(df_main, base_id[date_cols_to_add], on='id_empresa', how='left')
-
-        if 'id_empresa' in df_rede.columns:
-            network_cols_to_add = ['id_empresa', 'Centralidade_de_Conexoes', 'Centralidade_de_Recebimentos', 'Centralidade_de_Pagamentos', 'Centralidade_de_Ponte', 'Grupo_Empresas']
-            valid_network_cols = [col for col in network_cols_to_add if col in df_rede.columns]
-            df_main = pd.merge(df_main, df_rede[valid_network_cols], on='id_empresa', how='left')
-
-        # 4. Limpeza e Conversão de Tipos
-        for col in ['DT_ABRT', 'DT_REFE']:
-            if col in df_main.columns:
-                df_main[col] = pd.to_datetime(df_main[col], errors='coerce')
-        
-        for col in ['setor_cnae', 'momento_empresa']:
-            if col in df_main.columns:
-                df_main[col] = df_main[col].fillna('N/A').astype(str).str.strip().str.upper()
-
-        if 'DS_TRAN' in base_transacoes.columns:
-            base_transacoes['DS_TRAN'] = base_transacoes['DS_TRAN'].fillna('N/A').astype(str).str.strip().str.upper()
-
-        # Conversão de colunas numéricas
-        numeric_cols = [
-            'total_recebido', 'num_transacoes_recebidas', 'num_clientes_unicos',
-            'total_pago', 'num_transacoes_pagas', 'num_fornecedores_unicos',
-            'fluxo_caixa_liquido', 'ticket_medio_recebido', 'ticket_medio_pago',
-            'faturamento', 'Centralidade_de_Conexoes', 'Centralidade_de_Recebimentos',
-            'Centralidade_de_Pagamentos', 'Centralidade_de_Ponte'
-        ]
-        for col in numeric_cols:
-            if col in df_main.columns:
-                df_main[col] = pd.to_numeric(df_main[col], errors='coerce').fillna(0)
-
-        if 'VL' in base_transacoes.columns:
-            base_transacoes['VL'] = pd.to_numeric(base_transacoes['VL'], errors='coerce').fillna(0)
+        # 1-4. Leitura, padronização, merge e conversão de tipos (via snapshot colunar)
+        tabelas = snapshot.load_snapshot()
+        df_main = tabelas['df_main']
+        base_id = tabelas['base_id']
+        base_transacoes = tabelas['base_transacoes']
 
         # 5. Criação da Tabela Calendário
         all_dates = []
@@ -143,7 +162,7 @@ def load_data():
 
         if not all_dates:
             st.error("A coluna 'DT_REFE' é essencial e não foi encontrada.")
-            return None, None, None, None
+            return None, None, None, None, None, None
 
         combined_dates = pd.concat(all_dates)
         min_date, max_date = combined_dates.min(), combined_dates.max()
@@ -151,15 +170,72 @@ def load_data():
         tabela_calendario = pd.DataFrame(pd.date_range(start=min_date, end=max_date, freq='D'), columns=['Data'])
         tabela_calendario['Ano'] = tabela_calendario['Data'].dt.year
         tabela_calendario['MesNum'] = tabela_calendario['Data'].dt.month
-        tabela_calendario['Mes'] = tabela_calendario['Data'].dt.month_name(locale='pt_BR.utf8')
+        tabela_calendario['Mes'] = tabela_calendario['MesNum'].map(dict(enumerate(periods.MONTH_NAMES, start=1)))
         tabela_calendario['MesAno'] = tabela_calendario['Data'].dt.to_period('M').dt.strftime('%m/%Y')
         tabela_calendario['Dia'] = tabela_calendario['Data'].dt.day
 
-        return df_main, base_id, base_transacoes, tabela_calendario
+        # 6. Representação compacta: ids de empresa com dicionário, categóricos e medidas
+        # int32/float32 onde a conversão é exata (menos memória e cache mais rápido de restaurar)
+        tabelas, relatorio_memoria = compact.compact_tables(tabelas)
+        df_main = tabelas['df_main']
+        base_id = tabelas['base_id']
+        base_transacoes = tabelas['base_transacoes']
+
+        # 7. Tabelas pré-agregadas (cubo mensal etc.), geradas junto ao snapshot
+        agregados = {nome: tabelas[nome] for nome in snapshot.AGGREGATES}
+
+        return df_main, base_id, base_transacoes, tabela_calendario, agregados, relatorio_memoria
 
     except Exception as e:
         st.error(f"Ocorreu um erro inesperado ao carregar e preparar os dados: {e}")
-        return None, None, None, None
+        return None, None, None, None, None, None
+
+@st.cache_resource(max_entries=2)
+def load_filter_engine(versao=None):
+    """Motor de filtros compartilhado entre as sessões (códigos categóricos + LRU de linhas)."""
+    df_main, _, base_transacoes, _, _, _ = load_data(versao)
+    return filters.FilterEngine(df_main, base_transacoes)
+
+@st.cache_resource(max_entries=2)
+def load_query_backend(versao=None):
+    """Motor das agregações das abas (``DASHBOARD_BACKEND``: pandas em memória ou DuckDB sobre o snapshot)."""
+    df_main, _, base_transacoes, _, agregados, _ = load_data(versao)
+    return queries.backend(tabelas={**agregados, 'df_main': df_main, 'base_transacoes': base_transacoes},
+                           motor=load_filter_engine(versao))
+
+@st.cache_resource(max_entries=2)
+def load_transaction_index(versao=None):
+    """Índice CSR das transações por empresa (pagador/recebedor), montado uma vez por versão dos dados."""
+    _, _, base_transacoes, _, _, _ = load_data(versao)
+    return adjacency.TransactionIndex(base_transacoes)
+
+@st.cache_resource(max_entries=32)
+def load_company_transactions(empresa, versao=None):
+    """Transações de uma empresa (ordenações memorizadas) para a tabela paginada do Detalhamento."""
+    _, _, base_transacoes, _, _, _ = load_data(versao)
+    return transaction_table.CompanyTransactions(base_transacoes, load_transaction_index(versao), empresa)
+
+@st.cache_resource(max_entries=2)
+def load_neighborhood_index(versao=None):
+    """Índice de vizinhança (arestas agregadas + comunidades do snapshot) para os subgrafos da rede."""
+    _, _, _, _, agregados, _ = load_data(versao)
+    return community.NeighborhoodIndex(agregados['arestas'], agregados['comunidades'])
+
+@st.cache_resource(max_entries=2)
+def load_search_index(versao=None):
+    """Índice de busca das empresas do Detalhamento (id, setor, momento e grupo), montado uma vez por versão dos dados."""
+    df_main, _, _, _, _, _ = load_data(versao)
+    return search.CompanySearchIndex(df_main)
+
+@st.cache_resource(max_entries=2)
+def load_view_store(versao=None, carimbo=None):
+    """Visões pré-calculadas para a versão dos dados (``carimbo``: mtime do manifesto; ``None`` se não houver)."""
+    return views.ViewStore.open(versao=versao)
+
+@st.cache_resource
+def load_result_cache():
+    """Cache de resultados (KPIs, agregados das abas, rankings) compartilhado por todas as sessões do processo."""
+    return resultcache.ResultCache()
 
 # --- Funções de Formatação e Cálculo ---
 def format_currency(value):
@@ -168,8 +244,63 @@ def format_currency(value):
 def format_number(value):
     return f"{value:,.0f}"
 
+@st.cache_data(max_entries=64)
+def build_company_network(empresa, meses, limite, layout_servidor, versao=None):
+    """
+    HTML da rede de uma empresa (maiores transações por valor nos meses
+    filtrados), já com os assets do vis-network. Cacheado por (empresa, meses,
+    limite, layout, versão) com descarte LRU: uma reexecução não refaz o HTML.
+    """
+    indice = load_transaction_index(versao)
+    linhas = indice.top_edges(empresa, limite, None if meses is None else np.asarray(meses))
+    if len(linhas) == 0:
+        return None
+    return network.render_html(network.build_graph(
+        indice.empresas[indice.pagador[linhas]],
+        indice.empresas[indice.recebedor[linhas]],
+        indice.valor[linhas],
+        centro=empresa,
+        layout_servidor=layout_servidor,
+        format_value=format_currency,
+    ))
+
+VISOES_REDE = {
+    "Transações da empresa": None,
+    "Vizinhança (1 salto)": 1,
+    "Vizinhança (2 saltos)": 2,
+    "Comunidade da empresa": "comunidade",
+}
+
+@st.cache_data(max_entries=64)
+def build_neighborhood_network(empresa, visao, limite, layout_servidor, versao=None):
+    """
+    HTML da rede da vizinhança real da empresa (1 ou 2 saltos, vizinhos mais
+    pesados) ou da sua comunidade, servida pelo índice de arestas agregadas.
+    Cacheado como ``build_company_network``.
+    """
+    indice = load_neighborhood_index(versao)
+    if visao == "comunidade":
+        arestas = indice.community_subgraph(indice.community_of(empresa), limite, centro=empresa)
+    else:
+        arestas = indice.ego_subgraph(empresa, saltos=visao, limite_arestas=limite)
+    if arestas.empty:
+        return None
+    return network.render_html(network.build_graph(
+        arestas['id_pagador'].to_numpy(),
+        arestas['id_recebedor'].to_numpy(),
+        arestas['valor_total'].to_numpy(),
+        centro=empresa,
+        layout_servidor=layout_servidor,
+        format_value=format_currency,
+    ))
+
 # --- Carregar os dados ---
-df_main, base_id, base_transacoes, calendario = load_data()
+# O snapshot é validado (e reconstruído, se preciso) antes da carga: numa partida a frio
+# load_data roda uma única vez, já sob a versão dos dados que lê
+versao_dados = snapshot.ensure_snapshot()
+with perfil.stage("load_data") as etapa:
+    df_main, base_id, base_transacoes, calendario, agregados, relatorio_memoria = load_data(versao_dados)
+    etapa.output(df_main)
 
 if df_main is None:
     st.stop()
@@ -199,458 +330,397 @@ with col3:
     mesano_selecionado = st.multiselect("Mês/Ano (DT_REFE)", mesano_options, default=["Todos"])
 
 # --- Aplicação dos Filtros ---
-df_filtrado = df_main.copy()
-transacoes_filtradas = base_transacoes.copy()
-
-# Filtro por Mês/Ano
+# Filtros normalizados (None = "Todos"); o motor memoriza as linhas de cada combinação
+setor_filtro = None if setor_selecionado == "Todos" else setor_selecionado
+momento_filtro = None if momento_selecionado == "Todos" else momento_selecionado
+meses_filtro = None
 if mesano_selecionado and "Todos" not in mesano_selecionado:
-    df_filtrado['MesAno'] = df_filtrado['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-    df_filtrado = df_filtrado[df_filtrado['MesAno'].isin(mesano_selecionado)]
-    
-    transacoes_filtradas['MesAno'] = transacoes_filtradas['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-    transacoes_filtradas = transacoes_filtradas[transacoes_filtradas['MesAno'].isin(mesano_selecionado)]
+    meses_filtro = periods.parse_month_labels(mesano_selecionado)
+
+motor_filtros = load_filter_engine(versao_dados)
+with perfil.stage("filtros_empresas", df_main) as etapa:
+    df_filtrado = etapa.output(motor_filtros.companies(setor_filtro, momento_filtro, meses_filtro))
+
+# Resultados por estado dos filtros, compartilhados entre as sessões e invalidados quando a versão dos dados muda
+cache_resultados = load_result_cache()
 
-# Filtro por Setor
-if setor_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['setor_cnae'] == setor_selecionado]
+# Estado dos filtros para as abas (analytics.views); os agregados saem do cache de resultados
+contexto_abas = views.ViewContext(
+    {**agregados, 'df_main': df_main, 'base_transacoes': base_transacoes}, motor_filtros,
+    setor_filtro, momento_filtro, meses_filtro, todos_meses="Todos" in mesano_selecionado,
+    cache=cache_resultados, versao=versao_dados, perfil=perfil, backend=load_query_backend(versao_dados),
+)
+
+def resultado(nome, calcular, *parametros):
+    """Resultado de ``calcular()`` para os filtros globais atuais (e ``parametros``), servido pelo cache de resultados."""
+    return contexto_abas.result(nome, calcular, *parametros)
 
-# Filtro por Momento da Empresa
-if momento_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['momento_empresa'] == momento_selecionado]
+def calcular_kpis():
+    """KPIs da sidebar para ``df_filtrado``."""
+    total_recebido = df_filtrado['total_recebido'].sum()
+    total_pago = df_filtrado['total_pago'].sum()
+    return {
+        'total_recebido': total_recebido,
+        'total_pago': total_pago,
+        'saldo_caixa': total_recebido - total_pago,
+        'transacoes_pagas': df_filtrado['num_transacoes_pagas'].sum(),
+        'transacoes_recebidas': df_filtrado['num_transacoes_recebidas'].sum(),
+        'clientes': df_filtrado['id_empresa'].nunique(),
+        'setores': df_filtrado['setor_cnae'].nunique(),
+        'momentos': df_filtrado['momento_empresa'].value_counts().loc[lambda c: c > 0].to_dict(),
+    }
 
 # --- Sidebar com KPIs ---
 with st.sidebar:
     st.image("img/santander logo.jpg")
     st.header("KPIs Globais")
 
-    # Cálculos dos KPIs com base nos dados filtrados
-    total_recebido = df_filtrado['total_recebido'].sum()
-    total_pago = df_filtrado['total_pago'].sum()
-    saldo_caixa = total_recebido - total_pago
-    transacoes_pagas = df_filtrado['num_transacoes_pagas'].sum()
-    transacoes_recebidas = df_filtrado['num_transacoes_recebidas'].sum()
+    with perfil.stage("kpis", df_filtrado):
+        # Cálculos dos KPIs com base nos dados filtrados (compartilhados entre as sessões)
+        kpis = resultado("kpis", calcular_kpis)
+        total_recebido = kpis['total_recebido']
+        total_pago = kpis['total_pago']
+        saldo_caixa = kpis['saldo_caixa']
+        transacoes_pagas = kpis['transacoes_pagas']
+        transacoes_recebidas = kpis['transacoes_recebidas']
     
-    clientes = df_filtrado['id_empresa'].nunique()
-    setores = df_filtrado['setor_cnae'].nunique()
+        clientes = kpis['clientes']
+        setores = kpis['setores']
     
-    # Contagem por momento da empresa
-    momentos_contagem = df_filtrado['momento_empresa'].value_counts()
-    inicio_count = momentos_contagem.get("INÍCIO", 0)
-    maturidade_count = momentos_contagem.get("MATURIDADE", 0)
-    expansao_count = momentos_contagem.get("EXPANSÃO", 0)
-    declinio_count = momentos_contagem.get("DECLÍNIO", 0)
-
-    # Exibição dos KPIs em cards
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Total Recebido</div><div class="kpi-value">{format_currency(total_recebido)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Total Pago</div><div class="kpi-value">{format_currency(total_pago)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Saldo de Caixa</div><div class="kpi-value">{format_currency(saldo_caixa)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Clientes Únicos</div><div class="kpi-value">{format_number(clientes)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Setores Únicos</div><div class="kpi-value">{format_number(setores)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Transações Recebidas</div><div class="kpi-value">{format_number(transacoes_recebidas)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Transações Pagas</div><div class="kpi-value">{format_number(transacoes_pagas)}</div></div>', unsafe_allow_html=True)
+        # Contagem por momento da empresa
+        momentos_contagem = kpis['momentos']
+        inicio_count = momentos_contagem.get("INÍCIO", 0)
+        maturidade_count = momentos_contagem.get("MATURIDADE", 0)
+        expansao_count = momentos_contagem.get("EXPANSÃO", 0)
+        declinio_count = momentos_contagem.get("DECLÍNIO", 0)
+
+        # Exibição dos KPIs em cards
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Total Recebido</div><div class="kpi-value">{format_currency(total_recebido)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Total Pago</div><div class="kpi-value">{format_currency(total_pago)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Saldo de Caixa</div><div class="kpi-value">{format_currency(saldo_caixa)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Clientes Únicos</div><div class="kpi-value">{format_number(clientes)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Setores Únicos</div><div class="kpi-value">{format_number(setores)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Transações Recebidas</div><div class="kpi-value">{format_number(transacoes_recebidas)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Transações Pagas</div><div class="kpi-value">{format_number(transacoes_pagas)}</div></div>', unsafe_allow_html=True)
     
-    st.markdown("---")
-    st.subheader("Empresas por Momento")
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Início</div><div class="kpi-value">{format_number(inicio_count)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Maturidade</div><div class="kpi-value">{format_number(maturidade_count)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Expansão</div><div class="kpi-value">{format_number(expansao_count)}</div></div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="kpi-card"><div class="kpi-title">Declínio</div><div class="kpi-value">{format_number(declinio_count)}</div></div>', unsafe_allow_html=True)
-
+        st.markdown("---")
+        st.subheader("Empresas por Momento")
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Início</div><div class="kpi-value">{format_number(inicio_count)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Maturidade</div><div class="kpi-value">{format_number(maturidade_count)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Expansão</div><div class="kpi-value">{format_number(expansao_count)}</div></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="kpi-card"><div class="kpi-title">Declínio</div><div class="kpi-value">{format_number(declinio_count)}</div></div>', unsafe_allow_html=True)
 
-# --- Abas de Análise ---
-# Slider para Top N
-top_n_slider = st.slider("Selecione o Top N para os gráficos", min_value=3, max_value=20, value=10)
 
 # --- Funções para os Gráficos ---
-def plot_empresas_por_momento(df):
-    data = df['momento_empresa'].value_counts().reset_index()
-    data.columns = ['momento_empresa', 'clientes']
-    fig = px.bar(data, y='momento_empresa', x='clientes', title="Empresas por Momento",
-                 orientation='h', text='clientes')
-    fig.update_layout(yaxis_title="Momento da Empresa", xaxis_title="Nº de Empresas")
-    return fig
-
-def plot_recebido_vs_pago_mes(df):
-    df_agg = df.copy()
-    df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-    data = df_agg.groupby('MesAno')[['total_recebido', 'total_pago']].sum().reset_index()
-    data['sort_key'] = pd.to_datetime(data['MesAno'], format='%m/%Y')
-    data = data.sort_values(by='sort_key').drop(columns='sort_key')
-    fig = go.Figure(data=[
-        go.Bar(name='Total Recebido', x=data['MesAno'], y=data['total_recebido']),
-        go.Bar(name='Total Pago', x=data['MesAno'], y=data['total_pago'])
-    ])
-    fig.update_layout(barmode='group', title="Recebido vs Pago por Mês",
-                      xaxis_title="Mês/Ano", yaxis_title="Valor (R$)")
-    return fig
-
-def plot_fluxo_caixa_linha(df):
-    df_agg = df.copy()
-    df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-    data = df_agg.groupby('MesAno')['fluxo_caixa_liquido'].sum().reset_index()
-    data['sort_key'] = pd.to_datetime(data['MesAno'], format='%m/%Y')
-    data = data.sort_values(by='sort_key').drop(columns='sort_key')
-    fig = px.line(data, x='MesAno', y='fluxo_caixa_liquido', title="Fluxo de Caixa (Linha)",
-                  markers=True)
-    fig.update_layout(xaxis_title="Mês/Ano", yaxis_title="Fluxo de Caixa (R$)")
-    return fig
-
-def plot_top_setores_recebido(df, top_n):
-    data = df.groupby('setor_cnae')['total_recebido'].sum().nlargest(top_n).sort_values(ascending=True).reset_index()
-    fig = px.bar(data, y='setor_cnae', x='total_recebido', title=f"Top {top_n} Setores por Recebido",
-                 orientation='h', text='total_recebido')
-    fig.update_traces(texttemplate='%{text:,.2s}')
-    fig.update_layout(yaxis_title="Setor", xaxis_title="Total Recebido (R$)")
-    return fig
+# As figuras saem de analytics.figures (traços montados direto dos arrays, WebGL e
+# redução LTTB para séries longas) e ficam no cache de resultados pela impressão
+# digital dos dados; cada etapa de figura registra os bytes do JSON enviado.
+def grafico(nome, construir, dados, *parametros, key=None):
+    """Desenha ``construir(dados, *parametros)``, servida pelo cache de figuras."""
+    with perfil.stage(nome, dados) as etapa:
+        pronta = figures.cached(cache_resultados, nome, construir, dados, versao_dados, *parametros)
+        etapa.note(payload_bytes=pronta.json_bytes)
+        st.plotly_chart(pronta.figura, use_container_width=True, key=key)
+
+def desenhar_visao(elementos):
+    """Desenha os elementos de uma aba (``analytics.views``): avisos e gráficos nas duas colunas."""
+    colunas = None
+    for elemento in elementos:
+        if elemento.coluna is None:
+            alvo = st.container()
+        else:
+            colunas = colunas or st.columns(2)
+            alvo = colunas[elemento.coluna]
+        with alvo:
+            if isinstance(elemento, views.Message):
+                getattr(st, elemento.nivel)(elemento.texto)
+            elif isinstance(elemento, views.StoredPanel):
+                with perfil.stage(elemento.nome) as etapa:
+                    etapa.note(payload_bytes=elemento.json_bytes)
+                    st.plotly_chart(elemento.figura, use_container_width=True, key=elemento.key)
+            else:
+                grafico(elemento.nome, elemento.construir, elemento.dados, *elemento.parametros, key=elemento.key)
 
+# --- Abas de Análise ---
+# Top N, navegação e o conteúdo das abas formam um fragmento: trocar de aba, mudar o
+# Top N ou escolher uma empresa reexecuta só esta seção, reaproveitando os dados já
+# filtrados (filtros e KPIs da sidebar não são refeitos). O conteúdo das abas de análise
+# vem de analytics.views: uma visão pré-calculada com os mesmos filtros e Top N é servida
+# do disco; senão os agregados que não dependem do Top N saem do cache de resultados e
+# só os rankings são refeitos.
 if 'active_tab' not in st.session_state:
     st.session_state.active_tab = "Visão Geral"
 
 tab_names = ["Visão Geral", "Início", "Maturidade", "Expansão", "Declínio", "Detalhamento"]
-st.radio("Navegação", tab_names, key="active_tab", horizontal=True)
-
-if st.session_state.active_tab == "Visão Geral":
-    st.header("Visão Geral do Ecossistema")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.plotly_chart(plot_empresas_por_momento(df_filtrado), use_container_width=True)
-        st.plotly_chart(plot_fluxo_caixa_linha(df_main if "Todos" in mesano_selecionado else df_filtrado), use_container_width=True, key="fluxo_caixa_geral")
-    with col2:
-        st.plotly_chart(plot_recebido_vs_pago_mes(df_main if "Todos" in mesano_selecionado else df_filtrado), use_container_width=True, key="recebido_pago_geral")
-        st.plotly_chart(plot_top_setores_recebido(df_filtrado, top_n_slider), use_container_width=True, key="top_setores_geral")
-
-elif st.session_state.active_tab == "Início":
-    st.header("Análise de Empresas em Início")
-    df_inicio = df_filtrado[df_filtrado['momento_empresa'] == 'INÍCIO']
-
-    if df_inicio.empty:
-        st.warning("Nenhum dado disponível para empresas em 'Início' com os filtros selecionados.")
-    else:
-        col1, col2 = st.columns(2)
-        with col1:
-            # Setores com mais empresas (Início)
-            data_setores = df_inicio['setor_cnae'].value_counts().nlargest(top_n_slider).sort_values(ascending=True).reset_index()
-            data_setores.columns = ['setor_cnae', 'clientes']
-            fig = px.bar(data_setores, y='setor_cnae', x='clientes', title=f"Top {top_n_slider} Setores com mais empresas (Início)", orientation='h')
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Evolução do Fluxo (Início)
-            st.plotly_chart(plot_fluxo_caixa_linha(df_inicio), use_container_width=True, key="fluxo_caixa_inicio")
-
-        with col2:
-            # Recebido vs Pago (Início)
-            st.plotly_chart(plot_recebido_vs_pago_mes(df_inicio), use_container_width=True, key="recebido_pago_inicio")
-
-            # Top 10 Empresas por Recebido (Início)
-            data_top_empresas = df_inicio.groupby('id_empresa')['total_recebido'].sum().nlargest(top_n_slider).sort_values(ascending=True).reset_index()
-            fig = px.bar(data_top_empresas, y='id_empresa', x='total_recebido', title=f"Top {top_n_slider} Empresas por Recebido (Início)", orientation='h')
-            st.plotly_chart(fig, use_container_width=True)
-
-elif st.session_state.active_tab == "Maturidade":
-    st.header("Análise de Empresas em Maturidade")
-    df_maturidade = df_filtrado[df_filtrado['momento_empresa'] == 'MATURIDADE']
-
-    if df_maturidade.empty:
-        st.warning("Nenhum dado disponível para empresas em 'Maturidade' com os filtros selecionados.")
-    else:
-        col1, col2 = st.columns(2)
-        with col1:
-            # Mix por Tipo de Transação
-            if not transacoes_filtradas.empty:
-                ids_maturidade = df_maturidade['id_empresa'].unique()
-                transacoes_maturidade = transacoes_filtradas[transacoes_filtradas['ID_RCBE'].isin(ids_maturidade) | transacoes_filtradas['ID_PGTO'].isin(ids_maturidade)]
-                data_mix = transacoes_maturidade.groupby('DS_TRAN')['VL'].sum().reset_index()
-                fig = px.pie(data_mix, names='DS_TRAN', values='VL', title="Mix por Tipo de Transação", hole=0.4)
-                st.plotly_chart(fig, use_container_width=True)
-            
-            # Estabilidade do Fluxo (Razão Receb/Pago)
-            df_agg = df_maturidade.copy()
-            df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-            data_razao = df_agg.groupby('MesAno').agg(total_recebido=('total_recebido', 'sum'), total_pago=('total_pago', 'sum')).reset_index()
-            data_razao['razao_receb_pago'] = data_razao['total_recebido'] / data_razao['total_pago'].replace(0, np.nan)
-            data_razao['sort_key'] = pd.to_datetime(data_razao['MesAno'], format='%m/%Y')
-            data_razao = data_razao.sort_values(by='sort_key').drop(columns='sort_key')
-            fig = px.line(data_razao, x='MesAno', y='razao_receb_pago', title="Estabilidade do Fluxo (Razão Receb/Pago)", markers=True)
-            st.plotly_chart(fig, use_container_width=True)
-
-        with col2:
-            # Ticket Médio (Recebido x Pago)
-            df_agg = df_maturidade.copy()
-            df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-            data_ticket = df_agg.groupby('MesAno').agg(
-                ticket_medio_recebido=('ticket_medio_recebido', 'mean'),
-                ticket_medio_pago=('ticket_medio_pago', 'mean')
-            ).reset_index()
-            data_ticket['sort_key'] = pd.to_datetime(data_ticket['MesAno'], format='%m/%Y')
-            data_ticket = data_ticket.sort_values(by='sort_key').drop(columns='sort_key')
-            fig = go.Figure(data=[
-                go.Bar(name='Ticket Médio Recebido', x=data_ticket['MesAno'], y=data_ticket['ticket_medio_recebido']),
-                go.Bar(name='Ticket Médio Pago', x=data_ticket['MesAno'], y=data_ticket['ticket_medio_pago'])
-            ])
-            fig.update_layout(barmode='group', title="Ticket Médio (Recebido x Pago)", xaxis_title="Mês/Ano", yaxis_title="Valor (R$)")
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Top Setores por Recebido (Maturidade)
-            st.plotly_chart(plot_top_setores_recebido(df_maturidade, top_n_slider), use_container_width=True, key="top_setores_maturidade")
-
-elif st.session_state.active_tab == "Expansão":
-    st.header("Análise de Empresas em Expansão")
-    df_expansao = df_filtrado[df_filtrado['momento_empresa'] == 'EXPANSÃO']
-
-    if df_expansao.empty:
-        st.warning("Nenhum dado disponível para empresas em 'Expansão' com os filtros selecionados.")
-    else:
-        col1, col2 = st.columns(2)
-        with col1:
-            df_agg = df_expansao.copy()
-            df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-            fluxo_mes = df_agg.groupby('MesAno')['fluxo_caixa_liquido'].sum().reset_index()
-            fluxo_mes['sort_key'] = pd.to_datetime(fluxo_mes['MesAno'], format='%m/%Y')
-            fluxo_mes = fluxo_mes.sort_values(by='sort_key').drop(columns='sort_key')
-            fluxo_mes['crescimento_mm_fluxo'] = fluxo_mes['fluxo_caixa_liquido'].pct_change() * 100
-            fig = px.line(fluxo_mes, x='MesAno', y='crescimento_mm_fluxo', title="Crescimento % M/M do Fluxo", markers=True)
-            fig.update_yaxes(ticksuffix="%")
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Top 10 Empresas que mais cresceram no mês
-            if "Todos" not in mesano_selecionado:
-                df_agg_empresa = df_expansao.copy()
-                df_agg_empresa['MesAno'] = df_agg_empresa['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-                fluxo_empresa = df_agg_empresa.groupby(['id_empresa', 'MesAno'])['fluxo_caixa_liquido'].sum().unstack()
-                crescimento = fluxo_empresa.pct_change(axis='columns').iloc[:, -1].nlargest(top_n_slider).sort_values(ascending=True).reset_index()
-                crescimento.columns = ['id_empresa', 'crescimento_mm_fluxo']
-                crescimento['crescimento_mm_fluxo'] *= 100
-                fig = px.bar(crescimento, y='id_empresa', x='crescimento_mm_fluxo', title=f"Top {top_n_slider} Empresas que mais cresceram no mês", orientation='h')
-                fig.update_xaxes(ticksuffix="%")
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Selecione um Mês/Ano específico para ver o Top de crescimento.")
-
-        with col2:
-            # Volume de Transações
-            df_agg = df_expansao.copy()
-            df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-            data_vol = df_agg.groupby('MesAno')[['num_transacoes_recebidas', 'num_transacoes_pagas']].sum().reset_index()
-            data_vol['sort_key'] = pd.to_datetime(data_vol['MesAno'], format='%m/%Y')
-            data_vol = data_vol.sort_values(by='sort_key').drop(columns='sort_key')
-            fig = go.Figure(data=[
-                go.Bar(name='Transações Recebidas', x=data_vol['MesAno'], y=data_vol['num_transacoes_recebidas']),
-                go.Bar(name='Transações Pagas', x=data_vol['MesAno'], y=data_vol['num_transacoes_pagas'])
-            ])
-            fig.update_layout(barmode='group', title="Volume de Transações", xaxis_title="Mês/Ano", yaxis_title="Número de Transações")
-            st.plotly_chart(fig, use_container_width=True)
-
-elif st.session_state.active_tab == "Declínio":
-    st.header("Análise de Empresas em Declínio")
-    df_declinio = df_filtrado[df_filtrado['momento_empresa'] == 'DECLÍNIO']
-
-    if df_declinio.empty:
-        st.warning("Nenhum dado disponível para empresas em 'Declínio' com os filtros selecionados.")
-    else:
-        col1, col2 = st.columns(2)
-        with col1:
-            # Variação % 3M do Fluxo
-            df_agg = df_declinio.copy()
-            df_agg['MesAno'] = df_agg['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-            fluxo_mes = df_agg.groupby('MesAno')['fluxo_caixa_liquido'].sum().reset_index()
-            fluxo_mes['sort_key'] = pd.to_datetime(fluxo_mes['MesAno'], format='%m/%Y')
-            fluxo_mes = fluxo_mes.sort_values(by='sort_key').drop(columns='sort_key')
-            fluxo_mes['variacao_3m_fluxo'] = fluxo_mes['fluxo_caixa_liquido'].pct_change(periods=3) * 100
-            fig = px.line(fluxo_mes, x='MesAno', y='variacao_3m_fluxo', title="Variação % 3M do Fluxo", markers=True)
-            fig.update_yaxes(ticksuffix="%")
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Setores com maior queda de fluxo
-            if "Todos" not in mesano_selecionado:
-                df_agg_setor = df_declinio.copy()
-                df_agg_setor['MesAno'] = df_agg_setor['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-                fluxo_setor = df_agg_setor.groupby(['setor_cnae', 'MesAno'])['fluxo_caixa_liquido'].sum().unstack().fillna(0)
-                if len(fluxo_setor.columns) > 1:
-                    fluxo_setor['delta'] = fluxo_setor.iloc[:, -1] - fluxo_setor.iloc[:, -2]
-                    data_queda = fluxo_setor.nsmallest(top_n_slider, 'delta').reset_index()
-                    fig = px.bar(data_queda, x='setor_cnae', y=data_queda.columns[-2], title="Setores com maior queda de fluxo",
-                                 hover_data=['delta'])
-                    st.plotly_chart(fig, use_container_width=True)
-
-        with col2:
-            # Top 10 Empresas por Sequência de Fluxo de Caixa Negativo
-            if "Todos" not in mesano_selecionado:
-                ids_declinio = df_declinio['id_empresa'].unique()
-                df_agg_empresa = df_main[df_main['id_empresa'].isin(ids_declinio)].copy()
-                df_agg_empresa['MesAno'] = df_agg_empresa['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-                fluxo_empresa = df_agg_empresa.groupby(['id_empresa', 'MesAno'])['fluxo_caixa_liquido'].sum().unstack().fillna(0)
-
-                def negative_streak(row):
-                    streak = 0
-                    max_streak = 0
-                    for val in row:
-                        if val < 0:
-                            streak += 1
-                        else:
-                            max_streak = max(max_streak, streak)
-                            streak = 0
-                    max_streak = max(max_streak, streak)
-                    return max_streak
-
-                streaks = fluxo_empresa.apply(negative_streak, axis=1)
-                streaks = streaks.nlargest(top_n_slider).sort_values(ascending=True).reset_index()
-                streaks.columns = ['id_empresa', 'negative_cashflow_streak']
-
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=streaks['negative_cashflow_streak'],
-                    y=streaks['id_empresa'],
-                    mode='markers',
-                    marker_color='red',
-                    marker_size=10
-                ))
-
-                for i, row in streaks.iterrows():
-                    fig.add_shape(
-                        type='line',
-                        x0=0,
-                        y0=i,
-                        x1=row['negative_cashflow_streak'],
-                        y1=i,
-                        line=dict(
-                            color="lightgray",
-                            width=2,
-                        )
-                    )
-
-                fig.update_layout(
-                    title=f"Top {top_n_slider} Empresas por Sequência de Fluxo de Caixa Negativo",
-                    xaxis_title="Meses Consecutivos com Fluxo de Caixa Negativo",
-                    yaxis_title="Empresa",
-                    yaxis=dict(
-                        tickmode='array',
-                        tickvals=list(range(len(streaks))),
-                        ticktext=streaks['id_empresa']
-                    )
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Selecione um Mês/Ano para ver o ranking de empresas.")
 
-elif st.session_state.active_tab == "Detalhamento":
-    st.header("Detalhamento por Empresa")
+@fragmento
+def secao_rede(empresa_selecionada):
+    """Rede da empresa: visão, limite e layout reexecutam só este trecho."""
+    st.subheader("Rede de Transações")
+    visao_rede = st.radio("Visualizar", list(VISOES_REDE), horizontal=True)
+    col_limite, col_layout = st.columns(2)
+    limite_arestas = col_limite.slider("Máximo de transações na rede", min_value=20, max_value=500, value=200, step=20)
+    layout_servidor = col_layout.checkbox("Calcular o layout no servidor (recomendado para empresas com muitas conexões)")
+
+    with st.spinner("Gerando rede de transações..."):
+        try:
+            with perfil.stage("rede_build") as etapa:
+                if VISOES_REDE[visao_rede] is None:
+                    meses_rede = None if meses_filtro is None else tuple(sorted(meses_filtro.tolist()))
+                    html_rede = build_company_network(empresa_selecionada, meses_rede, limite_arestas, layout_servidor, versao_dados)
+                else:
+                    st.caption("Arestas agregadas de todo o período (pares pagador → recebedor), mantendo as de maior valor.")
+                    html_rede = build_neighborhood_network(empresa_selecionada, VISOES_REDE[visao_rede], limite_arestas, layout_servidor, versao_dados)
+                if html_rede is not None:
+                    etapa.note(payload_bytes=len(html_rede))
+        except Exception as e:
+            st.error(f"Não foi possível gerar o gráfico de rede: {e}")
+            return
+
+        if html_rede is not None:
+            with perfil.stage("rede_render"):
+                st.components.v1.html(html_rede, height=610)
+        else:
+            st.info("Nenhuma transação encontrada para esta empresa nos filtros atuais para gerar a rede.")
+
+RANKINGS_BUSCA = {
+    "Total recebido": 'total_recebido',
+    "Centralidade": 'Centralidade_de_Conexoes',
+}
+
+ORDENACOES_TRANSACOES = {
+    "Maior valor": ('VL', True),
+    "Menor valor": ('VL', False),
+    "Mais recentes": ('DT_REFE', True),
+    "Mais antigas": ('DT_REFE', False),
+}
+
+@fragmento
+def secao_transacoes(empresa_selecionada):
+    """
+    Tabela de transações da empresa: ordenação, tipo e página são resolvidos no
+    servidor e só a página visível e os resumos (tamanho fixo) vão para o navegador.
+    """
+    st.subheader("Tabela de Transações")
+    with perfil.stage("detalhamento_transacoes_indice", base_transacoes) as etapa:
+        transacoes = etapa.output(load_company_transactions(empresa_selecionada, versao_dados))
+
+    col_ordem, col_tipo, col_tamanho = st.columns([2, 3, 1])
+    coluna, decrescente = ORDENACOES_TRANSACOES[col_ordem.selectbox("Ordenar por", list(ORDENACOES_TRANSACOES))]
+    tipos = col_tipo.multiselect("Tipo de transação", transacoes.types(), placeholder="Todos")
+    tamanho = col_tamanho.selectbox("Linhas por página", [25, 50, 100], index=1)
+    total = transacoes.count(tipos)
+    paginas = max(1, -(-total // tamanho))
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1)
+
+    with perfil.stage("detalhamento_transacoes", transacoes) as etapa:
+        linhas = transacoes.page(pagina - 1, tamanho, coluna, decrescente, tipos)
+        st.dataframe(etapa.output(base_transacoes.take(linhas)))
+    inicio = (pagina - 1) * tamanho
+    st.caption(f"Transações {format_number(min(inicio + 1, total))}–{format_number(inicio + len(linhas))} "
+               f"de {format_number(total)}")
+
+    with perfil.stage("detalhamento_transacoes_resumo", transacoes):
+        col_contraparte, col_tipo_resumo = st.columns(2)
+        col_contraparte.caption(f"Por contraparte (maiores {transaction_table.TOP_COUNTERPARTIES})")
+        col_contraparte.dataframe(transacoes.by_counterparty(tipos), hide_index=True)
+        col_tipo_resumo.caption("Por tipo de transação")
+        col_tipo_resumo.dataframe(transacoes.by_type(tipos), hide_index=True)
+
+def secao_exposicao(empresa_selecionada):
+    """Exposição da empresa a cada momento: direta e propagada, no período e mês a mês (tabelas do snapshot)."""
+    st.subheader("Exposição a Contrapartes por Momento")
+    rotulos = exposure.column_labels(sorted(df_main['momento_empresa'].astype(str).unique()))
+    periodo = agregados['exposicao_periodo']
+    periodo = periodo[(periodo['id_empresa'] == empresa_selecionada).to_numpy()]
+    risco = [exposure.column_name(exposure.RISK_GROUP, salto) for salto in range(1, exposure.HOPS + 1)]
+    risco = [c for c in risco if c in rotulos and c in periodo.columns]
+    if risco and not periodo.empty:
+        for coluna, nome in zip(st.columns(len(risco)), risco):
+            coluna.metric(f"Exposição a {rotulos[nome]} no período", f"{periodo.iloc[0][nome]:.1%}")
+
+    with perfil.stage("detalhamento_exposicao", agregados['exposicao_mensal']) as etapa:
+        mensal = agregados['exposicao_mensal']
+        linhas = mensal[(mensal['id_empresa'] == empresa_selecionada).to_numpy()]
+        if meses_filtro is not None:
+            linhas = linhas[np.isin(linhas['mes'].to_numpy(), meses_filtro)]
+        linhas = etapa.output(linhas.sort_values('mes'))
+    if linhas.empty:
+        st.info("A empresa não recebeu de empresas da base nos meses selecionados.")
+        return
+    colunas = [c for c in rotulos if c in linhas.columns]
+    tabela = (linhas[colunas] * 100).rename(columns=rotulos)
+    tabela.insert(0, 'Mês/Ano', periods.month_labels(linhas['mes'].to_numpy()))
+    st.caption("Fração do valor recebido no mês vinda de empresas de cada momento: diretamente "
+               "(pagadores do momento) e em 2 saltos (pagadores cujo recebido veio do momento).")
+    st.dataframe(tabela, hide_index=True,
+                 column_config={r: st.column_config.NumberColumn(format="%.1f%%") for r in tabela.columns[1:]})
+
+@fragmento
+def secao_abas():
+    # Slider para Top N
+    top_n_slider = st.slider("Selecione o Top N para os gráficos", min_value=3, max_value=20, value=10)
+    st.radio("Navegação", tab_names, key="active_tab", horizontal=True)
+
+    aba = st.session_state.active_tab
+    if aba in views.TABS:
+        st.header(views.TABS[aba][0])
+        # Visão pré-calculada (python -m analytics.views) para os mesmos filtros e Top N, se houver
+        armazenada = None
+        armazem = load_view_store(versao_dados, views.store_stamp())
+        chave = views.view_key(aba, setor_filtro, momento_filtro, meses_filtro, "Todos" in mesano_selecionado, top_n_slider)
+        if armazem is not None and chave in armazem:
+            with perfil.stage("visao_pre_calculada") as etapa:
+                armazenada = etapa.output(cache_resultados.get_or_compute(
+                    ("visao_pre_calculada", armazem.manifest["dir"], chave), lambda: armazem.load(chave), versao_dados))
+        desenhar_visao(armazenada.elementos if armazenada is not None else views.tab_view(contexto_abas, aba, top_n_slider))
+
+    elif aba == "Detalhamento":
+        st.header("Detalhamento por Empresa")
+
+        # Busca indexada: só as melhores correspondências (dentro dos filtros globais) vão para o navegador
+        indice_busca = load_search_index(versao_dados)
+        col_busca, col_ranking = st.columns([3, 1])
+        texto_busca = col_busca.text_input("Buscar empresa", key="busca_empresa",
+                                           placeholder="Id, setor, momento ou grupo (Enter para buscar)")
+        ranking_busca = RANKINGS_BUSCA[col_ranking.selectbox("Ordenar por", list(RANKINGS_BUSCA), key="ranking_busca")]
+        filtros_ativos = setor_filtro is not None or momento_filtro is not None or meses_filtro is not None
+        mascara_busca = resultado("mascara_busca", lambda: indice_busca.mask(df_filtrado['id_empresa'].unique())) \
+            if filtros_ativos else None
+        with perfil.stage("busca_empresas", indice_busca) as etapa:
+            encontradas = etapa.output(indice_busca.search(texto_busca, mascara_busca, ranking_busca))
+
+        if texto_busca and not encontradas:
+            st.info("Nenhuma empresa encontrada com os filtros selecionados.")
+        # A empresa já escolhida continua entre as opções enquanto passar nos filtros
+        atual = st.session_state.get("empresa_detalhamento")
+        if atual and atual not in encontradas and indice_busca.contains(atual, mascara_busca):
+            encontradas = [atual] + encontradas
+        empresa_selecionada = st.selectbox(
+            "Selecione uma Empresa",
+            options=[""] + encontradas,
+            format_func=lambda x: f"Empresa {x} · {indice_busca.describe(x)}" if x else "Selecione...",
+            key="empresa_detalhamento",
+        )
+
+        if empresa_selecionada:
+            df_empresa = df_filtrado[df_filtrado['id_empresa'] == empresa_selecionada]
+
+            # Cards de KPI da empresa
+            if not df_empresa.empty:
+                info = df_empresa.iloc[0]
+                c1, c2, c3, c4, c5 = st.columns(5)
+                c1.metric("Setor (CNAE)", info['setor_cnae'])
+                c2.metric("Momento", info['momento_empresa'])
+                c3.metric("Total Recebido", format_currency(info['total_recebido']))
+                c4.metric("Total Pago", format_currency(info['total_pago']))
+                c5.metric("Fluxo de Caixa", format_currency(info['fluxo_caixa_liquido']))
+
+            # Exposição a contrapartes (analytics.exposure): fração do recebido vinda de cada momento
+            secao_exposicao(empresa_selecionada)
+
+            # Timeline da empresa
+            with perfil.stage("detalhamento_timeline", df_main):
+                # Linhas da empresa pelo índice do motor de filtros, somadas pelos códigos de mês
+                data_timeline = cube.company_series(df_main, motor_filtros.rows_of_company(empresa_selecionada),
+                                                    motor_filtros.mes_empresas)
+
+                series_timeline = (('Total Recebido', 'total_recebido'), ('Total Pago', 'total_pago'))
+                grafico("fig_detalhamento_timeline",
+                        lambda data, series: figures.line(data['MesAno'], {nome: data[coluna] for nome, coluna in series},
+                                                          "Timeline — Recebido x Pago", "Mês/Ano", "Valor (R$)"),
+                        data_timeline, series_timeline)
+
+            # Tabela de Transações (paginada no servidor)
+            secao_transacoes(empresa_selecionada)
+
+            # Rede de Transações (vis-network, gerada em memória)
+            secao_rede(empresa_selecionada)
+
+secao_abas()
 
-    empresa_selecionada = st.selectbox(
-        "Selecione uma Empresa",
-        options=[""] + sorted(df_filtrado['id_empresa'].unique().tolist()),
-        format_func=lambda x: f"Empresa {x}" if x else "Selecione..."
+# --- Botão de Download ---
+# O arquivo só é gerado no clique (data como função), em blocos, num arquivo temporário;
+# cada bloco volta aos dtypes originais, e o CSV sai igual ao da representação não compacta.
+TABELAS_EXPORTACAO = {
+    "Empresas filtradas": ("dados_filtrados", 'df_main'),
+    "Transações do período": ("transacoes_filtradas", 'base_transacoes'),
+}
+
+def linhas_exportacao(tabela):
+    """Tabela inteira e as posições do filtro (``None``: todas); os blocos saem direto da tabela, sem cópia prévia."""
+    if tabela == 'df_main':
+        return df_main, motor_filtros.company_rows(setor_filtro, momento_filtro, meses_filtro)
+    return base_transacoes, motor_filtros.transaction_rows(meses_filtro)
+
+@fragmento
+def secao_exportacao():
+    col_tabela, col_formato = st.columns(2)
+    rotulo = col_tabela.selectbox("Dados para exportar", list(TABELAS_EXPORTACAO))
+    formato = col_formato.selectbox("Formato", list(export.FORMATS))
+    nome_arquivo, tabela = TABELAS_EXPORTACAO[rotulo]
+    dados, linhas = linhas_exportacao(tabela)
+
+    st.download_button(
+       label=f"Baixar {rotulo.lower()} ({formato.upper()}, {format_number(export.row_count(dados, linhas))} linhas)",
+       data=functools.partial(export.export, dados, formato, relatorio=relatorio_memoria, tabela=tabela, linhas=linhas),
+       file_name=export.file_name(nome_arquivo, formato),
+       mime=export.FORMATS[formato][1],
+       on_click="ignore",
     )
 
-    if empresa_selecionada:
-        df_empresa = df_filtrado[df_filtrado['id_empresa'] == empresa_selecionada]
-        
-        # Cards de KPI da empresa
-        if not df_empresa.empty:
-            info = df_empresa.iloc[0]
-            c1, c2, c3, c4, c5 = st.columns(5)
-            c1.metric("Setor (CNAE)", info['setor_cnae'])
-            c2.metric("Momento", info['momento_empresa'])
-            c3.metric("Total Recebido", format_currency(info['total_recebido']))
-            c4.metric("Total Pago", format_currency(info['total_pago']))
-            c5.metric("Fluxo de Caixa", format_currency(info['fluxo_caixa_liquido']))
-
-        # Timeline da empresa
-        df_empresa_full = df_main[df_main['id_empresa'] == empresa_selecionada]
-        df_empresa_full['MesAno'] = df_empresa_full['DT_REFE'].dt.to_period('M').dt.strftime('%m/%Y')
-        data_timeline = df_empresa_full.groupby('MesAno').agg(
-            total_recebido=('total_recebido', 'sum'),
-            total_pago=('total_pago', 'sum')
-        ).reset_index()
-        data_timeline['sort_key'] = pd.to_datetime(data_timeline['MesAno'], format='%m/%Y')
-        data_timeline = data_timeline.sort_values(by='sort_key').drop(columns='sort_key')
-        
-        fig_timeline = go.Figure()
-        fig_timeline.add_trace(go.Scatter(x=data_timeline['MesAno'], y=data_timeline['total_recebido'], mode='lines+markers', name='Total Recebido'))
-        fig_timeline.add_trace(go.Scatter(x=data_timeline['MesAno'], y=data_timeline['total_pago'], mode='lines+markers', name='Total Pago'))
-        fig_timeline.update_layout(title="Timeline — Recebido x Pago", xaxis_title="Mês/Ano", yaxis_title="Valor (R$)")
-        st.plotly_chart(fig_timeline, use_container_width=True)
-
-        # Tabela de Transações
-        st.subheader("Tabela de Transações")
-        transacoes_empresa = base_transacoes[
-            (base_transacoes['ID_PGTO'] == empresa_selecionada) | 
-            (base_transacoes['ID_RCBE'] == empresa_selecionada)
-        ]
-        st.dataframe(transacoes_empresa)
-
-        # Rede de Transações (PyVis)
-        st.subheader("Rede de Transações")
-        with st.spinner("Gerando rede de transações..."):
-            net = Network(height="600px", width="100%", bgcolor="#222222", font_color="white", directed=True)
-            
-            # Filtrar transações para a rede
-            edges_df = transacoes_filtradas[
-                (transacoes_filtradas['ID_PGTO'] == empresa_selecionada) | 
-                (transacoes_filtradas['ID_RCBE'] == empresa_selecionada)
-            ].nlargest(200, 'VL')
-
-            if not edges_df.empty:
-                # Adicionar nós e arestas
-                for index, row in edges_df.iterrows():
-                    src = row['ID_PGTO']
-                    dst = row['ID_RCBE']
-                    weight = row['VL']
-                    
-                    net.add_node(src, label=str(src), title=f"Empresa {src}", color="#FF4D4D" if src == empresa_selecionada else "#C30000")
-                    net.add_node(dst, label=str(dst), title=f"Empresa {dst}", color="#FF4D4D" if dst == empresa_selecionada else "#00A9E0")
-                    net.add_edge(src, dst, value=weight, title=f"Valor: {format_currency(weight)}")
-
-                # Gerar HTML
-                net.set_options("""
-                var options = {
-                  "edges": {
-                    "color": {
-                      "inherit": true
-                    },
-                    "smooth": {
-                      "enabled": true,
-                      "type": "dynamic"
-                    }
-                  },
-                  "physics": {
-                    "barnesHut": {
-                      "gravitationalConstant": -80000,
-                      "springConstant": 0.001,
-                      "springLength": 200
-                    },
-                    "minVelocity": 0.75
-                  }
-                }
-                """)
-                
-                try:
-                    path = '/tmp'
-                    if not os.path.exists(path):
-                        os.makedirs(path)
-                    file_path = os.path.join(path, 'network.html')
-                    net.save_graph(file_path)
-                    
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        html_content = f.read()
-                    
-                    st.components.v1.html(html_content, height=610)
-                except Exception as e:
-                    st.error(f"Não foi possível gerar o gráfico de rede: {e}")
-            else:
-                st.info("Nenhuma transação encontrada para esta empresa nos filtros atuais para gerar a rede.")
-
-# --- Botão de Download ---
-@st.cache_data
-def convert_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
+secao_exportacao()
 
-csv = convert_df_to_csv(df_filtrado)
+# --- Painel de Perfil de Desempenho ---
+perfil.contexto.update(active_tab=st.session_state.active_tab, setor=setor_filtro, momento=momento_filtro,
+                       meses=None if meses_filtro is None else sorted(meses_filtro.tolist()), versao=versao_dados,
+                       backend=contexto_abas.backend.nome)
+perfil.finish()
 
-st.download_button(
-   label="Baixar dados filtrados (CSV)",
-   data=csv,
-   file_name='dados_filtrados.csv',
-   mime='text/csv',
-)
+with st.sidebar:
+    with st.expander("Cache de resultados"):
+        estatisticas = cache_resultados.stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Acertos", format_number(estatisticas['hits'] + estatisticas['waits']))
+        c2.metric("Faltas", format_number(estatisticas['misses']))
+        c3.metric("Taxa de acerto", "-" if estatisticas['hit_rate'] is None else f"{estatisticas['hit_rate']:.0%}")
+        st.caption(f"{estatisticas['entries']} entradas, {estatisticas['bytes'] / 2 ** 20:.1f} de "
+                   f"{estatisticas['max_bytes'] / 2 ** 20:.0f} MB; descartes: {estatisticas['evictions']}, "
+                   f"expiradas: {estatisticas['expirations']}, invalidações: {estatisticas['invalidations']}")
+        if estatisticas['by_name']:
+            st.dataframe(pd.DataFrame.from_dict(estatisticas['by_name'], orient='index').fillna(0).astype(int))
+        st.button("Limpar cache de resultados", on_click=cache_resultados.clear)
+
+    with st.expander("Perfil de desempenho"):
+        st.checkbox("Medir as etapas de cada execução", key="perfil_ativo",
+                    value=os.environ.get("DASHBOARD_PROFILE") == "1")
+        st.checkbox("Medir memória alocada (tracemalloc, mais lento)", key="perfil_memoria")
+        st.checkbox(f"Gravar em {profiling.LOG_PATH}", key="perfil_gravar")
+        c1, c2 = st.columns(2)
+        c1.button("cProfile na próxima execução", on_click=st.session_state.update, kwargs={"perfil_gancho": "cprofile"})
+        c2.button("Amostragem na próxima execução", on_click=st.session_state.update, kwargs={"perfil_gancho": "amostragem"})
+
+        st.caption("Memória das tabelas em representação compacta")
+        st.dataframe(compact.summarize(relatorio_memoria).round(2))
+
+        if perfil.enabled:
+            registro = registrar_execucao()
+            historico = st.session_state.perfil_historico
+
+            st.caption(f"Execução {registro['rerun']} completa ({registro['active_tab']}): "
+                       f"{registro['n_stages']} etapas em {registro['total_seconds']:.3f}s")
+            etapas = perfil.frame()
+            etapas['stage'] = ["  " * int(d) + e for d, e in zip(etapas['depth'], etapas['stage'])]
+            st.dataframe(etapas.drop(columns='depth'), hide_index=True)
+            st.caption("Etapas reexecutadas por interação (execuções completas e de fragmentos)")
+            st.dataframe(pd.DataFrame(historico[-10:]).reindex(
+                columns=["rerun", "scope", "fragment", "active_tab", "n_stages", "total_seconds"]), hide_index=True)
+            for gancho in perfil.ganchos:
+                if gancho.relatorio:
+                    st.code(gancho.relatorio)
+            st.download_button(
+                label="Baixar execuções da sessão (JSONL)",
+                data="".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in historico),
+                file_name=f"perfil_{st.session_state.perfil_sessao}.jsonl",
+                mime="application/jsonl",
+            )
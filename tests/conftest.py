@@ -0,0 +1,43 @@
+"""
+Fixtures compartilhadas pelos testes: uma base sintética pequena
+(``analytics.synthetic``), gerada uma vez por sessão e copiada para um
+diretório próprio de cada teste que grava snapshot, lotes ou modelo.
+"""
+import shutil
+
+import pytest
+
+EMPRESAS = 300
+TRANSACOES = 6_000
+
+
+@pytest.fixture(scope="session")
+def fontes(tmp_path_factory):
+    """Diretório com as quatro fontes da base sintética (somente leitura)."""
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("sklearn")  # ajuste dos clusters do dados_para_powerbi.csv
+    from analytics import synthetic
+
+    destino = tmp_path_factory.mktemp("fontes")
+    synthetic.generate(str(destino), n_empresas=EMPRESAS, n_transacoes=TRANSACOES, formato='parquet',
+                       k_intermediacao=0, log=lambda *_: None)
+    return destino
+
+
+@pytest.fixture
+def data_dir(fontes, tmp_path):
+    """Cópia das fontes para o teste (o snapshot é gravado dentro dela)."""
+    destino = tmp_path / "data"
+    shutil.copytree(fontes, destino)
+    return str(destino)
+
+
+@pytest.fixture(scope="session")
+def snapshot_dir(fontes, tmp_path_factory):
+    """Cópia das fontes com o snapshot já gerado, compartilhada pelos testes que só leem."""
+    from analytics import snapshot
+
+    destino = tmp_path_factory.mktemp("snapshot") / "data"
+    shutil.copytree(fontes, destino)
+    snapshot.build_snapshot(str(destino))
+    return str(destino)
@@ -0,0 +1,63 @@
+"""Centralidades esparsas (``analytics.centrality``) contra o networkx do notebook."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import centrality
+
+nx = pytest.importorskip("networkx")
+
+K = 20
+
+
+@pytest.fixture(scope="module")
+def arestas():
+    """Grafo dirigido pequeno e aleatório (pares distintos, sem laços)."""
+    rng = np.random.default_rng(1)
+    pares = pd.DataFrame({'id_pagador': [f"E{i}" for i in rng.integers(0, 80, 400)],
+                          'id_recebedor': [f"E{i}" for i in rng.integers(0, 80, 400)]})
+    return pares[pares['id_pagador'] != pares['id_recebedor']].drop_duplicates().reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def grafo(arestas):
+    return nx.from_pandas_edgelist(arestas, 'id_pagador', 'id_recebedor', create_using=nx.DiGraph())
+
+
+def _series(valores, indice):
+    return pd.Series(valores).reindex(indice).to_numpy()
+
+
+def test_node_order_and_degrees_match_networkx(arestas, grafo):
+    metricas = centrality.network_metrics(arestas, k=None, workers=1)
+    assert list(metricas.index) == list(grafo.nodes)
+    for funcao, chave in ((nx.degree_centrality, 'degree'), (nx.in_degree_centrality, 'in_degree'),
+                          (nx.out_degree_centrality, 'out_degree')):
+        np.testing.assert_allclose(metricas[centrality.COLUMNS[chave]], _series(funcao(grafo), metricas.index),
+                                   rtol=0, atol=1e-15)
+
+
+def test_exact_betweenness_matches_networkx(arestas, grafo):
+    metricas = centrality.network_metrics(arestas, k=None, workers=1)
+    esperada = _series(nx.betweenness_centrality(grafo), metricas.index)
+    np.testing.assert_allclose(metricas[centrality.COLUMNS['betweenness']], esperada, rtol=0, atol=1e-14)
+
+
+def test_sampled_betweenness_uses_networkx_sources(arestas, grafo):
+    """
+    A amostragem usa as fontes do networkx; a escala é a da versão do notebook
+    (networkx 3.1: ``n / (k (n-1)(n-2))``), conferida sobre a soma das
+    dependências dessas fontes (``betweenness_centrality_subset``).
+    """
+    n, nos = grafo.number_of_nodes(), list(grafo.nodes)
+    fontes = [nos[i] for i in centrality.sample_sources(n, K, centrality.BETWEENNESS_SEED)]
+    soma = nx.betweenness_centrality_subset(grafo, sources=fontes, targets=nos, normalized=False)
+    metricas = centrality.network_metrics(arestas, k=K, workers=1)
+    esperada = _series(soma, metricas.index) * n / (K * (n - 1) * (n - 2))
+    np.testing.assert_allclose(metricas[centrality.COLUMNS['betweenness']], esperada, rtol=1e-12, atol=1e-15)
+
+
+def test_parallel_betweenness_matches_serial(arestas):
+    serial = centrality.network_metrics(arestas, k=K, workers=1)
+    paralela = centrality.network_metrics(arestas, k=K, workers=2)
+    np.testing.assert_allclose(paralela.to_numpy(), serial.to_numpy(), rtol=0, atol=1e-15)
@@ -0,0 +1,50 @@
+"""Exposição por categoria: colisões de nome de coluna e conferência com um cálculo ingênuo."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import exposure
+
+
+def naive_direct(pagadores, recebedores, valores, grupos):
+    """Fração do recebido por cada empresa que veio de pagadores de cada coluna (laço simples)."""
+    recebido, por_coluna = {}, {}
+    for pagador, recebedor, valor in zip(pagadores, recebedores, valores):
+        if valor <= 0:
+            continue
+        recebido[recebedor] = recebido.get(recebedor, 0.0) + valor
+        categoria = grupos.get(pagador)
+        if pd.notna(categoria):
+            chave = (recebedor, exposure.column_name(categoria, 1))
+            por_coluna[chave] = por_coluna.get(chave, 0.0) + valor
+    return {chave: valor / recebido[chave[0]] for chave, valor in por_coluna.items()}
+
+
+def test_colliding_categories_share_one_summed_column():
+    grupos = pd.Series({'A': 'DECLÍNIO', 'B': 'Declínio', 'C': 'EXPANSÃO', 'D': None})
+    scores = exposure.exposure_scores(['A', 'B', 'C', 'D'], ['D', 'D', 'D', 'C'], [10, 30, 60, 50], grupos)
+
+    declinio, expansao = exposure.column_name('DECLÍNIO', 1), exposure.column_name('EXPANSÃO', 1)
+    assert scores.columns.is_unique
+    assert list(scores.columns) == list(exposure.column_labels(sorted(grupos.dropna().unique())))
+    assert scores.loc['D', declinio] == pytest.approx(0.4)
+    assert scores.loc['D', expansao] == pytest.approx(0.6)
+    # Em dois saltos, C recebe de D, cujo recebido veio 40% de empresas em declínio
+    assert scores.loc['C', exposure.column_name('Declínio', 2)] == pytest.approx(0.4)
+    assert exposure.column_labels(['DECLÍNIO', 'Declínio'], 1) == {declinio: 'DECLÍNIO / Declínio (direta)'}
+
+
+def test_direct_exposure_matches_naive_loop():
+    rng = np.random.default_rng(7)
+    empresas = [f"E{i}" for i in range(40)]
+    grupos = pd.Series(rng.choice(['DECLÍNIO', 'declinio', 'INÍCIO', 'MATURIDADE'], len(empresas)), index=empresas)
+    pagadores = rng.choice(empresas + ['FORA'], 400)
+    recebedores = rng.choice(empresas, 400)
+    valores = rng.normal(100, 80, 400)
+
+    scores = exposure.exposure_scores(pagadores, recebedores, valores, grupos, saltos=1)
+    esperado = pd.Series(naive_direct(pagadores, recebedores, valores, grupos.to_dict()))
+    obtido = scores.stack()
+    np.testing.assert_allclose(obtido.reindex(esperado.index).to_numpy(), esperado.to_numpy())
+    # O que o laço não produz é exposição zero
+    assert (obtido.drop(esperado.index) == 0).all()
@@ -0,0 +1,42 @@
+"""Agregações das abas (``analytics.queries``) nos motores pandas e DuckDB."""
+import pandas as pd
+import pytest
+
+from analytics import queries, snapshot
+
+
+@pytest.fixture(scope="module")
+def tabelas(snapshot_dir):
+    return snapshot.load_snapshot(snapshot_dir)
+
+
+@pytest.fixture(scope="module")
+def pandas_backend(tabelas):
+    return queries.PandasBackend(tabelas)
+
+
+def test_pandas_backend_covers_every_filter_state(tabelas, pandas_backend):
+    """Toda agregação roda em todo estado (``None`` quando o recorte não tem dados para ela)."""
+    for setor, momento, meses in queries.filter_states(tabelas):
+        for nome, agregacao in queries.AGGREGATIONS.items():
+            resultado = agregacao(pandas_backend, 10, setor, momento, meses)
+            assert resultado is None or isinstance(resultado, pd.DataFrame), nome
+
+
+def test_transaction_mix_counts_each_transaction_once(tabelas, pandas_backend):
+    """O mix pré-agregado é o semi-join das transações com pagador ou recebedor entre as empresas filtradas."""
+    motor = pandas_backend.motor
+    for setor, momento, meses in queries.filter_states(tabelas):
+        ids = motor.companies(setor, momento, meses)['id_empresa'].unique()
+        transacoes = motor.transactions(meses)
+        transacoes = transacoes[transacoes['ID_RCBE'].isin(ids) | transacoes['ID_PGTO'].isin(ids)]
+        esperado = transacoes.groupby('DS_TRAN', sort=True, observed=True)['VL'].sum().reset_index()
+        obtido = queries.transaction_mix(pandas_backend, setor, momento, meses)
+        assert not queries.compare(obtido, esperado), (setor, momento, meses)
+
+
+def test_duckdb_backend_matches_pandas(tabelas, pandas_backend, snapshot_dir):
+    pytest.importorskip("duckdb")
+    duckdb_backend = queries.DuckDBBackend(snapshot_dir, threads=1)
+    divergencias, _ = queries.parity((pandas_backend, duckdb_backend), tabelas)
+    assert not divergencias
@@ -0,0 +1,33 @@
+"""Versão da definição dos agregados do snapshot (``analytics.snapshot``)."""
+from analytics import snapshot
+
+
+def test_aggregate_with_new_definition_is_rebuilt(data_dir, monkeypatch):
+    snapshot.build_snapshot(data_dir)
+    antes = snapshot.read_manifest(data_dir)
+    assert antes["aggregates"] == snapshot.aggregate_versions()
+    assert snapshot.stale_aggregates(antes) == []
+
+    chamadas = []
+    funcao, entradas, versao = snapshot.AGGREGATES["cubo_mensal"]
+
+    def contado(*args):
+        chamadas.append(len(chamadas))
+        return funcao(*args)
+
+    monkeypatch.setitem(snapshot.AGGREGATES, "cubo_mensal", (contado, entradas, versao + 1))
+    # O cubo mudou de definição; o crescimento por setor é calculado a partir dele
+    assert snapshot.stale_aggregates(antes) == ["cubo_mensal", "crescimento_setores"]
+
+    versao_dados = snapshot.ensure_snapshot(data_dir)
+    depois = snapshot.read_manifest(data_dir)
+    assert chamadas == [0]
+    assert depois["aggregates"]["cubo_mensal"] == versao + 1
+    assert versao_dados == depois["version"] != antes["version"]
+    assert snapshot.stale_aggregates(depois) == []
+
+    # Sem nova mudança, a carga seguinte só lê; a versão é a de uma reconstrução completa
+    snapshot.load_snapshot(data_dir)
+    assert chamadas == [0]
+    snapshot.build_snapshot(data_dir)
+    assert snapshot.read_manifest(data_dir)["version"] == versao_dados